@@ -1,14 +1,46 @@
+import os
 import random
 import string
-from flask import Flask, request
+from flask import Flask, Response, request
 from pandanite.core.blockchain import BlockChain
-from pandanite.storage.db import PandaniteDB
+from pandanite.storage import open_storage
+from pandanite.storage.block_store import BlockStore
+from pandanite.core.wire import block_to_buffer
+from pandanite.core.crypto import (
+    string_to_sha_256,
+    sha_256_to_string,
+    string_to_wallet_address,
+)
+from pandanite.core.constants import (
+    MAX_BALANCE_QUERY_ADDRESSES,
+    BLOCKS_PER_FETCH,
+    BLOCK_HEADERS_PER_FETCH,
+    WALLET_HISTORY_PAGE_SIZE,
+    MAX_WALLET_HISTORY_PAGE_SIZE,
+)
+from pandanite.core.transaction import get_transaction_proof
 
 app = Flask(__name__)
 
 name = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-db = PandaniteDB()
-blockchain = BlockChain(db)
+# PANDANITE_STORAGE selects the backend: "mongo" (default) or "sqlite",
+# stored in the file named by PANDANITE_SQLITE_PATH
+storage_backend = os.environ.get('PANDANITE_STORAGE', 'mongo')
+storage_options = {}
+if storage_backend == 'sqlite':
+    storage_options['path'] = os.environ.get('PANDANITE_SQLITE_PATH', 'pandanite.db')
+# PANDANITE_HEADER_INDEX_PATH is where the block header index is persisted,
+# next to the SQLite database by default
+if os.environ.get('PANDANITE_HEADER_INDEX_PATH'):
+    storage_options['header_index_path'] = os.environ['PANDANITE_HEADER_INDEX_PATH']
+elif storage_backend == 'mongo':
+    storage_options['header_index_path'] = 'pandanite.headers'
+db = open_storage(storage_backend, **storage_options)
+# PANDANITE_BLOCK_STORE names a directory for the serialized block archive
+block_store = None
+if os.environ.get('PANDANITE_BLOCK_STORE'):
+    block_store = BlockStore(os.environ['PANDANITE_BLOCK_STORE'])
+blockchain = BlockChain(db, block_store=block_store)
 if db.get_num_blocks() == 0:
     blockchain.load_genesis()
 
@@ -74,7 +106,17 @@ def blocks():
     if not block_id:
         return "No block id specified"
     
-    block = db.get_block(block_id)
+    if block_store is not None:
+        if block_id > block_store.get_num_blocks():
+            return "Invalid block"
+        if format == 'avro' and not include_transactions:
+            block = block_store.get_block_header(block_id)
+        else:
+            block = block_store.get_block(block_id)
+    elif format == 'avro' and not include_transactions:
+        block = db.get_block_header(block_id)
+    else:
+        block = db.get_block(block_id)
     
     if format == 'json':
         return block.to_json()
@@ -85,6 +127,178 @@ def blocks():
     
 
 
+@app.route("/sync/<int:start_id>/<int:end_id>", methods=["GET"])
+def sync(start_id, end_id):
+    """
+    Streams blocks start_id to end_id (inclusive) in the binary wire format
+    of the C++ nodes, at most BLOCKS_PER_FETCH of them
+    """
+    end_id = min(end_id, start_id + BLOCKS_PER_FETCH - 1, db.get_num_blocks())
+    if start_id <= 0 or start_id > end_id:
+        return "Invalid block range"
+
+    if block_store is not None:
+        # slices of the memory-mapped segments, sent without decoding
+        chunks = (bytes(raw) for raw in block_store.iter_raw(start_id, end_id))
+    else:
+        chunks = (
+            block_to_buffer(db.get_block(block_id))
+            for block_id in range(start_id, end_id + 1)
+        )
+    return Response(chunks, mimetype='application/octet-stream')
+
+
+@app.route("/block_hashes/<int:start_id>/<int:end_id>", methods=["GET"])
+def block_hashes(start_id, end_id):
+    """
+    Returns the hashes of blocks start_id to end_id (inclusive), at most
+    BLOCK_HEADERS_PER_FETCH of them, read from the in-memory header index
+    """
+    end_id = min(end_id, start_id + BLOCK_HEADERS_PER_FETCH - 1)
+    if start_id <= 0 or start_id > end_id:
+        return "Invalid block range"
+    return [sha_256_to_string(h) for h in db.headers.get_hashes(start_id, end_id)]
+
+
+@app.route("/transaction", methods=["GET"])
+def transaction():
+    """
+    Returns a single transaction by its id, decoding only that entry of
+    its block
+    args:
+        txid: string - The ID of the transaction to fetch
+    """
+    args = request.args
+
+    txid = args.get('txid', default=None, type=str)
+
+    if not txid:
+        return "No txid specified"
+    try:
+        tx_hash = string_to_sha_256(txid)
+        location = db.get_transaction_location(tx_hash)
+    except Exception:
+        return "Invalid txid"
+    if location is None:
+        return "Transaction not found"
+    block_id, position = location
+
+    t = None
+    if block_store is not None:
+        t = block_store.get_transaction(block_id, position)
+    # the archive may predate the transaction's sender being stored
+    if t is None or t.get_id() != sha_256_to_string(tx_hash):
+        t = db.get_transaction(block_id, position)
+
+    return {
+        "blockId": block_id,
+        "position": position,
+        "transaction": t.to_json(),
+    }
+
+
+@app.route("/merkle_proof", methods=["GET"])
+def merkle_proof():
+    """
+    Returns the merkle inclusion proof of a transaction, to be checked
+    against the merkleRoot of the block header with verify_merkle_proof
+    args:
+        txid: string - The ID of the transaction to prove
+    """
+    args = request.args
+
+    txid = args.get('txid', default=None, type=str)
+
+    if not txid:
+        return "No txid specified"
+
+    try:
+        block_id = db.find_block_for_transaction_id(string_to_sha_256(txid))
+    except Exception:
+        return "Invalid txid"
+    if block_id <= 0:
+        return "Transaction not found"
+
+    block = db.get_block(block_id)
+    transactions = block.get_transactions()
+    result = get_transaction_proof(transactions, txid.upper())
+    if result is None:
+        return "Transaction not found"
+    leaf, index, proof = result
+
+    return {
+        "txid": txid.upper(),
+        "blockId": block_id,
+        "merkleRoot": sha_256_to_string(block.get_merkle_root()),
+        "hash": sha_256_to_string(leaf),
+        "index": index,
+        "transactionCount": len(transactions),
+        "proof": [sha_256_to_string(h) for h in proof],
+    }
+
+
+@app.route("/balances", methods=["GET", "POST"])
+def balances():
+    """
+    Returns the balances of several wallets, looked up in a single batch.
+    Wallets that have never received funds have a balance of 0
+    args:
+        addresses: string - Comma separated wallet addresses (GET), or a
+            JSON list of addresses as the request body (POST)
+    """
+    if request.method == 'POST':
+        addresses = request.get_json(silent=True)
+        if not isinstance(addresses, list):
+            return "Expected a JSON list of addresses"
+    else:
+        addresses = request.args.get('addresses', default='', type=str).split(',')
+    addresses = [str(a).strip().upper() for a in addresses if str(a).strip()]
+
+    if not addresses:
+        return "No addresses specified"
+    if len(addresses) > MAX_BALANCE_QUERY_ADDRESSES:
+        return "Too many addresses requested"
+
+    try:
+        wallets = [string_to_wallet_address(a) for a in addresses]
+    except Exception:
+        return "Invalid address"
+
+    found = db.get_wallets(wallets)
+    return {address: found.get(address, 0) for address in addresses}
+
+
+@app.route("/wallet_transactions", methods=["GET"])
+def wallet_transactions():
+    """
+    Returns one page of a wallet's transactions, newest first
+    args:
+        wallet: string - The wallet address
+        cursor: int - The cursor returned with the previous page, omitted
+            for the first page
+        limit: int - Maximum number of transactions in the page
+    """
+    args = request.args
+
+    wallet = args.get('wallet', default=None, type=str)
+    cursor = args.get('cursor', default=None, type=int)
+    limit = args.get('limit', default=WALLET_HISTORY_PAGE_SIZE, type=int)
+
+    if not wallet:
+        return "No wallet specified"
+    try:
+        address = string_to_wallet_address(wallet)
+    except Exception:
+        return "Invalid address"
+    limit = max(1, min(limit, MAX_WALLET_HISTORY_PAGE_SIZE))
+
+    transactions, next_cursor = db.get_wallet_transactions(address, cursor, limit)
+    return {
+        "transactions": [t.to_json() for t in transactions],
+        "cursor": next_cursor,
+    }
+
+
 @app.route("/add_block", methods=["POST"])
 def add_block():
     """
@@ -0,0 +1,62 @@
+import io
+import time
+import avro.io
+import avro.schema
+from avro.io import DatumWriter, DatumReader
+from pandanite.core.block import Block, blocks_to_avro, blocks_from_avro
+from pandanite.core.constants import BLOCKS_PER_FETCH
+from pandanite.core.user import User
+
+# usage (from src/): python -m benchmarks.bench_avro
+
+ROUNDS = 5
+
+
+def uncached_round_trip(block: Block) -> Block:
+    # what to_avro/from_avro did before: parse the schema on every call
+    schema = avro.schema.parse(open("schema.json", "rb").read())
+    bytes_writer = io.BytesIO()
+    DatumWriter(schema).write(
+        block.to_avro_dict(include_transactions=True),
+        avro.io.BinaryEncoder(bytes_writer),
+    )
+    schema = avro.schema.parse(open("schema.json", "rb").read())
+    decoder = avro.io.BinaryDecoder(io.BytesIO(bytes_writer.getvalue()))
+    result = DatumReader(schema).read(decoder)
+    decoded = Block()
+    decoded.from_avro_dict(result)
+    return decoded
+
+
+def cached_round_trip(block: Block) -> Block:
+    decoded = Block()
+    decoded.from_avro(block.to_avro(include_transactions=True))
+    return decoded
+
+
+def main():
+    miner = User()
+    blocks = []
+    for i in range(0, BLOCKS_PER_FETCH):
+        b = Block()
+        b.set_id(i + 1)
+        b.add_transaction(miner.mine())
+        blocks.append(b)
+
+    for name, fn in [("uncached", uncached_round_trip), ("cached", cached_round_trip)]:
+        start = time.perf_counter()
+        for _ in range(0, ROUNDS):
+            for b in blocks:
+                fn(b)
+        elapsed = (time.perf_counter() - start) / ROUNDS
+        print(f"{name}: {elapsed * 1000:.1f}ms for {len(blocks)} blocks")
+
+    start = time.perf_counter()
+    for _ in range(0, ROUNDS):
+        blocks_from_avro(blocks_to_avro(blocks, include_transactions=True))
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    print(f"encode_many/decode_many: {elapsed * 1000:.1f}ms for {len(blocks)} blocks")
+
+
+if __name__ == "__main__":
+    main()
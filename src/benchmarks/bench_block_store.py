@@ -0,0 +1,64 @@
+import os
+import tempfile
+import time
+from pandanite.core.block import Block
+from pandanite.core.user import User
+from pandanite.storage.block_store import BlockStore
+from pandanite.storage.sqlite import SQLiteDB
+
+# usage (from src/): python -m benchmarks.bench_block_store
+
+NUM_BLOCKS = 50
+TRANSACTIONS_PER_BLOCK = 500
+READS = 200
+
+
+def build_blocks():
+    miner = User()
+    receiver = User()
+    template = miner.send(receiver, 1)
+    blocks = []
+    for block_id in range(1, NUM_BLOCKS + 1):
+        block = Block()
+        block.set_id(block_id)
+        block.add_transaction(miner.mine())
+        # signatures are not checked here, only the amounts differ
+        for i in range(0, TRANSACTIONS_PER_BLOCK):
+            t = template.copy()
+            t.amount = block_id * TRANSACTIONS_PER_BLOCK + i
+            block.add_transaction(t)
+        blocks.append(block)
+    return blocks
+
+
+def timed(name: str, read):
+    start = time.perf_counter()
+    for i in range(0, READS):
+        read(i % NUM_BLOCKS + 1)
+    elapsed = time.perf_counter() - start
+    print(f"{name}: {elapsed / READS * 1000:.3f}ms per block")
+
+
+def main():
+    blocks = build_blocks()
+    with tempfile.TemporaryDirectory() as directory:
+        db = SQLiteDB(os.path.join(directory, "chain.db"))
+        store = BlockStore(os.path.join(directory, "blocks"))
+        for block in blocks:
+            db.add_block(block)
+            store.append(block)
+
+        print(f"{NUM_BLOCKS} blocks, {TRANSACTIONS_PER_BLOCK} transactions per block")
+        timed("db get_block + to_json", lambda i: db.get_block(i).to_json())
+        timed("store get_raw", lambda i: bytes(store.get_raw(i)))
+        timed("store get_block", lambda i: store.get_block(i).get_transactions())
+        timed("db get_block_header", db.get_block_header)
+        timed("store get_block_header", store.get_block_header)
+        timed("db get_transaction", lambda i: db.get_transaction(i, i))
+        timed("store get_transaction", lambda i: store.get_transaction(i, i))
+        store.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
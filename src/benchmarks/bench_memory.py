@@ -0,0 +1,145 @@
+import copy
+import time
+import tracemalloc
+from pandanite.core.block import Block
+from pandanite.core.constants import MAX_TRANSACTIONS_PER_BLOCK
+from pandanite.core.crypto import string_to_public_key
+from pandanite.core.user import User
+
+# usage (from src/): python -m benchmarks.bench_memory
+
+
+class DictTransaction:
+    # the Transaction representation used before: a per instance __dict__,
+    # bytearray fields and deep copies
+    def __init__(self):
+        self.signature = None
+        self.signing_key = None
+        self.timestamp = 0
+        self.to = bytearray(25)
+        self.amount = 0
+        self.fee = 0
+        self._wallet = None
+        self._sealed = False
+        self._content_hash = None
+        self._hash = None
+        self._id = None
+
+    def from_json(self, data: dict):
+        self.timestamp = int(data["timestamp"])
+        self.to = bytearray.fromhex(data["to"])
+        self.fee = data["fee"]
+        self.amount = data["amount"]
+        if "signingKey" in data.keys():
+            self.signature = bytes(bytearray.fromhex(data["signature"]))
+            self.signing_key = string_to_public_key(data["signingKey"])
+
+    def copy(self) -> "DictTransaction":
+        return copy.deepcopy(self)
+
+
+class DictBlock:
+    # the Block representation used before, see DictTransaction
+    def __init__(self):
+        self.transactions = []
+        self.id = 1
+        self.timestamp = 0
+        self.difficulty = 16
+        self.merkle_root = bytearray(32)
+        self.last_block_hash = bytearray(32)
+        self.nonce = bytearray(32)
+
+    def from_json(self, data: dict):
+        self.nonce = bytearray.fromhex(data["nonce"])
+        self.merkle_root = bytearray.fromhex(data["merkleRoot"])
+        self.last_block_hash = bytearray.fromhex(data["lastBlockHash"])
+        self.id = data["id"]
+        self.difficulty = data["difficulty"]
+        self.timestamp = int(data["timestamp"])
+        self.transactions = []
+        for entry in data["transactions"]:
+            t = DictTransaction()
+            t.from_json(entry)
+            self.transactions.append(t)
+
+    def get_transactions(self):
+        return self.transactions
+
+    def add_transaction(self, t: DictTransaction):
+        self.transactions.append(t.copy())
+
+    def copy(self) -> "DictBlock":
+        return copy.deepcopy(self)
+
+
+def block_json(num_transactions: int) -> dict:
+    miner = User()
+    receiver = User()
+    block = Block()
+    block.add_transaction(miner.mine())
+    block.add_transaction(miner.send(receiver, 1))
+    data = block.to_json()
+    # same sender, different amounts; signatures are not checked here
+    template = data["transactions"][1]
+    data["transactions"] = [data["transactions"][0]] + [
+        dict(template, amount=i + 1) for i in range(0, num_transactions - 1)
+    ]
+    return data
+
+
+def measure(block_class, data: dict) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    block = block_class()
+    block.from_json(data)
+    block.get_transactions()
+    decode_time = time.perf_counter() - start
+    decoded, _ = tracemalloc.get_traced_memory()
+
+    start = time.perf_counter()
+    built = block_class()
+    for t in block.get_transactions():
+        built.add_transaction(t)
+    copied = built.copy()
+    build_time = time.perf_counter() - start
+    total, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    count = len(copied.get_transactions())
+    return {
+        "count": count,
+        "decode_time": decode_time,
+        "bytes_per_tx": decoded / count,
+        "build_time": build_time,
+        "total": total,
+        "peak": peak,
+    }
+
+
+def main():
+    data = block_json(MAX_TRANSACTIONS_PER_BLOCK)
+    results = [
+        ("dict/deepcopy", measure(DictBlock, data)),
+        ("slots", measure(Block, data)),
+    ]
+
+    print(f"{results[0][1]['count']} transactions")
+    for name, r in results:
+        print(
+            f"{name}: decode {r['decode_time'] * 1000:.0f}ms, "
+            f"{r['bytes_per_tx']:.0f} bytes/tx; "
+            f"add_transaction + copy {r['build_time'] * 1000:.0f}ms; "
+            f"total traced {r['total'] / 2**20:.1f}MiB, "
+            f"peak {r['peak'] / 2**20:.1f}MiB"
+        )
+    before, after = results[0][1], results[1][1]
+    print(
+        f"per block: {(before['total'] - after['total']) / 2**20:.1f}MiB less "
+        f"traced memory, decode {before['decode_time'] / after['decode_time']:.1f}x "
+        f"and add_transaction + copy "
+        f"{before['build_time'] / after['build_time']:.1f}x faster"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import time
+from collections import deque
+from pandanite.core.constants import MAX_TRANSACTIONS_PER_BLOCK
+from pandanite.core.crypto import concat_hashes, sha_256_to_string
+from pandanite.core.transaction import Transaction, get_merkle_hash
+from pandanite.core.user import User
+
+# usage (from src/): python -m benchmarks.bench_merkle
+
+ROUNDS = 5
+
+
+class Node:
+    def __init__(self, hash):
+        self.hash = hash
+        self.parent = None
+        self.left = None
+        self.right = None
+
+
+def node_merkle_hash(items):
+    # the Node/deque implementation get_merkle_hash used before
+    items.sort(key=lambda a: sha_256_to_string(a.get_hash()), reverse=True)
+    q = deque()
+    for item in items:
+        q.append(Node(item.get_hash()))
+    if len(q) % 2 == 1:
+        q.append(Node(q[-1].hash))
+    while len(q) > 1:
+        a = q.popleft()
+        b = q.popleft()
+        root = Node(None)
+        root.left = a
+        root.right = b
+        a.parent = root
+        b.parent = root
+        root.hash = concat_hashes(a.hash, b.hash)
+        q.append(root)
+    return q[0].hash
+
+
+def main():
+    address = User().get_address()
+    items = []
+    for i in range(0, MAX_TRANSACTIONS_PER_BLOCK):
+        t = Transaction(address, i + 1)
+        t.seal()
+        items.append(t)
+    assert node_merkle_hash(items) == get_merkle_hash(items)
+
+    for name, fn in [("node/deque", node_merkle_hash), ("array", get_merkle_hash)]:
+        start = time.perf_counter()
+        for _ in range(0, ROUNDS):
+            fn(items)
+        elapsed = (time.perf_counter() - start) / ROUNDS
+        print(f"{name}: {elapsed * 1000:.1f}ms for {len(items)} transactions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import os
+import time
+from pandanite.core.crypto import mine_hash, sha_256
+from pandanite.core.miner import MiningEngine
+from pandanite.core.block import Block
+from pandanite.core.user import User
+from pandanite.core.transaction import get_merkle_hash
+
+# usage (from src/): python -m benchmarks.bench_mining
+
+DIFFICULTY = 18
+ROUNDS = 3
+
+
+def main():
+    target = sha_256("benchmark".encode("utf-8"))
+    start = time.perf_counter()
+    for _ in range(0, ROUNDS):
+        mine_hash(target, DIFFICULTY)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    print(f"mine_hash: {elapsed:.3f}s per block at difficulty {DIFFICULTY}")
+
+    block = Block()
+    block.add_transaction(User().mine())
+    block.set_merkle_root(get_merkle_hash(block.get_transactions()))
+    block.set_difficulty(DIFFICULTY)
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        engine = MiningEngine(num_workers=workers)
+        start = time.perf_counter()
+        for i in range(0, ROUNDS):
+            block.set_timestamp(i)
+            engine.mine(block)
+        elapsed = (time.perf_counter() - start) / ROUNDS
+        print(
+            f"{workers} workers: {elapsed:.3f}s per block, "
+            f"{engine.get_hashrate() / 1000:.0f} kH/s"
+        )
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
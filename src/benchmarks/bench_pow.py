@@ -0,0 +1,65 @@
+import time
+from pandanite.core.block import Block, verify_nonces
+from pandanite.core.constants import BLOCK_HEADERS_PER_FETCH
+from pandanite.core.crypto import mine_hash, sha_256
+
+# usage (from src/): python -m benchmarks.bench_pow
+
+DIFFICULTY = 8
+ROUNDS = 20
+
+
+def bitwise_leading_zero_bits(hash, N):
+    # the bit-by-bit check verify_nonce used before
+    for i in range(N):
+        byte_index = i // 8
+        bit_index = i % 8
+        if hash[byte_index] & (1 << (7 - bit_index)):
+            return False
+        if byte_index == len(hash) - 1 and i < N - 1:
+            return False
+    return True
+
+
+def main():
+    headers = []
+    for i in range(0, BLOCK_HEADERS_PER_FETCH):
+        b = Block()
+        b.set_id(i + 1)
+        b.set_difficulty(DIFFICULTY)
+        b.set_merkle_root(sha_256(str(i).encode("utf-8")))
+        b.set_nonce(mine_hash(b.get_hash(), DIFFICULTY))
+        headers.append(b)
+
+    start = time.perf_counter()
+    for _ in range(0, ROUNDS):
+        for b in headers:
+            digest = sha_256(b.get_hash() + b.get_nonce())
+            assert bitwise_leading_zero_bits(digest, b.get_difficulty())
+    bitwise = (time.perf_counter() - start) / ROUNDS
+
+    start = time.perf_counter()
+    for _ in range(0, ROUNDS):
+        assert all(b.verify_nonce() for b in headers)
+    single = (time.perf_counter() - start) / ROUNDS
+
+    start = time.perf_counter()
+    for _ in range(0, ROUNDS):
+        assert all(verify_nonces(headers))
+    bulk = (time.perf_counter() - start) / ROUNDS
+
+    print(f"{BLOCK_HEADERS_PER_FETCH} headers per batch")
+    for label, seconds in [
+        ("bit loop", bitwise),
+        ("verify_nonce", single),
+        ("verify_nonces bulk", bulk),
+    ]:
+        per_header = seconds / BLOCK_HEADERS_PER_FETCH
+        print(
+            f"{label}: {seconds * 1000:.1f}ms per batch, "
+            f"{per_header * 1e6:.2f}us per header"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pandanite.core.user import User
+from pandanite.core.transaction import Transaction, verify_signatures
+
+# usage (from src/): python -m benchmarks.bench_signatures
+
+NUM_TRANSACTIONS = 2000
+
+
+def build_transactions(count: int) -> list[Transaction]:
+    miner = User()
+    receiver = User()
+    items = [miner.mine()]
+    for i in range(0, count):
+        items.append(miner.send(receiver, i + 1))
+    return items
+
+
+def main():
+    items = build_transactions(NUM_TRANSACTIONS)
+
+    start = time.perf_counter()
+    assert verify_signatures(items)
+    serial = time.perf_counter() - start
+    print(f"serial: {serial:.3f}s ({NUM_TRANSACTIONS / serial:.0f} sig/s)")
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # warm up the worker processes before timing
+            verify_signatures(items[:workers], pool, chunk_size=1)
+            start = time.perf_counter()
+            assert verify_signatures(items, pool)
+            elapsed = time.perf_counter() - start
+        print(
+            f"{workers} processes: {elapsed:.3f}s "
+            f"({NUM_TRANSACTIONS / elapsed:.0f} sig/s, {serial / elapsed:.2f}x)"
+        )
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import os
+import tempfile
+import time
+from typing import List
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from pandanite.core.block import Block
+from pandanite.core.blockchain import BlockChain
+from pandanite.core.crypto import mine_hash, wallet_address_to_string
+from pandanite.core.executor import ExecutionStatus
+from pandanite.core.transaction import Transaction, get_merkle_hash
+from pandanite.core.user import User
+from pandanite.storage import open_storage
+from pandanite.storage.base import Storage
+
+# usage (from src/): python -m benchmarks.bench_storage
+# The Mongo backend is skipped when no server is listening on localhost.
+
+NUM_BLOCKS = 20
+TRANSACTIONS_PER_BLOCK = 200
+
+
+def build_chain(num_blocks: int, transactions_per_block: int) -> List[Block]:
+    # Mines a chain on a scratch database so the timed runs only replay it
+    with tempfile.TemporaryDirectory() as directory:
+        db = open_storage("sqlite", path=os.path.join(directory, "build.db"))
+        blockchain = BlockChain(db)
+        blockchain.load_genesis()
+        miner = User()
+        receivers = [User() for _ in range(0, 16)]
+        blocks = []
+        for i in range(0, num_blocks):
+            block = Block()
+            block.set_id(db.get_num_blocks() + 1)
+            block.add_transaction(miner.mine())
+            if i > 0:
+                for j in range(0, transactions_per_block):
+                    # distinct timestamps keep the transaction ids unique
+                    t = Transaction(
+                        receivers[j % len(receivers)].get_address(),
+                        1,
+                        miner.get_public_key(),
+                    )
+                    t.set_timestamp(i * transactions_per_block + j)
+                    t.sign(miner.get_private_key())
+                    block.add_transaction(t)
+            block.set_merkle_root(get_merkle_hash(block.get_transactions()))
+            block.set_last_block_hash(db.get_last_hash())
+            block.set_difficulty(db.get_difficulty())
+            block.set_timestamp(i)
+            block.set_nonce(mine_hash(block.get_hash(), block.get_difficulty()))
+            assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+            blocks.append(block)
+        db.close()
+        return blocks
+
+
+def commit_only(db: Storage, blockchain: BlockChain, blocks: List[Block]) -> float:
+    # The writes BlockChain.add_block makes, without validation
+    start = time.perf_counter()
+    for block in blocks:
+        balances = {}
+        for t in block.get_transactions():
+            balances[wallet_address_to_string(t.get_recepient())] = 1
+        with db.transaction() as session:
+            db.add_block(block, session)
+            db.update_wallets(balances, session)
+            db.add_wallet_transactions(blockchain._wallet_transactions(block), session)
+    return time.perf_counter() - start
+
+
+def run(name: str, db: Storage, blocks: List[Block]):
+    num_transactions = sum(len(b.get_transactions()) for b in blocks)
+
+    blockchain = BlockChain(db)
+    blockchain.load_genesis()
+    start = time.perf_counter()
+    for block in blocks:
+        assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name} add_block: {len(blocks) / elapsed:.1f} blocks/s, "
+        f"{num_transactions / elapsed:.0f} tx/s"
+    )
+
+    blockchain.load_genesis()
+    start = time.perf_counter()
+    status = blockchain.add_blocks(blocks, group_commit=True)
+    assert status == ExecutionStatus.SUCCESS
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name} add_blocks group commit: {len(blocks) / elapsed:.1f} blocks/s, "
+        f"{num_transactions / elapsed:.0f} tx/s"
+    )
+
+    blockchain.load_genesis()
+    start = time.perf_counter()
+    with blockchain.sync_mode(commit_blocks=1, write_behind=True):
+        assert blockchain.add_blocks(blocks) == ExecutionStatus.SUCCESS
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name} add_blocks write behind: {len(blocks) / elapsed:.1f} blocks/s, "
+        f"{num_transactions / elapsed:.0f} tx/s"
+    )
+
+    blockchain.load_genesis()
+    elapsed = commit_only(db, blockchain, blocks)
+    print(
+        f"{name} commit only: {len(blocks) / elapsed:.1f} blocks/s, "
+        f"{num_transactions / elapsed:.0f} tx/s"
+    )
+
+
+def mongo_available() -> bool:
+    try:
+        MongoClient("localhost", 27017, serverSelectionTimeoutMS=1000).admin.command(
+            "ping"
+        )
+        return True
+    except PyMongoError:
+        return False
+
+
+def main():
+    blocks = build_chain(NUM_BLOCKS, TRANSACTIONS_PER_BLOCK)
+    print(f"{len(blocks)} blocks, {TRANSACTIONS_PER_BLOCK} transactions per block")
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = open_storage("sqlite", path=os.path.join(directory, "bench.db"))
+        run("sqlite", db, blocks)
+        db.close()
+
+    if mongo_available():
+        run("mongo", open_storage("mongo", db="pandanite-bench"), blocks)
+    else:
+        print("mongo: no server on localhost:27017, skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pandanite.core.blockchain import BlockChain
+from pandanite.core.executor import ExecutionStatus
+from pandanite.core.sync_pipeline import SyncPipeline
+from pandanite.core.wire import block_to_buffer
+from pandanite.storage import open_storage
+from benchmarks.bench_storage import build_chain
+
+# usage (from src/): python -m benchmarks.bench_sync_pipeline
+
+NUM_BLOCKS = 20
+TRANSACTIONS_PER_BLOCK = 200
+
+
+def fresh_chain(directory: str, name: str) -> BlockChain:
+    db = open_storage("sqlite", path=os.path.join(directory, name))
+    blockchain = BlockChain(db)
+    blockchain.load_genesis()
+    return blockchain
+
+
+def main():
+    blocks = build_chain(NUM_BLOCKS, TRANSACTIONS_PER_BLOCK)
+    raw = [block_to_buffer(b) for b in blocks]
+    num_transactions = sum(len(b.get_transactions()) for b in blocks)
+    print(f"{len(blocks)} blocks, {TRANSACTIONS_PER_BLOCK} transactions per block")
+
+    with tempfile.TemporaryDirectory() as directory:
+        blockchain = fresh_chain(directory, "serial.db")
+        start = time.perf_counter()
+        assert blockchain.add_blocks(blocks) == ExecutionStatus.SUCCESS
+        elapsed = time.perf_counter() - start
+        print(f"serial add_blocks: {num_transactions / elapsed:.0f} tx/s")
+
+        workers = 1
+        while workers <= (os.cpu_count() or 1):
+            blockchain = fresh_chain(directory, f"pipeline{workers}.db")
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pipeline = SyncPipeline(blockchain, pool)
+                assert pipeline.run(raw) == ExecutionStatus.SUCCESS
+            print(f"pipeline, {workers} processes:")
+            for stage, stats in pipeline.get_stats().items():
+                print(
+                    f"  {stage}: {stats['transactionsPerSecond']:.0f} tx/s "
+                    f"({stats['seconds']:.3f}s)"
+                )
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import time
+from pandanite.core.block import Block, blocks_to_avro, blocks_from_avro
+from pandanite.core.constants import BLOCKS_PER_FETCH
+from pandanite.core.user import User
+from pandanite.core.wire import blocks_to_buffer, blocks_from_buffer
+
+# usage (from src/): python -m benchmarks.bench_wire
+
+TRANSACTIONS_PER_BLOCK = 20
+ROUNDS = 3
+
+
+def main():
+    miner = User()
+    receiver = User()
+    sends = [miner.send(receiver, i + 1) for i in range(0, TRANSACTIONS_PER_BLOCK)]
+    blocks = []
+    for i in range(0, BLOCKS_PER_FETCH):
+        b = Block()
+        b.set_id(i + 1)
+        b.add_transaction(miner.mine())
+        for t in sends:
+            b.add_transaction(t)
+        blocks.append(b)
+
+    json_blocks = [b.to_json() for b in blocks]
+    avro_data = blocks_to_avro(blocks, include_transactions=True)
+    wire_data = blocks_to_buffer(blocks)
+    print(f"avro: {len(avro_data)} bytes, binary: {len(wire_data)} bytes")
+
+    def decode_json():
+        for data in json_blocks:
+            b = Block()
+            b.from_json(data)
+            b.get_transactions()
+
+    def decode_avro():
+        for b in blocks_from_avro(avro_data):
+            b.get_transactions()
+
+    cases = [
+        ("from_json", decode_json),
+        ("from_avro", decode_avro),
+        ("binary", lambda: blocks_from_buffer(wire_data)),
+    ]
+    for name, fn in cases:
+        fn()
+        start = time.perf_counter()
+        for _ in range(0, ROUNDS):
+            fn()
+        elapsed = (time.perf_counter() - start) / ROUNDS
+        print(f"{name}: {elapsed * 1000:.1f}ms for {len(blocks)} blocks")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import requests
+from typing import Iterator
 from pandanite.core.block import Block
 from pandanite.core.transaction import Transaction
+from pandanite.core.constants import TIMEOUT_BLOCK_MS
+from pandanite.core.wire import read_blocks
 
 def get_total_work(host_url: str) -> int:
     # Function logic here
@@ -40,9 +43,14 @@ def get_name(host_url: str) -> str:
 #     # Function logic here
 #     pass
 
-# def read_raw_blocks(host_url: str, start_id: int, end_id: int) -> list[Block]:
-#     # Function logic here
-#     pass
+def read_raw_blocks(host_url: str, start_id: int, end_id: int) -> Iterator[Block]:
+    # Streams the binary blocks served by /sync, yielding each block as soon
+    # as it has been received rather than buffering the whole range
+    url = host_url + "/sync/" + str(start_id) + "/" + str(end_id)
+    with requests.get(url, stream=True, timeout=TIMEOUT_BLOCK_MS / 1000) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        yield from read_blocks(response.raw)
 
 # def read_raw_transactions(host_url: str) -> list[Transaction]:
 #     # Function logic here
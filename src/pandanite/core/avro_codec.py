@@ -0,0 +1,67 @@
+import io
+import os
+import threading
+import avro.io
+import avro.schema
+from functools import lru_cache
+from typing import Dict, List
+from avro.io import DatumWriter, DatumReader
+
+# The schema lives next to the package rather than in the working directory
+SCHEMA_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "schema.json"
+)
+
+# DatumReader keeps per read state, so each thread gets its own codecs
+_codecs = threading.local()
+
+
+@lru_cache(maxsize=None)
+def get_schema() -> avro.schema.Schema:
+    with open(SCHEMA_PATH, "rb") as f:
+        return avro.schema.parse(f.read())
+
+
+def _get_writer() -> DatumWriter:
+    writer = getattr(_codecs, "writer", None)
+    if writer is None:
+        writer = DatumWriter(get_schema())
+        _codecs.writer = writer
+    return writer
+
+
+def _get_reader() -> DatumReader:
+    reader = getattr(_codecs, "reader", None)
+    if reader is None:
+        reader = DatumReader(get_schema())
+        _codecs.reader = reader
+    return reader
+
+
+def encode(datum: Dict) -> bytes:
+    return encode_many([datum])
+
+
+def decode(data: bytes) -> Dict:
+    decoder = avro.io.BinaryDecoder(io.BytesIO(data))
+    return _get_reader().read(decoder)
+
+
+def encode_many(datums: List[Dict]) -> bytes:
+    # Avro datums are self delimiting, so a list is just their concatenation
+    writer = _get_writer()
+    bytes_writer = io.BytesIO()
+    encoder = avro.io.BinaryEncoder(bytes_writer)
+    for datum in datums:
+        writer.write(datum, encoder)
+    return bytes_writer.getvalue()
+
+
+def decode_many(data: bytes) -> List[Dict]:
+    reader = _get_reader()
+    f = io.BytesIO(data)
+    decoder = avro.io.BinaryDecoder(f)
+    results = []
+    while f.tell() < len(data):
+        results.append(reader.read(decoder))
+    return results
@@ -1,23 +1,36 @@
-import copy
-import avro.schema
-import io
-from avro.io import DatumWriter, DatumReader
-from typing import List, Dict
+import hashlib
+from concurrent.futures import Executor
+from typing import Any, List, Dict, Optional, Sequence, Tuple
 from pandanite.core.crypto import (
     SHA256Hash,
     sha_256,
     string_to_sha_256,
     sha_256_to_string,
     verify_hash,
+    pow_threshold,
     NULL_SHA256_HASH,
 )
-from pandanite.core.constants import MIN_DIFFICULTY
+from pandanite.core.constants import MIN_DIFFICULTY, BLOCK_HEADERS_PER_FETCH
+from pandanite.core import avro_codec
 from pandanite.core.helpers import get_current_time
 from pandanite.core.transaction import Transaction
 
 
 class Block:
+    __slots__ = (
+        "_pending_transactions",
+        "_transactions",
+        "id",
+        "timestamp",
+        "difficulty",
+        "merkle_root",
+        "last_block_hash",
+        "nonce",
+    )
+
     def __init__(self: "Block"):
+        # Serialized transactions not yet decoded, as (format, entries)
+        self._pending_transactions: Optional[Tuple[str, List[Any]]] = None
         self.transactions: List[Transaction] = []
         self.id = 1
         self.timestamp = get_current_time()
@@ -26,7 +39,31 @@ class Block:
         self.last_block_hash = NULL_SHA256_HASH
         self.nonce = NULL_SHA256_HASH
 
-    def from_json(self, block: Dict):
+    @property
+    def transactions(self) -> List[Transaction]:
+        # Transactions are decoded on first access, so header-only users of
+        # a loaded block never pay for them
+        if self._pending_transactions is not None:
+            format, entries = self._pending_transactions
+            transactions = []
+            for entry in entries:
+                curr = Transaction()
+                if format == "json":
+                    curr.from_json(entry)
+                else:
+                    curr.from_avro_dict(entry)
+                curr.seal()
+                transactions.append(curr)
+            self._transactions = transactions
+            self._pending_transactions = None
+        return self._transactions
+
+    @transactions.setter
+    def transactions(self, transactions: List[Transaction]):
+        self._pending_transactions = None
+        self._transactions = transactions
+
+    def from_json(self, block: Dict, include_transactions=True):
         self.nonce = string_to_sha_256(block["nonce"])
         self.merkle_root = string_to_sha_256(block["merkleRoot"])
         self.last_block_hash = string_to_sha_256(block["lastBlockHash"])
@@ -34,10 +71,8 @@ class Block:
         self.difficulty = block["difficulty"]
         self.timestamp = int(block["timestamp"])
         self.transactions = []
-        for t in block["transactions"]:
-            curr = Transaction()
-            curr.from_json(t)
-            self.transactions.append(curr)
+        if include_transactions and block.get("transactions"):
+            self._pending_transactions = ("json", block["transactions"])
 
     def to_json(self) -> Dict:
         return {
@@ -58,28 +93,21 @@ class Block:
             "id": self.id,
             "timestamp": self.timestamp,
             "difficulty": self.difficulty,
-            "nonce": bytes(self.nonce),
-            "merkle_root": bytes(self.merkle_root),
-            "last_block_hash": bytes(self.last_block_hash),
+            "nonce": self.nonce,
+            "merkle_root": self.merkle_root,
+            "last_block_hash": self.last_block_hash,
             "transactions": transactions
         }
 
     def to_avro(self, include_transactions=False) -> bytes:
-        schema = avro.schema.parse(open("schema.json", "rb").read())
-        writer = DatumWriter(schema)
-        bytes_writer = io.BytesIO()
-        encoder = avro.io.BinaryEncoder(bytes_writer)
-        writer.write(self.to_avro_dict(include_transactions=include_transactions), encoder)
-        ret = bytes_writer.getvalue()
-        bytes_writer.close()
-        return ret
-    
+        return avro_codec.encode(
+            self.to_avro_dict(include_transactions=include_transactions)
+        )
+
     def from_avro(self, data: bytes):
-        schema = avro.schema.parse(open("schema.json", "rb").read())
-        f = io.BytesIO(data)
-        decoder = avro.io.BinaryDecoder(f)
-        reader = DatumReader(schema)
-        result = reader.read(decoder)
+        self.from_avro_dict(avro_codec.decode(data))
+
+    def from_avro_dict(self, result: Dict):
         self.nonce = result["nonce"]
         self.merkle_root = result["merkle_root"]
         self.last_block_hash = result["last_block_hash"]
@@ -87,16 +115,20 @@ class Block:
         self.difficulty = result["difficulty"]
         self.timestamp = result["timestamp"]
         self.transactions = []
-        for t in result["transactions"]:
-            curr = Transaction()
-            curr.from_avro_dict(t)
-            self.transactions.append(curr)
+        if result["transactions"]:
+            self._pending_transactions = ("avro", result["transactions"])
 
     def copy(self) -> "Block":
-        return copy.deepcopy(self)
+        b = Block.__new__(Block)
+        for name in Block.__slots__:
+            setattr(b, name, getattr(self, name))
+        b._transactions = [t.copy() for t in self._transactions]
+        return b
 
     def add_transaction(self, t: Transaction):
-        self.transactions.append(t.copy())
+        curr = t.copy()
+        curr.seal()
+        self.transactions.append(curr)
 
     def set_nonce(self, s: SHA256Hash):
         self.nonce = s
@@ -114,12 +146,11 @@ class Block:
         self.difficulty = d
 
     def get_hash(self) -> SHA256Hash:
-        difficulty = bytearray(self.difficulty.to_bytes(4))
-        timestamp = bytearray(self.timestamp.to_bytes(8))
-        difficulty.reverse()
-        timestamp.reverse()
         return sha_256(
-            bytes(self.merkle_root + self.last_block_hash + difficulty + timestamp)
+            self.merkle_root
+            + self.last_block_hash
+            + self.difficulty.to_bytes(4, "little")
+            + self.timestamp.to_bytes(8, "little")
         )
 
     def get_nonce(self) -> SHA256Hash:
@@ -143,6 +174,11 @@ class Block:
     def get_transactions(self) -> List[Transaction]:
         return self.transactions
 
+    def get_transaction_count(self) -> int:
+        if self._pending_transactions is not None:
+            return len(self._pending_transactions[1])
+        return len(self._transactions)
+
     def get_id(self) -> int:
         return self.id
 
@@ -164,3 +200,43 @@ class Block:
             )
 
         return False
+
+
+def blocks_to_avro(blocks: List[Block], include_transactions=False) -> bytes:
+    return avro_codec.encode_many(
+        [b.to_avro_dict(include_transactions=include_transactions) for b in blocks]
+    )
+
+
+def blocks_from_avro(data: bytes) -> List[Block]:
+    blocks = []
+    for result in avro_codec.decode_many(data):
+        b = Block()
+        b.from_avro_dict(result)
+        blocks.append(b)
+    return blocks
+
+
+def _verify_nonce_chunk(headers: Sequence[Block]) -> List[bool]:
+    sha256 = hashlib.sha256
+    results = []
+    for header in headers:
+        digest = sha256(header.get_hash() + header.get_nonce()).digest()
+        results.append(int.from_bytes(digest) < pow_threshold(header.difficulty))
+    return results
+
+
+def verify_nonces(
+    headers: Sequence[Block],
+    executor: Optional[Executor] = None,
+    chunk_size: int = BLOCK_HEADERS_PER_FETCH,
+) -> List[bool]:
+    # Proof of work check for a whole range of headers, e.g. one header
+    # fetch during sync. Returns one result per header, in order.
+    if executor is None or len(headers) <= chunk_size:
+        return _verify_nonce_chunk(headers)
+    chunks = [headers[i : i + chunk_size] for i in range(0, len(headers), chunk_size)]
+    results: List[bool] = []
+    for chunk_results in executor.map(_verify_nonce_chunk, chunks):
+        results.extend(chunk_results)
+    return results
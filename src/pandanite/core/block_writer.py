@@ -0,0 +1,63 @@
+import queue
+import threading
+from typing import Callable, Optional
+from pandanite.core.constants import WRITE_BEHIND_QUEUE_DEPTH
+from pandanite.storage.overlay import PendingGroup
+
+
+class BlockWriter:
+    """
+    Writes sealed groups of blocks on a background thread, strictly in the
+    order they were submitted, so validating the next blocks overlaps with
+    storing the previous ones. At most depth groups wait in the queue;
+    submit() blocks while it is full. After a failed write the groups
+    still queued are discarded, never written out of order, and the error
+    is raised by the next submit() or flush().
+    """
+
+    def __init__(
+        self,
+        write: Callable[[PendingGroup], None],
+        depth: int = WRITE_BEHIND_QUEUE_DEPTH,
+    ):
+        self._write = write
+        self._queue: "queue.Queue[Optional[PendingGroup]]" = queue.Queue(depth)
+        self._error: Optional[BaseException] = None
+        self._thread: Optional[threading.Thread] = threading.Thread(
+            target=self._run, name="block-writer", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            group = self._queue.get()
+            try:
+                if group is None:
+                    return
+                if self._error is None:
+                    self._write(group)
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def submit(self, group: PendingGroup):
+        self._check()
+        self._queue.put(group)
+
+    def flush(self):
+        # Waits until every submitted group is written
+        self._queue.join()
+        self._check()
+
+    def close(self):
+        # Lets the queued groups finish, then stops the thread
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
@@ -1,32 +1,98 @@
 import json
 import threading
-from typing import Dict, cast
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Union, cast
 from pandanite.logging import logger
-from pandanite.core.helpers import PDN, compute_difficulty
+from pandanite.core.helpers import PDN, compute_difficulty, get_current_time
 from pandanite.core.constants import (
     DIFFICULTY_LOOKBACK,
+    MEDIAN_TIME_BLOCKS,
     DESIRED_BLOCK_TIME_SEC,
     MAX_TRANSACTIONS_PER_BLOCK,
+    SYNC_COMMIT_BLOCKS,
+    SYNC_COMMIT_INTERVAL_MS,
+    WRITE_BEHIND_QUEUE_DEPTH,
 )
 from pandanite.core.common import TransactionAmount
-from pandanite.core.crypto import PublicWalletAddress, sha_256_to_string
+from pandanite.core.crypto import PublicWalletAddress, SHA256Hash
 from pandanite.core.executor import ExecutionStatus
-from pandanite.core.transaction import Transaction, get_merkle_hash
-from pandanite.storage.db import PandaniteDB
+from pandanite.core.transaction import (
+    Transaction,
+    get_merkle_hash,
+    verify_signatures,
+)
+from pandanite.storage.base import Storage, Session, WalletTransaction
+from pandanite.storage.block_store import BlockStore
+from pandanite.storage.overlay import PendingGroup, StorageOverlay
+from pandanite.storage.undo import UndoRecord, merge_undo_records
 from pandanite.core.block import Block
+from pandanite.core.consensus import ConsensusState
+from pandanite.core.block_writer import BlockWriter
 from pandanite.core.executor import execute_block, rollback_block
 
 
+def check_block(block: Block) -> ExecutionStatus:
+    """
+    The checks of add_block that need no chain state: transaction count,
+    proof of work, merkle root and signatures. Sorts the transactions in
+    place as add_block does. Top level so process pools can run it.
+    """
+    if len(block.get_transactions()) > MAX_TRANSACTIONS_PER_BLOCK:
+        return ExecutionStatus.INVALID_TRANSACTION_COUNT
+    if not block.verify_nonce():
+        return ExecutionStatus.INVALID_NONCE
+    if block.get_merkle_root() != get_merkle_hash(block.get_transactions()):
+        return ExecutionStatus.INVALID_MERKLE_ROOT
+    # genesis transactions are unsigned
+    if block.get_id() != 1 and not verify_signatures(block.get_transactions()):
+        return ExecutionStatus.INVALID_SIGNATURE
+    return ExecutionStatus.SUCCESS
+
+
 class BlockChain:
-    def __init__(self: "BlockChain", db: PandaniteDB):
+    def __init__(
+        self: "BlockChain",
+        db: Storage,
+        executor: Optional[Executor] = None,
+        block_store: Optional[BlockStore] = None,
+    ):
         self.db = db
         self.lock = threading.Lock()
+        # optional thread/process pool used to verify block signatures
+        self.executor = executor
+        # optional archive of serialized blocks, kept in step with db
+        self.block_store = block_store
+        if block_store is not None:
+            self._sync_block_store()
+        self.consensus = ConsensusState()
+        self.consensus.load(db.headers, db.get_num_blocks())
+        # blocks validated but not yet committed while in sync_mode()
+        self.overlay: Optional[StorageOverlay] = None
+        self.commit_blocks = SYNC_COMMIT_BLOCKS
+        self.commit_interval_ms = SYNC_COMMIT_INTERVAL_MS
+        self._last_commit = 0
+        # writes the sealed groups when sync_mode(write_behind=True)
+        self.writer: Optional[BlockWriter] = None
+
+    def _sync_block_store(self: "BlockChain"):
+        # The store is appended to before db commits, so after a crash it
+        # can be ahead; it is behind when first enabled on an existing db
+        block_store = cast(BlockStore, self.block_store)
+        block_store.truncate(self.db.get_num_blocks())
+        for block_id in range(
+            block_store.get_num_blocks() + 1, self.db.get_num_blocks() + 1
+        ):
+            block_store.append(self.db.get_block(block_id))
 
     def start_session(self):
         return self.lock
 
     def load_genesis(self: "BlockChain"):
         self.db.clear()
+        self.consensus.load(self.db.headers, 0)
+        if self.block_store is not None:
+            self.block_store.truncate(0)
         with open("genesis.json", "r") as f:
             block = Block()
             block.from_json(json.loads(f.read()))
@@ -58,7 +124,55 @@ class BlockChain:
     def get_header_chain_stats(self) -> Dict[str, int]:
         return {}
 
+    def get_last_hash(self) -> SHA256Hash:
+        return self.db.get_last_hash()
+
+    def create_block_template(
+        self: "BlockChain",
+        miner: PublicWalletAddress,
+        transactions: Optional[List[Transaction]] = None,
+    ) -> Block:
+        # Builds the next block on the current tip, everything but the nonce
+        block = Block()
+        block.set_id(self.db.get_num_blocks() + 1)
+        block.set_timestamp(get_current_time())
+        fee = Transaction(miner, self.get_current_mining_fee(block.get_id()))
+        fee.set_timestamp(block.get_timestamp())
+        block.add_transaction(fee)
+        for t in transactions or []:
+            block.add_transaction(t)
+        block.set_merkle_root(get_merkle_hash(block.get_transactions()))
+        block.set_last_block_hash(self.db.get_last_hash())
+        block.set_difficulty(self.db.get_difficulty())
+        return block
+
     def pop_block(self: "BlockChain"):
+        self.pop_blocks(1)
+
+    def pop_blocks(self: "BlockChain", count: int):
+        # Rewinds the tip count blocks with one storage transaction, from
+        # the undo records written by add_block
+        self.flush()
+        num_blocks = self.db.get_num_blocks()
+        start_id = max(1, num_blocks - count + 1)
+        if start_id > num_blocks:
+            return
+        records = self.db.get_undo_records(start_id, num_blocks)
+        if len(records) != num_blocks - start_id + 1:
+            # blocks committed before undo records were kept
+            for _ in range(start_id, num_blocks + 1):
+                self._rollback_tip()
+            return
+        try:
+            with self.db.transaction() as session:
+                self.db.rewind(merge_undo_records(records), session)
+        finally:
+            self.consensus.load(self.db.headers, self.db.get_num_blocks())
+        if self.block_store is not None:
+            self.block_store.truncate(self.db.get_num_blocks())
+
+    def _rollback_tip(self: "BlockChain"):
+        # Re-executes the tip block backwards; the difficulty is not restored
         block = self.db.get_block(self.db.get_num_blocks())
         affected_wallets: list[PublicWalletAddress] = []
         for t in block.get_transactions():
@@ -68,34 +182,57 @@ class BlockChain:
 
         wallets = self.db.get_wallets(affected_wallets)
         updated_wallets = rollback_block(wallets, block)
-        with self.db.start_session() as session:
-            with session.start_transaction():
-                self.db.pop_block()
-                for wallet in updated_wallets.keys():
-                    self.db.update_wallet(wallet, updated_wallets[wallet])
-                for t in block.get_transactions():
-                    tx_id = sha_256_to_string(t.get_hash())
-                    self.db.remove_wallet_transaction(t.get_recepient(), tx_id)
-                    if not t.is_fee() and block.get_id() != 1:
-                        self.db.remove_wallet_transaction(t.get_sender(), tx_id)
-                self._update_difficulty()
+        try:
+            with self.db.transaction() as session:
+                self.db.pop_block(session)
+                self.consensus.pop(self.db.headers)
+                self.db.update_wallets(updated_wallets, session)
+                self.db.remove_wallet_transactions(
+                    self._wallet_transactions(block), session
+                )
+                self._update_difficulty(self.db, session)
+        except BaseException:
+            self.consensus.load(self.db.headers, self.db.get_num_blocks())
+            raise
+        if self.block_store is not None:
+            self.block_store.truncate(self.db.get_num_blocks())
+
+    def _wallet_transactions(
+        self: "BlockChain", block: Block
+    ) -> List[WalletTransaction]:
+        # wallet history entries for every transaction of the block, keyed
+        # like the transaction index so pages resolve through it
+        entries: List[WalletTransaction] = []
+        for t in block.get_transactions():
+            tx_id = t.get_id()
+            entries.append((t.get_recepient(), tx_id, block.get_id()))
+            if not t.is_fee() and block.get_id() != 1:
+                entries.append((t.get_sender(), tx_id, block.get_id()))
+        return entries
 
     def add_block(
-        self: "BlockChain", block: Block, network_timestamp: int = 0
+        self: "BlockChain",
+        block: Block,
+        network_timestamp: int = 0,
+        verified: bool = False,
     ) -> ExecutionStatus:
+        # verified skips the checks that need no chain state, proof of work,
+        # merkle root and signatures, for blocks that passed check_block
         if len(block.get_transactions()) > MAX_TRANSACTIONS_PER_BLOCK:
             return ExecutionStatus.INVALID_TRANSACTION_COUNT
 
+        state = self._state()
+
         # check for repeated transactions
         for t in block.get_transactions():
-            if self.db.block_for_transaction(t) > 0 and not t.is_fee():
+            if state.block_for_transaction(t) > 0 and not t.is_fee():
                 return ExecutionStatus.EXPIRED_TRANSACTION
 
-        if block.get_id() != self.db.get_num_blocks() + 1:
+        if block.get_id() != state.get_num_blocks() + 1:
             return ExecutionStatus.INVALID_BLOCK_ID
 
         # check difficulty + nonce
-        if block.get_difficulty() != self.db.get_difficulty():
+        if block.get_difficulty() != state.get_difficulty():
             if (
                 block.get_id() >= 536100
                 and block.get_id() <= 536200
@@ -107,10 +244,10 @@ class BlockChain:
             else:
                 return ExecutionStatus.INVALID_DIFFICULTY
 
-        if not block.verify_nonce():
+        if not verified and not block.verify_nonce():
             return ExecutionStatus.INVALID_NONCE
 
-        if block.get_last_block_hash() != self.db.get_last_hash():
+        if block.get_last_block_hash() != state.get_last_hash():
             return ExecutionStatus.INVALID_LASTBLOCK_HASH
 
         if block.get_id() != 1:
@@ -120,69 +257,203 @@ class BlockChain:
                 return ExecutionStatus.BLOCK_TIMESTAMP_IN_FUTURE
 
             # block must be after the median timestamp of last 10 blocks
-            if self.db.get_num_blocks() > 10:
-                times: list[int] = []
-                for i in range(0, 10):
-                    b = self.db.get_block(self.db.get_num_blocks() - i)
-                    times.append(b.get_timestamp())
-
-                times = sorted(times)
-                # compute median
-                if len(times) % 2 == 0:
-                    median_time = (
-                        times[len(times) // 2] + times[len(times) // 2 - 1]
-                    ) / 2
-                else:
-                    median_time = times[len(times) // 2]
+            if state.get_num_blocks() > MEDIAN_TIME_BLOCKS:
+                median_time = self.consensus.get_median_time()
                 if block.get_timestamp() < median_time:
                     return ExecutionStatus.BLOCK_TIMESTAMP_TOO_OLD
 
         # compute merkle tree and verify root matches;
-        merkle_root = get_merkle_hash(block.get_transactions())
-        if block.get_merkle_root() != merkle_root:
-            return ExecutionStatus.INVALID_MERKLE_ROOT
+        if not verified:
+            merkle_root = get_merkle_hash(block.get_transactions())
+            if block.get_merkle_root() != merkle_root:
+                return ExecutionStatus.INVALID_MERKLE_ROOT
 
         affected_wallets: list[PublicWalletAddress] = []
         for t in block.get_transactions():
             affected_wallets.append(t.get_recepient())
             if not t.is_fee():
                 affected_wallets.append(t.get_sender())
-        wallets = self.db.get_wallets(affected_wallets)
+        wallets = state.get_wallets(affected_wallets)
+        prior_balances = dict(wallets)
+        prior_work = state.get_total_work()
+        prior_difficulty = state.get_difficulty()
 
         # TODO: Run executor, add block
         status, updated_wallets = execute_block(
-            self.db, wallets, block, self.get_current_mining_fee(block.get_id())
+            state,
+            wallets,
+            block,
+            self.get_current_mining_fee(block.get_id()),
+            self.executor,
+            check_signatures=not verified,
         )
 
         if status != ExecutionStatus.SUCCESS:
             return status
 
         updated_wallets = cast(Dict[str, TransactionAmount], updated_wallets)
+        wallet_transactions = self._wallet_transactions(block)
+        undo = UndoRecord.for_block(
+            block.get_id(),
+            prior_work,
+            prior_difficulty,
+            {address: prior_balances.get(address, 0) for address in updated_wallets},
+            [t.get_id() for t in block.get_transactions()],
+            wallet_transactions,
+        )
 
-        with self.db.start_session() as session:
-            with session.start_transaction():
-                self.db.add_block(block)
-                for wallet in updated_wallets.keys():
-                    self.db.update_wallet(wallet, updated_wallets[wallet])
-                for t in block.get_transactions():
-                    tx_id = sha_256_to_string(t.get_hash())
-                    self.db.add_wallet_transaction(t.get_recepient(), tx_id)
-                    if not t.is_fee() and block.get_id() != 1:
-                        self.db.add_wallet_transaction(t.get_sender(), tx_id)
-                self._update_difficulty()
+        if self.overlay is not None:
+            self.overlay.add_block(block, undo, updated_wallets, wallet_transactions)
+            self.consensus.push(block)
+            self._update_difficulty(self.overlay)
+            if (
+                len(self.overlay) >= self.commit_blocks
+                or get_current_time() - self._last_commit >= self.commit_interval_ms
+            ):
+                self.commit()
+            return ExecutionStatus.SUCCESS
+
+        if self.block_store is not None:
+            self.block_store.append(block)
+        try:
+            with self.db.transaction() as session:
+                self.db.add_block(block, session)
+                self.db.add_undo_record(undo, session)
+                self.consensus.push(block)
+                self.db.update_wallets(updated_wallets, session)
+                self.db.add_wallet_transactions(wallet_transactions, session)
+                self._update_difficulty(self.db, session)
+        except BaseException:
+            self.consensus.load(self.db.headers, self.db.get_num_blocks())
+            if self.block_store is not None:
+                self.block_store.truncate(block.get_id() - 1)
+            raise
+        return ExecutionStatus.SUCCESS
+
+    def add_blocks(
+        self: "BlockChain",
+        blocks: Iterable[Block],
+        network_timestamp: int = 0,
+        group_commit: bool = False,
+    ) -> ExecutionStatus:
+        # Validates and adds blocks as they are produced, e.g. by the
+        # streaming decoder, stopping at the first one that fails. With
+        # group_commit the blocks are added in sync_mode().
+        if group_commit and self.overlay is None:
+            with self.sync_mode():
+                return self.add_blocks(blocks, network_timestamp)
+        for block in blocks:
+            status = self.add_block(block, network_timestamp)
+            if status != ExecutionStatus.SUCCESS:
+                return status
         return ExecutionStatus.SUCCESS
 
-    def _update_difficulty(self: "BlockChain"):
-        if self.db.get_num_blocks() <= DIFFICULTY_LOOKBACK * 2:
+    @contextmanager
+    def sync_mode(
+        self: "BlockChain",
+        commit_blocks: int = SYNC_COMMIT_BLOCKS,
+        commit_interval_ms: int = SYNC_COMMIT_INTERVAL_MS,
+        write_behind: bool = False,
+        queue_depth: int = WRITE_BEHIND_QUEUE_DEPTH,
+    ) -> Iterator[StorageOverlay]:
+        """
+        Group commit for catching up: blocks added inside the with block
+        are validated against an in-memory overlay of the ledger, the
+        transaction index and the tip state, then written in a single
+        storage transaction every commit_blocks blocks or commit_interval_ms
+        milliseconds, and on exit. A rejected block leaves no trace and
+        the blocks before it stay pending; if the body raises, every
+        uncommitted block is dropped.
+
+        With write_behind the groups are written by a BlockWriter thread
+        while the next blocks are validated against the overlay, with at
+        most queue_depth groups waiting. All are written when the with
+        block exits.
+        """
+        if self.overlay is not None:
+            raise Exception("Already in sync mode")
+        overlay = StorageOverlay(self.db)
+        self.overlay = overlay
+        self.commit_blocks = commit_blocks
+        self.commit_interval_ms = commit_interval_ms
+        self._last_commit = get_current_time()
+        if write_behind:
+            self.writer = BlockWriter(
+                lambda group: self._write_group(overlay, group), queue_depth
+            )
+        try:
+            yield overlay
+            self.flush()
+        except BaseException:
+            if self.writer is not None:
+                self.writer.close()
+            self._reset_overlay()
+            raise
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+            self.overlay = None
+
+    def commit(self: "BlockChain"):
+        # Seals the blocks pending in sync mode and writes them, all or
+        # none, or hands them to the writer thread
+        overlay = self.overlay
+        if overlay is None or len(overlay) == 0:
+            return
+        group = overlay.seal()
+        self._last_commit = get_current_time()
+        if self.writer is not None:
+            self.writer.submit(group)
+            return
+        try:
+            self._write_group(overlay, group)
+        except BaseException:
+            self._reset_overlay()
+            raise
+
+    def flush(self: "BlockChain"):
+        # Commits the pending blocks and waits until they are stored
+        self.commit()
+        if self.writer is not None:
+            self.writer.flush()
+
+    def _write_group(self: "BlockChain", overlay: StorageOverlay, group: PendingGroup):
+        # The block store is appended to first, as in add_block, so the db
+        # never refers to a block the store lacks
+        try:
+            if self.block_store is not None:
+                for block in group.blocks:
+                    self.block_store.append(block)
+            with self.db.transaction() as session:
+                group.commit(self.db, session)
+        except BaseException:
+            if self.block_store is not None:
+                self.block_store.truncate(self.db.get_num_blocks())
+            raise
+        overlay.release(group)
+
+    def _reset_overlay(self: "BlockChain"):
+        # Back to the stored state after a failed or abandoned sync
+        if self.overlay is not None:
+            self.overlay.clear()
+        self.consensus.load(self.db.headers, self.db.get_num_blocks())
+
+    def _state(self: "BlockChain") -> Union[Storage, StorageOverlay]:
+        # where add_block reads the tip, ledger and transaction index
+        if self.overlay is not None:
+            return self.overlay
+        return self.db
+
+    def _update_difficulty(
+        self: "BlockChain",
+        state: Union[Storage, StorageOverlay],
+        session: Optional[Session] = None,
+    ):
+        if state.get_num_blocks() <= DIFFICULTY_LOOKBACK * 2:
             return
-        if self.db.get_num_blocks() % DIFFICULTY_LOOKBACK != 0:
+        if state.get_num_blocks() % DIFFICULTY_LOOKBACK != 0:
             return
-        first_id = self.db.get_num_blocks() - DIFFICULTY_LOOKBACK
-        last_id = self.db.get_num_blocks()
-        first = self.db.get_block(first_id)
-        last = self.db.get_block(last_id)
-        elapsed = last.get_timestamp() - first.get_timestamp()
-        numBlocksElapsed = last_id - first_id
-        target = numBlocksElapsed * DESIRED_BLOCK_TIME_SEC
-        difficulty = last.get_difficulty()
-        self.db.set_difficulty(compute_difficulty(difficulty, elapsed, target))
+        elapsed, difficulty = self.consensus.get_retarget_inputs(DIFFICULTY_LOOKBACK)
+        target = DIFFICULTY_LOOKBACK * DESIRED_BLOCK_TIME_SEC
+        state.set_difficulty(compute_difficulty(difficulty, elapsed, target), session)
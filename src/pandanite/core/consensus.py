@@ -0,0 +1,80 @@
+from collections import deque
+from typing import Deque, Tuple
+from pandanite.core.block import Block
+from pandanite.core.constants import DIFFICULTY_LOOKBACK, MEDIAN_TIME_BLOCKS
+from pandanite.storage.header_index import HeaderIndex
+
+
+class ConsensusState:
+    """
+    Timestamps and difficulties of the most recent blocks, kept in ring
+    buffers so the median time and retarget checks never read storage.
+    The window covers the tip and the DIFFICULTY_LOOKBACK blocks before
+    it; add and pop update it incrementally.
+    """
+
+    def __init__(self, size: int = DIFFICULTY_LOOKBACK + 1):
+        self.size = size
+        self.num_blocks = 0
+        self.timestamps: Deque[int] = deque(maxlen=size)
+        self.difficulties: Deque[int] = deque(maxlen=size)
+
+    def load(self, headers: HeaderIndex, num_blocks: int):
+        self.timestamps.clear()
+        self.difficulties.clear()
+        self.num_blocks = num_blocks
+        for block_id in range(max(1, num_blocks - self.size + 1), num_blocks + 1):
+            self.timestamps.append(headers.get_timestamp(block_id))
+            self.difficulties.append(headers.get_difficulty(block_id))
+
+    def push(self, block: Block):
+        if block.get_id() != self.num_blocks + 1:
+            raise Exception("Block out of order")
+        self.timestamps.append(block.get_timestamp())
+        self.difficulties.append(block.get_difficulty())
+        self.num_blocks += 1
+
+    def pop(self, headers: HeaderIndex):
+        # Drops the tip; the block that re-enters the window at the old
+        # end is read from the header index
+        if self.num_blocks == 0:
+            return
+        self.timestamps.pop()
+        self.difficulties.pop()
+        self.num_blocks -= 1
+        oldest = self.num_blocks - len(self.timestamps)
+        if oldest >= 1:
+            self.timestamps.appendleft(headers.get_timestamp(oldest))
+            self.difficulties.appendleft(headers.get_difficulty(oldest))
+
+    def _position(self, block_id: int) -> int:
+        position = len(self.timestamps) - 1 - (self.num_blocks - block_id)
+        if block_id > self.num_blocks or position < 0:
+            raise Exception("Block outside of consensus window")
+        return position
+
+    def get_timestamp(self, block_id: int) -> int:
+        return self.timestamps[self._position(block_id)]
+
+    def get_difficulty(self, block_id: int) -> int:
+        return self.difficulties[self._position(block_id)]
+
+    def get_median_time(self, count: int = MEDIAN_TIME_BLOCKS) -> float:
+        # median timestamp of the last count blocks
+        times = sorted(
+            self.timestamps[len(self.timestamps) - 1 - i]
+            for i in range(0, min(count, len(self.timestamps)))
+        )
+        if len(times) == 0:
+            return 0
+        if len(times) % 2 == 0:
+            return (times[len(times) // 2] + times[len(times) // 2 - 1]) / 2
+        return times[len(times) // 2]
+
+    def get_retarget_inputs(
+        self, lookback: int = DIFFICULTY_LOOKBACK
+    ) -> Tuple[int, int]:
+        # (elapsed seconds over the last lookback blocks, tip difficulty)
+        first_id = self.num_blocks - lookback
+        elapsed = self.get_timestamp(self.num_blocks) - self.get_timestamp(first_id)
+        return elapsed, self.get_difficulty(self.num_blocks)
@@ -1,4 +1,5 @@
 DIFFICULTY_LOOKBACK = 100
+MEDIAN_TIME_BLOCKS = 10
 DESIRED_BLOCK_TIME_SEC = 90
 MIN_DIFFICULTY = 6
 MAX_DIFFICULTY = 255
@@ -12,3 +13,17 @@ BLOCKS_PER_FETCH = 200
 BLOCK_HEADERS_PER_FETCH = 2000
 
 MAX_TRANSACTIONS_PER_BLOCK = 25000
+SIGNATURE_BATCH_SIZE = 500
+PUBLIC_KEY_CACHE_SIZE = 65536
+MINING_BATCH_SIZE = 20000
+WALLET_LOOKUP_BATCH_SIZE = 1000
+MAX_BALANCE_QUERY_ADDRESSES = 10000
+BLOCK_SEGMENT_SIZE = 64 * 1024 * 1024
+WALLET_HISTORY_BUCKET_SIZE = 128
+WALLET_HISTORY_PAGE_SIZE = 50
+MAX_WALLET_HISTORY_PAGE_SIZE = 500
+INDEX_DELETE_BATCH_SIZE = 1000
+SYNC_COMMIT_BLOCKS = 100
+SYNC_COMMIT_INTERVAL_MS = 1000
+WRITE_BEHIND_QUEUE_DEPTH = 2
+SYNC_PIPELINE_DEPTH = 64
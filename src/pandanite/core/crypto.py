@@ -2,13 +2,15 @@ import random
 import hashlib
 import ed25519
 
-from typing import TypeAlias, Tuple, Union
+from functools import lru_cache
+from typing import TypeAlias, Tuple, Union, Dict, Optional
 from Crypto.Hash import RIPEMD160
 from pandanite.core.common import WorkAmount
+from pandanite.core.constants import PUBLIC_KEY_CACHE_SIZE
 
-SHA256Hash: TypeAlias = bytearray
-RIPEMDHash: TypeAlias = bytearray
-PublicWalletAddress: TypeAlias = bytearray
+SHA256Hash: TypeAlias = bytes
+RIPEMDHash: TypeAlias = bytes
+PublicWalletAddress: TypeAlias = bytes
 PublicKey: TypeAlias = ed25519.keys.VerifyingKey
 PrivateKey: TypeAlias = ed25519.keys.SigningKey
 TransactionSignature: TypeAlias = bytes
@@ -16,16 +18,17 @@ TransactionSignature: TypeAlias = bytes
 NULL_SHA256_HASH = SHA256Hash(32)
 NULL_KEY = SHA256Hash(32)
 NULL_ADDRESS = PublicWalletAddress(25)
+NONCE_SPACE = 2**256
 
 
 def sha_256(buf: Union[bytes, bytearray]) -> SHA256Hash:
-    return bytearray(hashlib.sha256(buf).digest())
+    return hashlib.sha256(buf).digest()
 
 
 def ripemd(buf: Union[bytes, bytearray]) -> RIPEMDHash:
     hash_obj = RIPEMD160.new()
     hash_obj.update(buf)
-    return bytearray(hash_obj.digest())
+    return hash_obj.digest()
 
 
 def string_to_sha_256(hex: str):
@@ -36,8 +39,8 @@ def sha_256_to_string(hash: SHA256Hash) -> str:
     return hex_encode(hash)
 
 
-def hex_decode(hex: str) -> bytearray:
-    return bytearray.fromhex(hex)
+def hex_decode(hex: str) -> bytes:
+    return bytes.fromhex(hex)
 
 
 def hex_encode(buf: Union[bytes, bytearray]) -> str:
@@ -48,15 +51,20 @@ def concat_hashes(a: SHA256Hash, b: SHA256Hash) -> SHA256Hash:
     return sha_256(a + b)
 
 
-def check_leading_zero_bits(hash: SHA256Hash, N: int) -> bool:
-    for i in range(N):
-        byte_index = i // 8
-        bit_index = i % 8
-        if hash[byte_index] & (1 << (7 - bit_index)):
-            return False
-        if byte_index == len(hash) - 1 and i < N - 1:
-            return False
-    return True
+@lru_cache(maxsize=None)
+def pow_threshold(challenge_size: int, hash_size: int = 32) -> int:
+    # A hash has challenge_size leading zero bits iff, read as a big endian
+    # integer, it is below this threshold. As in the original C++ check,
+    # challenges reaching past the first bit of the final byte never pass.
+    if challenge_size <= 0:
+        return 1 << (8 * hash_size)
+    if challenge_size > 8 * (hash_size - 1) + 1:
+        return 0
+    return 1 << (8 * hash_size - challenge_size)
+
+
+def check_leading_zero_bits(hash: Union[bytes, bytearray], N: int) -> bool:
+    return int.from_bytes(hash) < pow_threshold(N, len(hash))
 
 
 def add_work(previous_work: WorkAmount, challenge_size: int) -> WorkAmount:
@@ -68,24 +76,44 @@ def remove_work(previous_work: WorkAmount, challenge_size: int) -> WorkAmount:
 
 
 def wallet_address_from_public_key(input_key: PublicKey) -> PublicWalletAddress:
-    address = [0]
+    return _wallet_address_from_key_bytes(input_key.to_bytes())
+
+
+# Active senders appear in many transactions, so both the parsed keys and
+# their derived wallet addresses are interned in bounded LRU caches.
+@lru_cache(maxsize=PUBLIC_KEY_CACHE_SIZE)
+def _wallet_address_from_key_bytes(key: bytes) -> bytes:
+    hash1 = hashlib.sha256(key).digest()
+    hash2 = ripemd(hash1)
+    hash3 = hashlib.sha256(hash2).digest()
+    hash4 = hashlib.sha256(hash3).digest()
+    return bytes([0]) + hash2 + hash4[0:4]
+
 
-    hash1 = hashlib.sha256(input_key.to_bytes())
+@lru_cache(maxsize=PUBLIC_KEY_CACHE_SIZE)
+def public_key_from_bytes(key: bytes) -> PublicKey:
+    return ed25519.keys.VerifyingKey(key)
 
-    hash2 = RIPEMD160.new()
-    hash2.update(hash1.digest())
 
-    hash3 = hashlib.sha256(hash2.digest())
-    hash4 = hashlib.sha256(hash3.digest())
+def get_key_cache_stats() -> Dict[str, Dict[str, int]]:
+    stats = {}
+    for name, cache in [
+        ("public_keys", public_key_from_bytes),
+        ("wallet_addresses", _wallet_address_from_key_bytes),
+    ]:
+        info = cache.cache_info()
+        stats[name] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "max_size": info.maxsize or 0,
+        }
+    return stats
 
-    for i in range(0, 20):
-        address.append(hash2.digest()[i])
 
-    address.append(hash4.digest()[0])
-    address.append(hash4.digest()[1])
-    address.append(hash4.digest()[2])
-    address.append(hash4.digest()[3])
-    return bytearray(address)
+def clear_key_caches():
+    public_key_from_bytes.cache_clear()
+    _wallet_address_from_key_bytes.cache_clear()
 
 
 def verify_hash(target: SHA256Hash, nonce: SHA256Hash, difficulty: int):
@@ -116,7 +144,7 @@ def public_key_to_string(public_key: PublicKey) -> str:
 def string_to_public_key(s: str) -> PublicKey:
     if len(s) != 64:
         raise Exception("Invalid public key string")
-    return ed25519.keys.VerifyingKey(s, encoding="base16")
+    return public_key_from_bytes(bytes.fromhex(s))
 
 
 def private_key_to_string(private_key: PrivateKey) -> str:
@@ -134,7 +162,7 @@ def signature_to_string(t: TransactionSignature) -> str:
 
 
 def string_to_signature(t: str) -> TransactionSignature:
-    return bytes(hex_decode(t))
+    return hex_decode(t)
 
 
 def sign_with_private_key(content: str, priv_key: PrivateKey) -> TransactionSignature:
@@ -165,11 +193,27 @@ def check_signature_bytes(
         return False
 
 
-def mine_hash(target: SHA256Hash, challenge_size: int):
+def search_nonces(
+    target: SHA256Hash, challenge_size: int, start: int, step: int, count: int
+) -> Optional[SHA256Hash]:
+    # Tries count nonces start, start + step, ... reusing the SHA-256 state
+    # of the target prefix for every attempt.
+    prefix = hashlib.sha256(target)
+    threshold = pow_threshold(challenge_size)
+    nonce = start
+    for _ in range(count):
+        ctx = prefix.copy()
+        ctx.update(nonce.to_bytes(32))
+        if int.from_bytes(ctx.digest()) < threshold:
+            return nonce.to_bytes(32)
+        nonce = (nonce + step) % NONCE_SPACE
+    return None
+
+
+def mine_hash(target: SHA256Hash, challenge_size: int) -> SHA256Hash:
+    nonce = random.randrange(NONCE_SPACE)
     while True:
-        solution = SHA256Hash(random.randint(0, 2**256).to_bytes(32))
-        full_hash = concat_hashes(target, solution)
-        found = check_leading_zero_bits(full_hash, challenge_size)
-        if found:
-            break
-    return solution
+        solution = search_nonces(target, challenge_size, nonce, 1, 4096)
+        if solution is not None:
+            return solution
+        nonce = (nonce + 4096) % NONCE_SPACE
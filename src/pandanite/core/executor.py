@@ -1,5 +1,6 @@
 from enum import Enum
-from typing import Dict, Optional, Set, Tuple
+from concurrent.futures import Executor
+from typing import Dict, Optional, Set, Tuple, Union
 from pandanite.core.common import TransactionAmount
 from pandanite.core.crypto import (
     PublicWalletAddress,
@@ -8,7 +9,10 @@ from pandanite.core.crypto import (
     wallet_address_to_string,
 )
 from pandanite.core.block import Block
-from pandanite.storage.db import PandaniteDB
+from pandanite.core.constants import SIGNATURE_BATCH_SIZE
+from pandanite.core.transaction import verify_signatures
+from pandanite.storage.base import Storage
+from pandanite.storage.overlay import StorageOverlay
 
 
 class ExecutionStatus(Enum):
@@ -41,10 +45,13 @@ class ExecutionStatus(Enum):
 
 
 def execute_block(
-    db: PandaniteDB,
+    db: Union[Storage, StorageOverlay],
     wallets: Dict[str, TransactionAmount],
     block: Block,
     block_mining_fee: TransactionAmount,
+    executor: Optional[Executor] = None,
+    check_signatures: bool = True,
+    chunk_size: int = SIGNATURE_BATCH_SIZE,
 ) -> Tuple[ExecutionStatus, Optional[Dict[str, TransactionAmount]]]:
     # try executing each transaction
     miner: Optional[PublicWalletAddress] = None
@@ -72,10 +79,16 @@ def execute_block(
     if mining_fee != block_mining_fee:
         return ExecutionStatus.INCORRECT_MINING_FEE, None
 
-    for t in block.get_transactions():
-        if not t.is_fee() and not t.signature_valid() and block.get_id() != 1:
-            return ExecutionStatus.INVALID_SIGNATURE, None
+    # genesis transactions are unsigned; check_signatures is False when
+    # the caller has verified them already
+    if (
+        check_signatures
+        and block.get_id() != 1
+        and not verify_signatures(block.get_transactions(), executor, chunk_size)
+    ):
+        return ExecutionStatus.INVALID_SIGNATURE, None
 
+    for t in block.get_transactions():
         recepient_address = wallet_address_to_string(t.get_recepient())
 
         if block.get_id() == 1:
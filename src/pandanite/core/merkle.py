@@ -0,0 +1,63 @@
+"""
+Merkle trees stored as one flat array of raw 32 byte digests.
+
+The layout reproduces the queue based algorithm of the original C++ node:
+the leaves (padded to an even count by repeating the last one) are
+followed by every parent in the order the queue produced them. With n
+padded leaves, node k pairs with its sibling k ^ 1 and their parent is
+stored at n + k // 2. The root is the last node. Odd sized interior
+levels are not padded; their last node pairs with the first node of the
+next level, exactly as in the C++ code.
+"""
+
+import hashlib
+from typing import List
+
+
+def build_merkle_tree(leaves: List[bytes]) -> List[bytes]:
+    nodes = list(leaves)
+    if len(nodes) % 2 == 1:
+        nodes.append(nodes[-1])
+    sha256 = hashlib.sha256
+    i = 0
+    while len(nodes) - i > 1:
+        nodes.append(sha256(nodes[i] + nodes[i + 1]).digest())
+        i += 2
+    return nodes
+
+
+def merkle_root(leaves: List[bytes]) -> bytes:
+    if len(leaves) == 0:
+        return bytes(32)
+    return build_merkle_tree(leaves)[-1]
+
+
+def get_merkle_proof(leaves: List[bytes], index: int) -> List[bytes]:
+    # Sibling hashes from the leaf at index up to (not including) the root
+    nodes = build_merkle_tree(leaves)
+    num_leaves = len(leaves) + len(leaves) % 2
+    proof = []
+    k = index
+    while k < len(nodes) - 1:
+        proof.append(nodes[k ^ 1])
+        k = num_leaves + k // 2
+    return proof
+
+
+def verify_merkle_proof(
+    leaf: bytes, index: int, count: int, proof: List[bytes], root: bytes
+) -> bool:
+    # count is the number of leaves in the tree, before padding
+    num_leaves = count + count % 2
+    if index < 0 or index >= count:
+        return False
+    sha256 = hashlib.sha256
+    h = bytes(leaf)
+    k = index
+    for sibling in proof:
+        if k & 1:
+            h = sha256(bytes(sibling) + h).digest()
+        else:
+            h = sha256(h + bytes(sibling)).digest()
+        k = num_leaves + k // 2
+    return k == 2 * num_leaves - 2 and h == bytes(root)
@@ -0,0 +1,138 @@
+import os
+import time
+import queue
+import random
+import threading
+import multiprocessing
+from typing import Callable, List, Optional
+from pandanite.core.block import Block
+from pandanite.core.constants import MINING_BATCH_SIZE
+from pandanite.core.crypto import SHA256Hash, NONCE_SPACE, search_nonces
+
+
+def _mine_worker(
+    target: bytes,
+    challenge_size: int,
+    start: int,
+    step: int,
+    stop,
+    results,
+    hashes,
+):
+    nonce = start
+    while not stop.is_set():
+        solution = search_nonces(target, challenge_size, nonce, step, MINING_BATCH_SIZE)
+        with hashes.get_lock():
+            hashes.value += MINING_BATCH_SIZE
+        if solution is not None:
+            results.put(solution)
+            return
+        nonce = (nonce + step * MINING_BATCH_SIZE) % NONCE_SPACE
+
+
+class MiningEngine:
+    """
+    Searches for a block nonce across several worker processes. Worker i of
+    n tries the nonces base + i, base + i + n, ... so the workers never
+    overlap. A job stops when a solution is found, when cancel() is called,
+    or when get_tip() reports a tip different from the template's parent.
+    A cancel() made while no job runs cancels the next one.
+    """
+
+    def __init__(self, num_workers: Optional[int] = None, poll_interval=0.05):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.poll_interval = poll_interval
+        self._context = multiprocessing.get_context()
+        # tells the workers of the current job to stop
+        self._stop = self._context.Event()
+        # set by cancel() until a job returns because of it
+        self._cancelled = threading.Event()
+        self._hashes = self._context.Value("Q", 0)
+        self._started = 0.0
+        self._elapsed = 0.0
+        self._running = False
+
+    def mine(
+        self,
+        template: Block,
+        get_tip: Optional[Callable[[], SHA256Hash]] = None,
+    ) -> Optional[SHA256Hash]:
+        """
+        Mines the block template, setting and returning its nonce. Returns
+        None if the job was cancelled or the tip moved; the caller should
+        then build a new template and mine again.
+        """
+        if self._cancelled.is_set():
+            self._cancelled.clear()
+            return None
+        target = template.get_hash()
+        challenge_size = template.get_difficulty()
+        base = random.randrange(NONCE_SPACE)
+
+        self._stop.clear()
+        self._hashes = self._context.Value("Q", 0)
+        results = self._context.Queue()
+        workers: List[multiprocessing.Process] = []
+        for i in range(0, self.num_workers):
+            worker = self._context.Process(
+                target=_mine_worker,
+                args=(
+                    target,
+                    challenge_size,
+                    (base + i) % NONCE_SPACE,
+                    self.num_workers,
+                    self._stop,
+                    results,
+                    self._hashes,
+                ),
+                daemon=True,
+            )
+            workers.append(worker)
+
+        self._started = time.perf_counter()
+        self._running = True
+        for worker in workers:
+            worker.start()
+        try:
+            while True:
+                try:
+                    solution = results.get(timeout=self.poll_interval)
+                    template.set_nonce(solution)
+                    return solution
+                except queue.Empty:
+                    if self._cancelled.is_set():
+                        self._cancelled.clear()
+                        return None
+                    if (
+                        get_tip is not None
+                        and get_tip() != template.get_last_block_hash()
+                    ):
+                        return None
+        finally:
+            self._stop.set()
+            self._elapsed = time.perf_counter() - self._started
+            self._running = False
+            for worker in workers:
+                worker.join(timeout=1)
+                if worker.is_alive():
+                    worker.terminate()
+            results.close()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._stop.set()
+
+    def is_running(self) -> bool:
+        return self._running
+
+    def get_hash_count(self) -> int:
+        return self._hashes.value
+
+    def get_hashrate(self) -> float:
+        # hashes per second of the running job, or of the last one
+        elapsed = self._elapsed
+        if self._running:
+            elapsed = time.perf_counter() - self._started
+        if elapsed <= 0:
+            return 0.0
+        return self._hashes.value / elapsed
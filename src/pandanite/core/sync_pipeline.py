@@ -0,0 +1,149 @@
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Deque, Dict, Iterable, Optional, Tuple
+from pandanite.logging import logger
+from pandanite.core.block import Block
+from pandanite.core.blockchain import BlockChain, check_block
+from pandanite.core.constants import SYNC_PIPELINE_DEPTH
+from pandanite.core.executor import ExecutionStatus
+from pandanite.core.transaction import get_merkle_hash
+from pandanite.core.wire import Buffer, block_from_buffer
+
+STAGES = ["decode", "verify", "apply"]
+
+
+def _decode_block(raw: Buffer) -> Tuple[Block, float]:
+    start = time.perf_counter()
+    block, _ = block_from_buffer(raw)
+    # puts the transactions in the order add_block stores them, which its
+    # merkle check would otherwise do
+    get_merkle_hash(block.get_transactions())
+    return block, time.perf_counter() - start
+
+
+def _verify_block(raw: Buffer) -> Tuple[ExecutionStatus, float]:
+    # Runs in the verify executor on its own copy of the block, so only the
+    # serialized bytes and the status cross a process boundary
+    start = time.perf_counter()
+    block, _ = block_from_buffer(raw)
+    status = check_block(block)
+    return status, time.perf_counter() - start
+
+
+def _submit(executor: Optional[Executor], fn: Callable, *args) -> Future:
+    if executor is not None:
+        return executor.submit(fn, *args)
+    future: Future = Future()
+    future.set_result(fn(*args))
+    return future
+
+
+class StageStats:
+    def __init__(self):
+        self.blocks = 0
+        self.transactions = 0
+        # time spent in the stage, summed over its workers
+        self.seconds = 0.0
+
+    def add(self, transactions: int, seconds: float):
+        self.blocks += 1
+        self.transactions += transactions
+        self.seconds += seconds
+
+    def to_json(self) -> Dict[str, Any]:
+        seconds = self.seconds or 1e-9
+        return {
+            "blocks": self.blocks,
+            "transactions": self.transactions,
+            "seconds": self.seconds,
+            "blocksPerSecond": self.blocks / seconds,
+            "transactionsPerSecond": self.transactions / seconds,
+        }
+
+
+class SyncPipeline:
+    """
+    Initial sync in three stages, so only the part that depends on chain
+    state runs serially:
+
+    decode: wire format bytes to Block, on decode_executor
+    verify: proof of work, merkle root and signatures (check_block), on
+        verify_executor, typically a process pool
+    apply: BlockChain.add_block in block order with those checks skipped,
+        inside sync_mode() so the writes are grouped
+
+    Up to depth blocks are in the first two stages at once. A stage with
+    no executor runs inline. Per stage counts and busy time are kept in
+    stats; stage seconds are summed over workers, so a parallel stage can
+    exceed the wall clock time in stats["total"].
+    """
+
+    def __init__(
+        self,
+        blockchain: BlockChain,
+        verify_executor: Optional[Executor] = None,
+        decode_executor: Optional[Executor] = None,
+        depth: int = SYNC_PIPELINE_DEPTH,
+        write_behind: bool = True,
+    ):
+        self.blockchain = blockchain
+        self.verify_executor = verify_executor
+        self.decode_executor = decode_executor
+        self.depth = depth
+        self.write_behind = write_behind
+        self.stats = {stage: StageStats() for stage in STAGES + ["total"]}
+
+    def run(
+        self, raw_blocks: Iterable[Buffer], network_timestamp: int = 0
+    ) -> ExecutionStatus:
+        # Adds the serialized blocks in order, stopping at the first one
+        # that fails; the blocks before it are kept
+        start = time.perf_counter()
+        in_flight: Deque[Tuple[Future, Future]] = deque()
+        status = ExecutionStatus.SUCCESS
+        try:
+            with self.blockchain.sync_mode(write_behind=self.write_behind):
+                for raw in raw_blocks:
+                    raw = bytes(raw)
+                    in_flight.append(
+                        (
+                            _submit(self.decode_executor, _decode_block, raw),
+                            _submit(self.verify_executor, _verify_block, raw),
+                        )
+                    )
+                    if len(in_flight) >= self.depth:
+                        status = self._apply(*in_flight.popleft(), network_timestamp)
+                        if status != ExecutionStatus.SUCCESS:
+                            break
+                while status == ExecutionStatus.SUCCESS and in_flight:
+                    status = self._apply(*in_flight.popleft(), network_timestamp)
+        finally:
+            for decoded, verified in in_flight:
+                decoded.cancel()
+                verified.cancel()
+            total = self.stats["total"]
+            total.seconds += time.perf_counter() - start
+            total.blocks = self.stats["apply"].blocks
+            total.transactions = self.stats["apply"].transactions
+            logger.info("sync pipeline: {}", self.get_stats())
+        return status
+
+    def _apply(
+        self, decoded: Future, verified: Future, network_timestamp: int
+    ) -> ExecutionStatus:
+        block, seconds = decoded.result()
+        num_transactions = len(block.get_transactions())
+        self.stats["decode"].add(num_transactions, seconds)
+        status, seconds = verified.result()
+        self.stats["verify"].add(num_transactions, seconds)
+        if status != ExecutionStatus.SUCCESS:
+            return status
+        start = time.perf_counter()
+        status = self.blockchain.add_block(block, network_timestamp, verified=True)
+        if status == ExecutionStatus.SUCCESS:
+            self.stats["apply"].add(num_transactions, time.perf_counter() - start)
+        return status
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {stage: stats.to_json() for stage, stats in self.stats.items()}
@@ -1,17 +1,12 @@
-import copy
-import avro.schema
-import io
-from avro.io import DatumWriter, DatumReader
-import ed25519
 import hashlib
-from typing import Dict, List, Optional, Deque, cast
-from collections import deque
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import Executor, as_completed
 from pandanite.core.crypto import (
     PublicWalletAddress,
     PublicKey,
     PrivateKey,
     SHA256Hash,
-    NULL_SHA256_HASH,
     NULL_ADDRESS,
     TransactionSignature,
     sha_256_to_string,
@@ -23,13 +18,32 @@ from pandanite.core.crypto import (
     signature_to_string,
     sign_with_private_key_bytes,
     check_signature_bytes,
-    concat_hashes,
     wallet_address_from_public_key,
+    public_key_from_bytes,
 )
 from pandanite.core.common import TransactionAmount
+from pandanite.core.constants import SIGNATURE_BATCH_SIZE
+from pandanite.core import avro_codec
+from pandanite.core.merkle import merkle_root, get_merkle_proof
 
 
 class Transaction:
+    # Every field is immutable (ints, bytes and a shared verifying key),
+    # which is what makes copy() a cheap field by field copy
+    __slots__ = (
+        "signature",
+        "signing_key",
+        "timestamp",
+        "to",
+        "amount",
+        "fee",
+        "_wallet",
+        "_sealed",
+        "_content_hash",
+        "_hash",
+        "_id",
+    )
+
     def __init__(
         self,
         to_wallet: PublicWalletAddress = NULL_ADDRESS,
@@ -39,19 +53,44 @@ class Transaction:
         timestamp: int = 0,
     ):
         self.signature: Optional[TransactionSignature] = None
-        self.signing_key: PublicKey = copy.deepcopy(signing_key)
+        self.signing_key: Optional[PublicKey] = signing_key
         self.timestamp = timestamp
-        self.to: PublicWalletAddress = copy.deepcopy(to_wallet)
+        self.to: PublicWalletAddress = bytes(to_wallet)
         self.amount: TransactionAmount = amount if amount else 0
         self.fee: TransactionAmount = fee
 
         # This is just used for genesis block transactions which are missing signing key
         self._wallet: Optional[PublicWalletAddress] = None
 
+        # Hashes memoized while the transaction is sealed, cleared by setters
+        self._sealed = False
+        self._content_hash: Optional[SHA256Hash] = None
+        self._hash: Optional[SHA256Hash] = None
+        self._id: Optional[str] = None
+
+    def seal(self):
+        # Once sealed the content hash, hash and id are computed at most once
+        # until a setter changes the transaction. Direct attribute writes
+        # bypass this, so only seal transactions that are done being built.
+        self._sealed = True
+
+    def is_sealed(self) -> bool:
+        return self._sealed
+
+    def _invalidate(self):
+        self._content_hash = None
+        self._hash = None
+        self._id = None
+
     def set_wallet_override(self, override: PublicWalletAddress):
-        self._wallet = override
+        self._wallet = bytes(override)
+        self._invalidate()
+
+    def get_wallet_override(self) -> Optional[PublicWalletAddress]:
+        return self._wallet
 
     def from_json(self, data: Dict):
+        self._invalidate()
         self.timestamp = int(data["timestamp"])
         self.to = string_to_wallet_address(data["to"])
         self.fee = data["fee"]
@@ -63,8 +102,13 @@ class Transaction:
         if "from" in data.keys() and len(data["from"]) != 0:
             self.set_wallet_override(string_to_wallet_address(data["from"]))
 
-    def get_id(self):
-        return sha_256_to_string(self.hash_contents())
+    def get_id(self) -> str:
+        if self._id is not None:
+            return self._id
+        id = sha_256_to_string(self.hash_contents())
+        if self._sealed:
+            self._id = id
+        return id
 
     def to_json(self) -> Dict:
         result = {}
@@ -72,7 +116,10 @@ class Transaction:
         result["amount"] = self.amount
         result["timestamp"] = str(self.timestamp)
         result["fee"] = self.fee
-        result["txid"] = sha_256_to_string(self.hash_contents())
+        result["txid"] = self.get_id()
+        if self._wallet is not None:
+            # genesis sender override, part of the hash
+            result["from"] = wallet_address_to_string(self._wallet)
         if not self.is_fee():
             result["signingKey"] = public_key_to_string(self.signing_key)
             result["signature"] = signature_to_string(self.signature)
@@ -90,37 +137,30 @@ class Transaction:
         return result
 
     def to_avro(self, include_transactions=False) -> bytes:
-        schema = avro.schema.parse(open("schema.json", "rb").read())
-        writer = DatumWriter(schema)
-        bytes_writer = io.BytesIO()
-        encoder = avro.io.BinaryEncoder(bytes_writer)
-        writer.write(self.to_avro_dict(), encoder)
-        ret = bytes_writer.getvalue()
-        bytes_writer.close()
-        return ret
+        return avro_codec.encode(self.to_avro_dict())
 
     def from_avro(self, data: bytes):
-        schema = avro.schema.parse(open("schema.json", "rb").read())
-        f = io.BytesIO(data)
-        decoder = avro.io.BinaryDecoder(f)
-        reader = DatumReader(schema)
-        result = reader.read(decoder)
-        self.from_avro_dict(result)
+        self.from_avro_dict(avro_codec.decode(data))
 
     def from_avro_dict(self, result: dict):
+        self._invalidate()
         self.timestamp = result["timestamp"]
-        self.to = result["to"]
+        self.to = bytes(result["to"])
         self.fee = result["fee"]
         self.amount = result["amount"]
         if result.get("signing_key"):
-            self.signature = result["signature"]
-            self.signing_key = ed25519.keys.VerifyingKey(result["signing_key"])
+            self.signature = bytes(result["signature"])
+            self.signing_key = public_key_from_bytes(bytes(result["signing_key"]))
 
     def copy(self) -> "Transaction":
-        return copy.deepcopy(self)
+        t = Transaction.__new__(Transaction)
+        for name in Transaction.__slots__:
+            setattr(t, name, getattr(self, name))
+        return t
 
     def set_transaction_fee(self, amount: TransactionAmount):
         self.fee = amount
+        self._invalidate()
 
     def get_transaction_fee(self) -> TransactionAmount:
         return self.fee
@@ -130,6 +170,7 @@ class Transaction:
 
     def set_amount(self, amt: TransactionAmount):
         self.amount = amt
+        self._invalidate()
 
     def get_signing_key(self) -> PublicKey:
         return self.signing_key
@@ -145,40 +186,46 @@ class Transaction:
 
     def set_timestamp(self, t: int):
         self.timestamp = t
+        self._invalidate()
 
     def get_timestamp(self) -> int:
         return self.timestamp
 
     def get_hash(self) -> SHA256Hash:
+        if self._hash is not None:
+            return self._hash
         ctx = hashlib.sha256()
         ctx.update(self.hash_contents())
         if not self.is_fee():
             if not self.signature:
                 raise Exception("Tried to get hash of unsigned transaction")
             ctx.update(self.signature)
-        return bytearray(ctx.digest())
+        hash = ctx.digest()
+        if self._sealed:
+            self._hash = hash
+        return hash
 
     def hash_contents(self) -> SHA256Hash:
+        if self._content_hash is not None:
+            return self._content_hash
         ctx = hashlib.sha256()
-        fee = bytearray(self.fee.to_bytes(8))
-        amount = bytearray(self.amount.to_bytes(8))
-        timestamp = bytearray(self.timestamp.to_bytes(8))
-        fee.reverse()
-        amount.reverse()
-        timestamp.reverse()
-
         ctx.update(self.to)
         if not self.is_fee():
             ctx.update(self._wallet or wallet_address_from_public_key(self.signing_key))
-        ctx.update(fee)
-        ctx.update(amount)
-        ctx.update(timestamp)
-        return bytearray(ctx.digest())
+        ctx.update(self.fee.to_bytes(8, "little"))
+        ctx.update(self.amount.to_bytes(8, "little"))
+        ctx.update(self.timestamp.to_bytes(8, "little"))
+        hash = ctx.digest()
+        if self._sealed:
+            self._content_hash = hash
+        return hash
 
     def sign(self, private_key: PrivateKey):
         hash = self.hash_contents()
-        signature = sign_with_private_key_bytes(bytes(hash), private_key)
+        signature = sign_with_private_key_bytes(hash, private_key)
         self.signature = signature
+        # the content hash is unaffected by the signature
+        self._hash = None
 
     def get_signature(self) -> TransactionSignature:
         if not self.signature:
@@ -191,7 +238,7 @@ class Transaction:
         if not self.signature:
             raise Exception("No signature for transaction")
         hash = self.hash_contents()
-        return check_signature_bytes(bytes(hash), self.signature, self.signing_key)
+        return check_signature_bytes(hash, self.signature, self.signing_key)
 
     def is_fee(self) -> bool:
         return self.signing_key == None
@@ -211,39 +258,59 @@ class Transaction:
         return False
 
 
-# merkle proofs
-class Node:
-    def __init__(self, hash: SHA256Hash):
-        self.hash = hash
-        self.parent: Optional[Node] = None
-        self.left: Optional[Node] = None
-        self.right: Optional[Node] = None
-
-
 def get_merkle_hash(items: List[Transaction]) -> SHA256Hash:
     # NOTE: This is not actually building a Merkle Tree
-    # it is copied over from and consistent with the original C++ code
-    items.sort(key=lambda a: sha_256_to_string(a.get_hash()), reverse=True)
-    q: Deque[Node] = deque()
-
-    for item in items:
-        h = item.get_hash()
-        node = Node(h)
-        q.append(node)
-
-    if len(q) % 2 == 1:
-        repeat = Node(q[-1].hash)
-        q.append(repeat)
-
-    while len(q) > 1:
-        a: Node = q.popleft()
-        b: Node = q.popleft()
-        root = Node(NULL_SHA256_HASH)
-        root.left = a
-        root.right = b
-        a.parent = root
-        b.parent = root
-        root.hash = concat_hashes(a.hash, b.hash)
-        q.append(root)
-
-    return q[0].hash
+    # it is copied over from and consistent with the original C++ code.
+    # Sorts items in place by hash, descending; sorting the raw digests
+    # gives the same order as sorting their hex strings.
+    leaves = [(t.get_hash(), t) for t in items]
+    leaves.sort(key=itemgetter(0), reverse=True)
+    items[:] = [t for _, t in leaves]
+    return merkle_root([h for h, _ in leaves])
+
+
+def get_transaction_proof(
+    items: List[Transaction], tx_id: str
+) -> Optional[Tuple[bytes, int, List[bytes]]]:
+    # Merkle leaf of the transaction with the given id, its position among
+    # the sorted leaves and its sibling path, or None if it is not in items.
+    leaves = sorted((t.get_hash() for t in items), reverse=True)
+    for t in items:
+        if t.get_id() == tx_id:
+            leaf = t.get_hash()
+            index = leaves.index(leaf)
+            return leaf, index, get_merkle_proof(leaves, index)
+    return None
+
+
+def _verify_signature_chunk(items: List[Transaction]) -> bool:
+    for t in items:
+        if not t.signature_valid():
+            return False
+    return True
+
+
+def verify_signatures(
+    items: List[Transaction],
+    executor: Optional[Executor] = None,
+    chunk_size: int = SIGNATURE_BATCH_SIZE,
+) -> bool:
+    # Checks every non-fee signature in items, fanning chunks out over the
+    # executor (thread or process pool) when one is given. Returns False as
+    # soon as any chunk reports a bad signature.
+    pending = [t for t in items if not t.is_fee()]
+    if executor is None or len(pending) <= chunk_size:
+        return _verify_signature_chunk(pending)
+
+    futures = [
+        executor.submit(_verify_signature_chunk, pending[i : i + chunk_size])
+        for i in range(0, len(pending), chunk_size)
+    ]
+    try:
+        for future in as_completed(futures):
+            if not future.result():
+                return False
+        return True
+    finally:
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,191 @@
+"""
+Fixed size binary layout used by the C++ nodes. All integers are big
+endian ("network" order).
+
+BlockHeader (116 bytes):
+    uint32 id, uint64 timestamp, uint32 difficulty, uint32 numTransactions,
+    lastBlockHash[32], merkleRoot[32], nonce[32]
+
+TransactionInfo (149 bytes):
+    signature[64], signingKey[32], uint64 timestamp, to[25],
+    uint64 amount, uint64 fee, uint32 isTransactionFee
+
+A serialized block is its header followed by numTransactions transaction
+infos. The sender address is not on the wire, it is derived from the
+signing key, so transactions carrying a wallet override (genesis) do not
+round trip.
+"""
+
+import struct
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+from pandanite.core.block import Block
+from pandanite.core.transaction import Transaction
+from pandanite.core.crypto import public_key_from_bytes
+from pandanite.core.constants import MAX_TRANSACTIONS_PER_BLOCK
+
+BLOCK_HEADER_STRUCT = struct.Struct(">IQII32s32s32s")
+TRANSACTION_INFO_STRUCT = struct.Struct(">64s32sQ25sQQI")
+BLOCKHEADER_BUFFER_SIZE = BLOCK_HEADER_STRUCT.size
+TRANSACTIONINFO_BUFFER_SIZE = TRANSACTION_INFO_STRUCT.size
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+def transaction_to_buffer(t: Transaction) -> bytes:
+    if t.is_fee():
+        signature = bytes(64)
+        signing_key = bytes(32)
+    else:
+        signature = t.get_signature()
+        signing_key = t.get_signing_key().to_bytes()
+    return TRANSACTION_INFO_STRUCT.pack(
+        signature,
+        signing_key,
+        t.get_timestamp(),
+        t.get_recepient(),
+        t.get_amount(),
+        t.get_fee(),
+        1 if t.is_fee() else 0,
+    )
+
+
+def _transaction_from_fields(
+    signature: bytes,
+    signing_key: bytes,
+    timestamp: int,
+    to: bytes,
+    amount: int,
+    fee: int,
+    is_fee: int,
+) -> Transaction:
+    t = Transaction()
+    t.timestamp = timestamp
+    t.to = to
+    t.amount = amount
+    t.fee = fee
+    if not is_fee:
+        t.signature = signature
+        t.signing_key = public_key_from_bytes(signing_key)
+    t.seal()
+    return t
+
+
+def transaction_from_buffer(buffer: Buffer, offset: int = 0) -> Transaction:
+    return _transaction_from_fields(
+        *TRANSACTION_INFO_STRUCT.unpack_from(buffer, offset)
+    )
+
+
+def block_header_to_buffer(b: Block) -> bytes:
+    return BLOCK_HEADER_STRUCT.pack(
+        b.get_id(),
+        b.get_timestamp(),
+        b.get_difficulty(),
+        len(b.get_transactions()),
+        b.get_last_block_hash(),
+        b.get_merkle_root(),
+        b.get_nonce(),
+    )
+
+
+def block_to_buffer(b: Block) -> bytes:
+    parts = [block_header_to_buffer(b)]
+    for t in b.get_transactions():
+        parts.append(transaction_to_buffer(t))
+    return b"".join(parts)
+
+
+def blocks_to_buffer(blocks: List[Block]) -> bytes:
+    return b"".join(block_to_buffer(b) for b in blocks)
+
+
+def block_header_from_buffer(buffer: Buffer, offset: int = 0) -> Tuple[Block, int]:
+    # Returns the header (with no transactions) and its transaction count
+    (
+        id,
+        timestamp,
+        difficulty,
+        num_transactions,
+        last_block_hash,
+        merkle_root,
+        nonce,
+    ) = BLOCK_HEADER_STRUCT.unpack_from(buffer, offset)
+    b = Block()
+    b.id = id
+    b.timestamp = timestamp
+    b.difficulty = difficulty
+    b.last_block_hash = last_block_hash
+    b.merkle_root = merkle_root
+    b.nonce = nonce
+    return b, num_transactions
+
+
+def block_from_buffer(buffer: Buffer, offset: int = 0) -> Tuple[Block, int]:
+    # Returns the block and the offset just past it
+    view = memoryview(buffer)
+    b, num_transactions = block_header_from_buffer(view, offset)
+    start = offset + BLOCKHEADER_BUFFER_SIZE
+    end = start + num_transactions * TRANSACTIONINFO_BUFFER_SIZE
+    if end > len(view):
+        raise Exception("Truncated block buffer")
+    b.transactions = [
+        _transaction_from_fields(*fields)
+        for fields in TRANSACTION_INFO_STRUCT.iter_unpack(view[start:end])
+    ]
+    return b, end
+
+
+def iter_blocks_from_buffer(buffer: Buffer) -> Iterator[Block]:
+    view = memoryview(buffer)
+    offset = 0
+    while offset < len(view):
+        b, offset = block_from_buffer(view, offset)
+        yield b
+
+
+def blocks_from_buffer(buffer: Buffer) -> List[Block]:
+    return list(iter_blocks_from_buffer(buffer))
+
+
+def _read_exact(stream: BinaryIO, size: int) -> Optional[bytearray]:
+    # Reads exactly size bytes, looping over short reads as chunked HTTP
+    # bodies produce them. Returns None on a clean end of stream.
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    read = 0
+    while read < size:
+        chunk = stream.read(size - read)
+        if not chunk:
+            if read == 0:
+                return None
+            raise Exception("Truncated block stream")
+        view[read : read + len(chunk)] = chunk
+        read += len(chunk)
+    return buffer
+
+
+def read_raw_blocks(stream: BinaryIO) -> Iterator[bytes]:
+    # Yields the serialized bytes of each block in the stream, undecoded,
+    # e.g. to hand them to worker processes
+    while True:
+        header = _read_exact(stream, BLOCKHEADER_BUFFER_SIZE)
+        if header is None:
+            return
+        _, num_transactions = block_header_from_buffer(header)
+        if num_transactions > MAX_TRANSACTIONS_PER_BLOCK:
+            raise Exception("Too many transactions in streamed block")
+        if num_transactions > 0:
+            body = _read_exact(stream, num_transactions * TRANSACTIONINFO_BUFFER_SIZE)
+            if body is None:
+                raise Exception("Truncated block stream")
+            header += body
+        yield bytes(header)
+
+
+def read_blocks(stream: BinaryIO) -> Iterator[Block]:
+    # Yields blocks one at a time from a file-like object, e.g. a file or
+    # the raw body of a streamed HTTP response. Only the block being
+    # decoded is held in memory.
+    for raw in read_raw_blocks(stream):
+        b, _ = block_from_buffer(raw)
+        yield b
@@ -0,0 +1,15 @@
+from pandanite.storage.base import Storage
+
+
+def open_storage(backend: str = "mongo", **options) -> Storage:
+    # Creates the storage backend selected at startup, "mongo" or "sqlite".
+    # options are passed to the backend constructor.
+    if backend == "mongo":
+        from pandanite.storage.db import PandaniteDB
+
+        return PandaniteDB(**options)
+    elif backend == "sqlite":
+        from pandanite.storage.sqlite import SQLiteDB
+
+        return SQLiteDB(**options)
+    raise Exception("Unknown storage backend: " + backend)
@@ -0,0 +1,246 @@
+from abc import ABC, abstractmethod
+from contextlib import AbstractContextManager
+from typing import Any, Dict, List, Optional, Tuple
+from pandanite.core.transaction import Transaction
+from pandanite.core.crypto import (
+    SHA256Hash,
+    PublicWalletAddress,
+    NULL_SHA256_HASH,
+    string_to_sha_256,
+)
+from pandanite.core.constants import WALLET_HISTORY_PAGE_SIZE
+from pandanite.core.common import TransactionAmount
+from pandanite.core.block import Block
+from pandanite.storage.header_index import HeaderIndex
+from pandanite.storage.undo import UndoRecord, WalletTransaction
+
+# Backend specific handle yielded by Storage.transaction(), e.g. a Mongo
+# ClientSession. None means the writes are not grouped.
+Session = Any
+
+
+class Storage(ABC):
+    """
+    Chain state used by BlockChain: blocks, the transaction index, wallet
+    balances, per wallet transaction lists and the tip state (block count,
+    total work and difficulty). Backends keep headers, the hash, timestamp,
+    difficulty and total work of every block, in step with their blocks, and
+    an UndoRecord per block for rewinding the tip.
+    """
+
+    headers: HeaderIndex
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    @abstractmethod
+    def reload_state(self):
+        pass
+
+    @abstractmethod
+    def close(self):
+        """
+        Releases the connection and the header index file. The storage is
+        not used afterwards.
+        """
+
+    @abstractmethod
+    def transaction(self) -> AbstractContextManager[Optional[Session]]:
+        """
+        Groups the writes of one block commit. Yields a handle to pass to
+        the write methods; the writes are rolled back if the body raises.
+        """
+
+    @abstractmethod
+    def get_num_blocks(self) -> int:
+        pass
+
+    @abstractmethod
+    def get_total_work(self) -> int:
+        pass
+
+    @abstractmethod
+    def get_difficulty(self) -> int:
+        pass
+
+    @abstractmethod
+    def set_difficulty(self, difficulty: int, session: Optional[Session] = None):
+        pass
+
+    @abstractmethod
+    def add_block(self, block: Block, session: Optional[Session] = None):
+        pass
+
+    @abstractmethod
+    def pop_block(self, session: Optional[Session] = None):
+        pass
+
+    @abstractmethod
+    def add_undo_record(self, record: UndoRecord, session: Optional[Session] = None):
+        pass
+
+    @abstractmethod
+    def get_undo_records(
+        self, start_id: int, end_id: int, session: Optional[Session] = None
+    ) -> List[UndoRecord]:
+        """
+        Returns the undo records of blocks start_id to end_id inclusive,
+        oldest first. Blocks without a record are left out.
+        """
+
+    @abstractmethod
+    def rewind(self, undo: UndoRecord, session: Optional[Session] = None):
+        """
+        Drops block undo.block_id and every block after it in one batch,
+        restoring the balances, transaction index, wallet histories and tip
+        state saved in undo, typically the merge_undo_records of them all.
+        """
+
+    @abstractmethod
+    def get_block(self, block_id: int, session: Optional[Session] = None) -> Block:
+        pass
+
+    @abstractmethod
+    def get_block_header(
+        self, block_id: int, session: Optional[Session] = None
+    ) -> Block:
+        pass
+
+    @abstractmethod
+    def get_wallets(
+        self,
+        wallets: List[PublicWalletAddress],
+        session: Optional[Session] = None,
+    ) -> Dict[str, TransactionAmount]:
+        pass
+
+    @abstractmethod
+    def update_wallet(self, wallet: str, amount: TransactionAmount):
+        pass
+
+    @abstractmethod
+    def update_wallets(
+        self,
+        wallets: Dict[str, TransactionAmount],
+        session: Optional[Session] = None,
+    ):
+        pass
+
+    @abstractmethod
+    def add_wallet_transactions(
+        self,
+        entries: List[WalletTransaction],
+        session: Optional[Session] = None,
+    ):
+        pass
+
+    @abstractmethod
+    def remove_wallet_transactions(
+        self,
+        entries: List[WalletTransaction],
+        session: Optional[Session] = None,
+    ):
+        """
+        Removes history entries. They are expected to be the newest ones of
+        each wallet, as when the tip block is popped.
+        """
+
+    @abstractmethod
+    def get_wallet_history(
+        self,
+        wallet: PublicWalletAddress,
+        cursor: Optional[int] = None,
+        limit: int = WALLET_HISTORY_PAGE_SIZE,
+    ) -> Tuple[List[Tuple[str, int]], Optional[int]]:
+        """
+        Returns up to limit (tx id, block id) history entries of the wallet,
+        newest first, and the cursor of the next page or None on the last.
+        cursor is the value returned with the previous page.
+        """
+
+    def add_wallet_transaction(
+        self, wallet: PublicWalletAddress, tx_id: str, block_id: int
+    ):
+        self.add_wallet_transactions([(wallet, tx_id, block_id)])
+
+    def remove_wallet_transaction(
+        self, wallet: PublicWalletAddress, tx_id: str, block_id: int
+    ):
+        self.remove_wallet_transactions([(wallet, tx_id, block_id)])
+
+    @abstractmethod
+    def block_for_transaction(self, t: Transaction) -> int:
+        pass
+
+    @abstractmethod
+    def get_transaction_location(self, txid: SHA256Hash) -> Optional[Tuple[int, int]]:
+        """
+        Returns the (block id, position) of a transaction by its id, the
+        position being its index in the stored block, or None if unknown.
+        """
+
+    @abstractmethod
+    def get_transaction(self, block_id: int, position: int) -> Transaction:
+        """
+        Loads a single transaction of a stored block without decoding the
+        other transactions of the block.
+        """
+
+    def get_transaction_by_id(self, txid: SHA256Hash) -> Optional[Transaction]:
+        location = self.get_transaction_location(txid)
+        if location is None:
+            return None
+        return self.get_transaction(*location)
+
+    def find_block_for_transaction_id(self, txid: SHA256Hash) -> int:
+        location = self.get_transaction_location(txid)
+        if location is None:
+            return 0
+        return location[0]
+
+    def find_block_for_transaction(self, t: Transaction) -> int:
+        return self.find_block_for_transaction_id(string_to_sha_256(t.get_id()))
+
+    def load_transactions(self, entries: List[Tuple[str, int]]) -> List[Transaction]:
+        # Resolves (tx id, block id) history entries through the transaction
+        # index, decoding only the listed transactions
+        transactions = []
+        for tx_id, block_id in entries:
+            location = self.get_transaction_location(string_to_sha_256(tx_id))
+            t = None
+            if location is not None and location[0] == block_id:
+                t = self.get_transaction(*location)
+            if t is None or t.get_id() != tx_id:
+                raise Exception("Wallet history transaction not found: " + tx_id)
+            transactions.append(t)
+        return transactions
+
+    def get_wallet_transactions(
+        self,
+        wallet: PublicWalletAddress,
+        cursor: Optional[int] = None,
+        limit: int = WALLET_HISTORY_PAGE_SIZE,
+    ) -> Tuple[List[Transaction], Optional[int]]:
+        # One page of get_wallet_history as Transaction objects
+        entries, next_cursor = self.get_wallet_history(wallet, cursor, limit)
+        return self.load_transactions(entries), next_cursor
+
+    def get_transactions_for_wallet(
+        self, addr: PublicWalletAddress
+    ) -> List[Transaction]:
+        # The whole history, newest first; prefer paging for busy wallets
+        transactions, cursor = self.get_wallet_transactions(addr)
+        while cursor is not None:
+            page, cursor = self.get_wallet_transactions(addr, cursor)
+            transactions += page
+        return transactions
+
+    def _sync_headers(self):
+        self.headers.sync(self.get_num_blocks(), self.get_block_header)
+
+    def get_last_hash(self) -> SHA256Hash:
+        count = self.get_num_blocks()
+        if count == 0:
+            return NULL_SHA256_HASH
+        return self.headers.get_hash(count)
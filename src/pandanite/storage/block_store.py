@@ -0,0 +1,231 @@
+"""
+Append only archive of serialized blocks.
+
+Blocks are written in the wire format of pandanite.core.wire into fixed
+size segment files (blk00000.dat, blk00001.dat, ...). Segments are
+created at their full size as sparse files so each is memory-mapped once.
+A block never spans two segments; a block larger than the segment size
+gets a segment of its own.
+
+index.dat holds one little endian (segment: uint32, offset: uint64,
+length: uint32) record per block, block id n at record n - 1. The file
+grows in steps of INDEX_GROWTH records and unused records are all zero,
+so the block count is the number of leading records with a non-zero
+length.
+
+The wire format has no sender field, so the wallet overrides of genesis
+transactions are kept after the block: when OVERRIDES_FLAG is set in the
+segment of its record, the length bytes of the block are followed by one
+(present: bool, wallet: 25 bytes) OVERRIDE_RECORD per transaction.
+"""
+
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, Iterator, Tuple
+from pandanite.core.block import Block
+from pandanite.core.transaction import Transaction
+from pandanite.core.constants import BLOCK_SEGMENT_SIZE
+from pandanite.core.wire import (
+    BLOCKHEADER_BUFFER_SIZE,
+    TRANSACTIONINFO_BUFFER_SIZE,
+    block_to_buffer,
+    block_from_buffer,
+    block_header_from_buffer,
+    transaction_from_buffer,
+)
+
+INDEX_RECORD = struct.Struct("<IQI")
+INDEX_GROWTH = 65536
+OVERRIDES_FLAG = 0x80000000
+OVERRIDE_RECORD = struct.Struct("<?25s")
+
+
+class BlockStore:
+    def __init__(self, directory: str, segment_size: int = BLOCK_SEGMENT_SIZE):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_size = segment_size
+        self._lock = threading.RLock()
+        self._segment_fds: Dict[int, int] = {}
+        self._segment_maps: Dict[int, mmap.mmap] = {}
+        self._index_fd = os.open(
+            os.path.join(directory, "index.dat"), os.O_RDWR | os.O_CREAT, 0o644
+        )
+        self._index_map = self._map_index()
+        self._num_blocks = self._count_blocks()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, "blk%05d.dat" % segment)
+
+    def _map_index(self) -> mmap.mmap:
+        size = os.fstat(self._index_fd).st_size
+        if size == 0:
+            size = INDEX_GROWTH * INDEX_RECORD.size
+            os.ftruncate(self._index_fd, size)
+        # mappings are replaced rather than closed: slices handed out by
+        # get_raw may still reference the old one
+        return mmap.mmap(self._index_fd, size, access=mmap.ACCESS_READ)
+
+    def _index_capacity(self) -> int:
+        return len(self._index_map) // INDEX_RECORD.size
+
+    def _record(self, position: int) -> Tuple[int, int, int, bool]:
+        # (segment, offset, length, has overrides) of a block
+        segment, offset, length = INDEX_RECORD.unpack_from(
+            self._index_map, position * INDEX_RECORD.size
+        )
+        return segment & ~OVERRIDES_FLAG, offset, length, bool(segment & OVERRIDES_FLAG)
+
+    def _count_blocks(self) -> int:
+        # binary search for the first empty record
+        low, high = 0, self._index_capacity()
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(middle)[2] != 0:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _segment_fd(self, segment: int) -> int:
+        fd = self._segment_fds.get(segment)
+        if fd is None:
+            fd = os.open(self._segment_path(segment), os.O_RDWR | os.O_CREAT, 0o644)
+            self._segment_fds[segment] = fd
+        return fd
+
+    def _segment_map(self, segment: int, end: int) -> mmap.mmap:
+        segment_map = self._segment_maps.get(segment)
+        if segment_map is None or len(segment_map) < end:
+            fd = self._segment_fd(segment)
+            segment_map = mmap.mmap(fd, os.fstat(fd).st_size, access=mmap.ACCESS_READ)
+            self._segment_maps[segment] = segment_map
+        return segment_map
+
+    def get_num_blocks(self) -> int:
+        return self._num_blocks
+
+    def append(self, block: Block):
+        data = block_to_buffer(block)
+        length = len(data)
+        overrides = [t.get_wallet_override() for t in block.get_transactions()]
+        flags = 0
+        if any(wallet is not None for wallet in overrides):
+            flags = OVERRIDES_FLAG
+            data += b"".join(
+                OVERRIDE_RECORD.pack(wallet is not None, wallet or b"")
+                for wallet in overrides
+            )
+        with self._lock:
+            if block.get_id() != self._num_blocks + 1:
+                raise Exception("Block out of order")
+            segment, offset = 0, 0
+            if self._num_blocks > 0:
+                segment = self._record(self._num_blocks - 1)[0]
+                offset = self._stored_end(self._num_blocks)
+                fd = self._segment_fd(segment)
+                if offset + len(data) > os.fstat(fd).st_size:
+                    segment, offset = segment + 1, 0
+            fd = self._segment_fd(segment)
+            if os.fstat(fd).st_size < len(data):
+                os.ftruncate(fd, max(self.segment_size, len(data)))
+            os.pwrite(fd, data, offset)
+
+            # the record is written last so it never points at partial data
+            if self._num_blocks == self._index_capacity():
+                os.ftruncate(
+                    self._index_fd,
+                    (self._index_capacity() + INDEX_GROWTH) * INDEX_RECORD.size,
+                )
+                self._index_map = self._map_index()
+            os.pwrite(
+                self._index_fd,
+                INDEX_RECORD.pack(segment | flags, offset, length),
+                self._num_blocks * INDEX_RECORD.size,
+            )
+            self._num_blocks += 1
+
+    def truncate(self, num_blocks: int):
+        # Drops every block after num_blocks, e.g. to follow pop_block. The
+        # segment bytes are left in place and overwritten by later appends.
+        with self._lock:
+            if num_blocks >= self._num_blocks:
+                return
+            start = num_blocks * INDEX_RECORD.size
+            end = self._num_blocks * INDEX_RECORD.size
+            os.pwrite(self._index_fd, bytes(end - start), start)
+            self._num_blocks = num_blocks
+
+    def _stored_end(self, block_id: int) -> int:
+        # Segment offset just past the block and its overrides
+        _, offset, length, has_overrides = self._record(block_id - 1)
+        if has_overrides:
+            num_transactions = (
+                length - BLOCKHEADER_BUFFER_SIZE
+            ) // TRANSACTIONINFO_BUFFER_SIZE
+            length += num_transactions * OVERRIDE_RECORD.size
+        return offset + length
+
+    def _get_stored(self, block_id: int) -> Tuple[memoryview, int, bool]:
+        # The block with any overrides after it, the wire format length and
+        # whether there are overrides
+        with self._lock:
+            if block_id <= 0 or block_id > self._num_blocks:
+                raise Exception("Invalid block")
+            segment, offset, length, has_overrides = self._record(block_id - 1)
+            end = self._stored_end(block_id)
+            segment_map = self._segment_map(segment, end)
+        return memoryview(segment_map)[offset:end], length, has_overrides
+
+    def get_raw(self, block_id: int) -> memoryview:
+        # Zero copy view of the serialized block inside the segment mapping
+        stored, length, _ = self._get_stored(block_id)
+        return stored[:length]
+
+    def iter_raw(self, start_id: int, end_id: int) -> Iterator[memoryview]:
+        # Serialized blocks start_id to end_id inclusive, as served by /sync
+        for block_id in range(start_id, min(end_id, self._num_blocks) + 1):
+            yield self.get_raw(block_id)
+
+    def get_block(self, block_id: int) -> Block:
+        stored, length, has_overrides = self._get_stored(block_id)
+        block, _ = block_from_buffer(stored[:length])
+        if has_overrides:
+            overrides = OVERRIDE_RECORD.iter_unpack(stored[length:])
+            for t, (present, wallet) in zip(block.get_transactions(), overrides):
+                if present:
+                    t.set_wallet_override(wallet)
+        return block
+
+    def get_block_header(self, block_id: int) -> Block:
+        header, _ = block_header_from_buffer(
+            self.get_raw(block_id)[:BLOCKHEADER_BUFFER_SIZE]
+        )
+        return header
+
+    def get_transaction(self, block_id: int, position: int) -> Transaction:
+        # Decodes the one fixed size entry at position, whatever the block size
+        stored, length, has_overrides = self._get_stored(block_id)
+        _, num_transactions = block_header_from_buffer(stored)
+        if position < 0 or position >= num_transactions:
+            raise Exception("Invalid transaction position")
+        t = transaction_from_buffer(
+            stored, BLOCKHEADER_BUFFER_SIZE + position * TRANSACTIONINFO_BUFFER_SIZE
+        )
+        if has_overrides:
+            present, wallet = OVERRIDE_RECORD.unpack_from(
+                stored, length + position * OVERRIDE_RECORD.size
+            )
+            if present:
+                t.set_wallet_override(wallet)
+        return t
+
+    def close(self):
+        with self._lock:
+            for fd in self._segment_fds.values():
+                os.close(fd)
+            self._segment_fds = {}
+            self._segment_maps = {}
+            os.close(self._index_fd)
@@ -1,29 +1,54 @@
-from typing import List, Dict, Any
-from pymongo import MongoClient
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+from pymongo import ASCENDING, MongoClient, DeleteMany, ReplaceOne, UpdateOne
+from pymongo.client_session import ClientSession
 from pandanite.logging import logger
 from pandanite.core.transaction import Transaction
 from pandanite.core.crypto import (
     SHA256Hash,
     add_work,
+    remove_work,
     PublicWalletAddress,
-    NULL_SHA256_HASH,
     wallet_address_to_string,
+    sha_256_to_string,
 )
 from pandanite.core.common import TransactionAmount
 from pandanite.core.block import Block
+from pandanite.core.constants import (
+    WALLET_LOOKUP_BATCH_SIZE,
+    WALLET_HISTORY_BUCKET_SIZE,
+    WALLET_HISTORY_PAGE_SIZE,
+    INDEX_DELETE_BATCH_SIZE,
+)
+from pandanite.storage.base import Storage, WalletTransaction
+from pandanite.storage.header_index import HeaderIndex
+from pandanite.storage.undo import UndoRecord
 
 """'
 Mongo collection schemas
 blocks: Results of block.to_json() are stored directly
-transaction_to_block: { 'tx_id': string, 'block_id': int }
+transaction_to_block: { 'tx_id': string, 'block_id': int, 'position': int }
+    position is the index of the transaction in the stored block
 ledger: {'address': string, 'balance': int }
-wallet_to_transaction: {'address': string, 'tx_ids': list[string]}
+wallet_history: {'address': string, 'bucket': int, 'count': int,
+    'entries': list[{'tx_id': string, 'block_id': int}]}
+    Entry n of an address (in insertion order) is entries[n % SIZE] of
+    bucket n // SIZE, SIZE being WALLET_HISTORY_BUCKET_SIZE. Every address
+    with history has exactly one bucket with count < SIZE, its newest.
+undo_records: Results of UndoRecord.to_json()
 info: {'total_work': int, 'difficulty': int, 'num_blocks': int}
 """
 
 
-class PandaniteDB:
-    def __init__(self, port: int = 27017, db: str = "pandanite-test", clear=True):
+class PandaniteDB(Storage):
+    def __init__(
+        self,
+        port: int = 27017,
+        db: str = "pandanite-test",
+        clear=True,
+        header_index_path: Optional[str] = None,
+    ):
         self.client = MongoClient("localhost", port)
         self.db = self.client[db]
         self.transaction_to_block = self.db.transaction_to_block
@@ -32,81 +57,158 @@ class PandaniteDB:
         self.blocks.create_index("id", unique=True)
         self.ledger = self.db.ledger
         self.ledger.create_index("address", unique=True)
-        self.wallet_to_transaction = self.db.wallet_to_transaction
-        self.wallet_to_transaction.create_index("address", unique=True)
+        self.wallet_history = self.db.wallet_history
+        self.wallet_history.create_index(
+            [("address", ASCENDING), ("bucket", ASCENDING)], unique=True
+        )
+        self.wallet_history.create_index([("address", ASCENDING), ("count", ASCENDING)])
+        self.undo_records = self.db.undo_records
+        self.undo_records.create_index("block_id", unique=True)
         self.info = self.db.info
+        # Write-through copy of the info document. Every info write goes
+        # through _write_state, so this assumes a single writing process;
+        # call reload_state() if the database was changed from elsewhere.
+        self._state_lock = threading.Lock()
+        self._state: Optional[Dict[str, Any]] = None
+        self._transactions_supported: Optional[bool] = None
+        # Persisted so a restart does not read every block header back from
+        # the blocks collection, by default next to the node's working files
+        if header_index_path is None:
+            header_index_path = db + ".headers"
+        self.headers = HeaderIndex(header_index_path)
         if clear:
             self.clear()
+        else:
+            self._sync_headers()
+
+    def close(self):
+        self.client.close()
+        self.headers.close()
 
     def clear(self):
         self.transaction_to_block.drop()
         self.blocks.drop()
         self.ledger.drop()
-        self.wallet_to_transaction.drop()
+        self.wallet_history.drop()
+        self.undo_records.drop()
         self.info.drop()
-        self.info.replace_one(
-            {},
-            {
-                "total_work": str(0),
-                "num_blocks": 0,
-                "difficulty": 16,
-            },
-            upsert=True,
-        )
+        self._write_state(0, 0, 16)
+        self.headers.truncate(0)
 
-    def set_difficulty(self, difficulty: int):
-        info = self.info.find_one({})
-        self.info.replace_one(
-            {},
-            {
-                "total_work": info["total_work"],
-                "num_blocks": info["num_blocks"],
-                "difficulty": difficulty,
-            },
-            upsert=True,
+    def reload_state(self):
+        with self._state_lock:
+            self._state = None
+        self._sync_headers()
+
+    def _get_state(self) -> Dict[str, Any]:
+        state = self._state
+        if state is None:
+            with self._state_lock:
+                state = self.info.find_one({})
+                self._state = state
+        return state
+
+    def _write_state(
+        self,
+        total_work: int,
+        num_blocks: int,
+        difficulty: int,
+        session: Optional[ClientSession] = None,
+    ):
+        state = {
+            "total_work": str(total_work),
+            "num_blocks": num_blocks,
+            "difficulty": difficulty,
+        }
+        with self._state_lock:
+            self.info.replace_one({}, dict(state), upsert=True, session=session)
+            self._state = state
+
+    def set_difficulty(self, difficulty: int, session: Optional[ClientSession] = None):
+        self._write_state(
+            self.get_total_work(), self.get_num_blocks(), difficulty, session
         )
 
     def get_num_blocks(self) -> int:
-        return self.info.find_one({})["num_blocks"]
+        return self._get_state()["num_blocks"]
 
     def get_total_work(self) -> int:
-        return int(self.info.find_one()["total_work"])
+        return int(self._get_state()["total_work"])
 
     def get_difficulty(self) -> int:
-        return self.info.find_one()["difficulty"]
-
-    def add_block(self, block: Block):
-        self.blocks.replace_one({"id": block.get_id()}, block.to_json(), upsert=True)
-        for t in block.get_transactions():
-            self.transaction_to_block.replace_one(
-                {"tx_id": t.get_id()},
-                {"tx_id": t.get_id(), "block_id": block.get_id()},
-                upsert=True,
-            )
-        info = self.info.find_one({})
-        new_work = add_work(int(info["total_work"]), block.get_difficulty())
-        self.info.replace_one(
-            {},
-            {
-                "total_work": str(new_work),
-                "num_blocks": block.get_id(),
-                "difficulty": block.get_difficulty(),
-            },
-            upsert=True,
+        return self._get_state()["difficulty"]
+
+    def add_block(self, block: Block, session: Optional[ClientSession] = None):
+        self.blocks.replace_one(
+            {"id": block.get_id()}, block.to_json(), upsert=True, session=session
         )
+        requests = []
+        for position, t in enumerate(block.get_transactions()):
+            tx_id = t.get_id()
+            requests.append(
+                ReplaceOne(
+                    {"tx_id": tx_id},
+                    {"tx_id": tx_id, "block_id": block.get_id(), "position": position},
+                    upsert=True,
+                )
+            )
+        if requests:
+            self.transaction_to_block.bulk_write(
+                requests, ordered=False, session=session
+            )
+        new_work = add_work(self.get_total_work(), block.get_difficulty())
+        self._write_state(new_work, block.get_id(), block.get_difficulty(), session)
+        self.headers.append(block)
 
     def start_session(self):
         return self.client.start_session()
 
+    def supports_transactions(self) -> bool:
+        # Multi document transactions need a replica set or a mongos router
+        if self._transactions_supported is None:
+            hello = self.client.admin.command("hello")
+            self._transactions_supported = (
+                "setName" in hello or hello.get("msg") == "isdbgrid"
+            )
+        return self._transactions_supported
+
+    @contextmanager
+    def transaction(self) -> Iterator[Optional[ClientSession]]:
+        """
+        Yields a session with an open transaction that commits when the
+        block exits, or None on a standalone server where writes cannot be
+        grouped. The tip state cache is reloaded if the transaction aborts.
+        """
+        if not self.supports_transactions():
+            yield None
+            return
+        try:
+            with self.client.start_session() as session:
+                with session.start_transaction():
+                    yield session
+        except BaseException:
+            self.reload_state()
+            raise
+
     def get_wallets(
-        self, wallets: list[PublicWalletAddress]
+        self,
+        wallets: list[PublicWalletAddress],
+        session: Optional[ClientSession] = None,
     ) -> Dict[str, TransactionAmount]:
+        # One $in query per chunk of distinct addresses; wallets without a
+        # ledger entry are left out of the result
+        addresses = list(
+            dict.fromkeys(wallet_address_to_string(wallet) for wallet in wallets)
+        )
         wallet_totals: Dict[str, TransactionAmount] = {}
-        for wallet in wallets:
-            wallet_address = wallet_address_to_string(wallet)
-            found_wallet = self.ledger.find_one({"address": wallet_address})
-            if found_wallet:
-                wallet_totals[wallet_address] = found_wallet["balance"]
+        for i in range(0, len(addresses), WALLET_LOOKUP_BATCH_SIZE):
+            chunk = addresses[i : i + WALLET_LOOKUP_BATCH_SIZE]
+            for found_wallet in self.ledger.find(
+                {"address": {"$in": chunk}},
+                {"_id": 0, "address": 1, "balance": 1},
+                session=session,
+            ):
+                wallet_totals[found_wallet["address"]] = found_wallet["balance"]
         return wallet_totals
 
     def block_for_transaction(self, t: Transaction) -> int:
@@ -123,42 +225,287 @@ class PandaniteDB:
         }
         self.ledger.replace_one({"address": wallet}, updated_record, upsert=True)
 
-    def add_wallet_transaction(self, wallet: PublicWalletAddress, tx_id: str):
+    def update_wallets(
+        self,
+        wallets: Dict[str, TransactionAmount],
+        session: Optional[ClientSession] = None,
+    ):
+        requests = [
+            ReplaceOne(
+                {"address": wallet},
+                {"address": wallet, "balance": amount},
+                upsert=True,
+            )
+            for wallet, amount in wallets.items()
+        ]
+        if requests:
+            self.ledger.bulk_write(requests, ordered=False, session=session)
+
+    def _group_wallet_transactions(
+        self, entries: List[WalletTransaction]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for wallet, tx_id, block_id in entries:
+            grouped.setdefault(wallet_address_to_string(wallet), []).append(
+                {"tx_id": tx_id, "block_id": block_id}
+            )
+        return grouped
+
+    def _open_buckets(
+        self, addresses: List[str], session: Optional[ClientSession] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        # The newest, not yet full, bucket of each address
+        return {
+            doc["address"]: doc
+            for doc in self.wallet_history.find(
+                {
+                    "address": {"$in": addresses},
+                    "count": {"$lt": WALLET_HISTORY_BUCKET_SIZE},
+                },
+                {"_id": 0, "address": 1, "bucket": 1, "count": 1},
+                session=session,
+            )
+        }
+
+    def add_wallet_transactions(
+        self,
+        entries: List[WalletTransaction],
+        session: Optional[ClientSession] = None,
+    ):
+        # Entries are pushed into the open bucket of each address, opening
+        # new ones as buckets fill, so the cost does not grow with history
+        grouped = self._group_wallet_transactions(entries)
+        if not grouped:
+            return
+        open_buckets = self._open_buckets(list(grouped), session)
+        requests = []
+        for address, items in grouped.items():
+            head = open_buckets.get(address, {"bucket": 0, "count": 0})
+            bucket, count = head["bucket"], head["count"]
+            i = 0
+            while True:
+                batch = items[i : i + WALLET_HISTORY_BUCKET_SIZE - count]
+                requests.append(
+                    UpdateOne(
+                        {"address": address, "bucket": bucket},
+                        {
+                            "$push": {"entries": {"$each": batch}},
+                            "$inc": {"count": len(batch)},
+                        },
+                        upsert=True,
+                    )
+                )
+                i += len(batch)
+                count += len(batch)
+                if count < WALLET_HISTORY_BUCKET_SIZE:
+                    break
+                # a full bucket is followed by an empty open one
+                bucket, count = bucket + 1, 0
+        self.wallet_history.bulk_write(requests, ordered=False, session=session)
+
+    def remove_wallet_transactions(
+        self,
+        entries: List[WalletTransaction],
+        session: Optional[ClientSession] = None,
+    ):
+        # The removed entries are the newest, so only the last buckets of
+        # each address are read; they are rewritten as a contiguous run
+        requests: List[Any] = []
+        for address, items in self._group_wallet_transactions(entries).items():
+            removed = {(e["tx_id"], e["block_id"]) for e in items}
+            buckets = []
+            found = 0
+            for doc in self.wallet_history.find(
+                {"address": address}, sort=[("bucket", -1)], session=session
+            ):
+                buckets.append(doc)
+                found += sum(
+                    1 for e in doc["entries"] if (e["tx_id"], e["block_id"]) in removed
+                )
+                if found >= len(items):
+                    break
+            if not buckets:
+                continue
+            buckets.reverse()
+            first = buckets[0]["bucket"]
+            kept = [
+                e
+                for doc in buckets
+                for e in doc["entries"]
+                if (e["tx_id"], e["block_id"]) not in removed
+            ]
+            bucket = first
+            while True:
+                batch = kept[:WALLET_HISTORY_BUCKET_SIZE]
+                kept = kept[WALLET_HISTORY_BUCKET_SIZE:]
+                requests.append(
+                    ReplaceOne(
+                        {"address": address, "bucket": bucket},
+                        {
+                            "address": address,
+                            "bucket": bucket,
+                            "count": len(batch),
+                            "entries": batch,
+                        },
+                        upsert=True,
+                    )
+                )
+                if len(batch) < WALLET_HISTORY_BUCKET_SIZE:
+                    break
+                bucket += 1
+            requests.append(DeleteMany({"address": address, "bucket": {"$gt": bucket}}))
+        if requests:
+            self.wallet_history.bulk_write(requests, ordered=False, session=session)
+
+    def get_wallet_history(
+        self,
+        wallet: PublicWalletAddress,
+        cursor: Optional[int] = None,
+        limit: int = WALLET_HISTORY_PAGE_SIZE,
+    ) -> Tuple[List[Tuple[str, int]], Optional[int]]:
+        # The cursor is the position of the entry just before the next page
         address = wallet_address_to_string(wallet)
-        self.wallet_to_transaction.update_one(
-            {"address": address}, {"$push": {"tx_ids": tx_id}}, upsert=True
+        if cursor is None:
+            head = self._open_buckets([address]).get(address)
+            if head is None:
+                return [], None
+            cursor = head["bucket"] * WALLET_HISTORY_BUCKET_SIZE + head["count"]
+        if cursor <= 0 or limit <= 0:
+            return [], None
+        start = max(0, cursor - limit)
+        page = []
+        for doc in self.wallet_history.find(
+            {
+                "address": address,
+                "bucket": {
+                    "$gte": start // WALLET_HISTORY_BUCKET_SIZE,
+                    "$lte": (cursor - 1) // WALLET_HISTORY_BUCKET_SIZE,
+                },
+            },
+            sort=[("bucket", -1)],
+        ):
+            offset = doc["bucket"] * WALLET_HISTORY_BUCKET_SIZE
+            for i in range(len(doc["entries"]) - 1, -1, -1):
+                if start <= offset + i < cursor:
+                    entry = doc["entries"][i]
+                    page.append((entry["tx_id"], entry["block_id"]))
+        return page, (start if start > 0 else None)
+
+    def pop_block(self, session: Optional[ClientSession] = None):
+        # The difficulty is left as is, the prior value is not recorded
+        count = self.get_num_blocks()
+        if count == 0:
+            return
+        block = self.get_block(count, session)
+        self.blocks.delete_one({"id": count}, session=session)
+        self.undo_records.delete_one({"block_id": count}, session=session)
+        self.transaction_to_block.delete_many(
+            {"tx_id": {"$in": [t.get_id() for t in block.get_transactions()]}},
+            session=session,
         )
+        new_work = remove_work(self.get_total_work(), block.get_difficulty())
+        self._write_state(new_work, count - 1, self.get_difficulty(), session)
+        self.headers.truncate(count - 1)
 
-    def remove_wallet_transaction(self, wallet: PublicWalletAddress, tx_id: str):
-        address = wallet_address_to_string(wallet)
-        self.wallet_to_transaction.update_one(
-            {"address": address}, {"$pull": {"tx_ids": tx_id}}, upsert=True
+    def add_undo_record(
+        self, record: UndoRecord, session: Optional[ClientSession] = None
+    ):
+        self.undo_records.replace_one(
+            {"block_id": record.block_id},
+            record.to_json(),
+            upsert=True,
+            session=session,
         )
 
-    def pop_block(self):
-        # TODO remove actual block from mongo collection
-        return None
+    def get_undo_records(
+        self, start_id: int, end_id: int, session: Optional[ClientSession] = None
+    ) -> List[UndoRecord]:
+        return [
+            UndoRecord.from_json(doc)
+            for doc in self.undo_records.find(
+                {"block_id": {"$gte": start_id, "$lte": end_id}},
+                {"_id": 0},
+                sort=[("block_id", ASCENDING)],
+                session=session,
+            )
+        ]
 
-    def find_block_for_transaction(self, t: Transaction) -> int:
-        return 0
+    def rewind(self, undo: UndoRecord, session: Optional[ClientSession] = None):
+        # One bulk write per collection, however many blocks are dropped
+        num_blocks = undo.block_id - 1
+        if num_blocks >= self.get_num_blocks():
+            return
+        self.blocks.delete_many({"id": {"$gt": num_blocks}}, session=session)
+        requests = [
+            DeleteMany({"tx_id": {"$in": undo.tx_ids[i : i + INDEX_DELETE_BATCH_SIZE]}})
+            for i in range(0, len(undo.tx_ids), INDEX_DELETE_BATCH_SIZE)
+        ]
+        if requests:
+            self.transaction_to_block.bulk_write(
+                requests, ordered=False, session=session
+            )
+        self.update_wallets(undo.balances, session)
+        self.remove_wallet_transactions(undo.wallet_transactions(), session)
+        self.undo_records.delete_many(
+            {"block_id": {"$gt": num_blocks}}, session=session
+        )
+        self._write_state(undo.total_work, num_blocks, undo.difficulty, session)
+        self.headers.truncate(num_blocks)
 
-    def find_block_for_transaction_id(self, txid: SHA256Hash) -> int:
-        return 0
+    def get_transaction_location(self, txid: SHA256Hash) -> Optional[Tuple[int, int]]:
+        found_tx = self.transaction_to_block.find_one(
+            {"tx_id": sha_256_to_string(txid)}
+        )
+        if found_tx is None:
+            return None
+        block_id = found_tx["block_id"]
+        if "position" in found_tx:
+            return block_id, found_tx["position"]
+        # Rows indexed before positions were stored: find the transaction in
+        # its block once and record the position
+        tx_id = found_tx["tx_id"]
+        for position, t in enumerate(self.get_block(block_id).get_transactions()):
+            if t.get_id() == tx_id:
+                self.transaction_to_block.update_one(
+                    {"tx_id": tx_id}, {"$set": {"position": position}}
+                )
+                return block_id, position
+        return None
 
-    def get_transactions_for_wallet(
-        self, addr: PublicWalletAddress
-    ) -> List[Transaction]:
-        return []
+    def get_transaction(self, block_id: int, position: int) -> Transaction:
+        if position < 0:
+            raise Exception("Invalid transaction position")
+        # $slice sends back only the requested entry of the block
+        found = self.blocks.find_one(
+            {"id": block_id}, {"_id": 0, "transactions": {"$slice": [position, 1]}}
+        )
+        if found is None or len(found.get("transactions", [])) == 0:
+            raise Exception("Invalid transaction position")
+        t = Transaction()
+        t.from_json(found["transactions"][0])
+        t.seal()
+        return t
 
-    def get_last_hash(self) -> SHA256Hash:
-        count = self.get_num_blocks()
-        if count == 0:
-            return NULL_SHA256_HASH
-        return self.get_block(count).get_hash()
+    def get_block(
+        self, block_id: int, session: Optional[ClientSession] = None
+    ) -> Block:
+        if block_id <= 0 or block_id > self.get_num_blocks():
+            raise Exception("Invalid block")
+        b = Block()
+        b.from_json(self.blocks.find_one({"id": block_id}, session=session))
+        return b
 
-    def get_block(self, block_id: int) -> Block:
+    def get_block_header(
+        self, block_id: int, session: Optional[ClientSession] = None
+    ) -> Block:
+        # Loads the block without its transactions, which are not fetched
         if block_id <= 0 or block_id > self.get_num_blocks():
             raise Exception("Invalid block")
         b = Block()
-        b.from_json(self.blocks.find_one({"id": block_id}))
+        b.from_json(
+            self.blocks.find_one(
+                {"id": block_id}, {"transactions": 0}, session=session
+            ),
+            include_transactions=False,
+        )
         return b
@@ -0,0 +1,110 @@
+"""
+Packed per block header data: block hash, timestamp, difficulty and the
+total work of the chain up to and including the block.
+
+Entries are fixed size records in one bytearray, block id n at record
+n - 1. When a path is given the records are also appended to that file,
+so a restarted node reads them back instead of loading every block.
+"""
+
+import os
+import struct
+import threading
+from typing import Callable, Iterator, Optional, Tuple
+from pandanite.core.block import Block
+from pandanite.core.crypto import SHA256Hash, add_work
+
+# hash, timestamp, difficulty, cumulative work as a 320 bit integer
+HEADER_RECORD = struct.Struct("<32sQI40s")
+WORK_SIZE = 40
+
+
+class HeaderIndex:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._records = bytearray()
+        self._file = None
+        if path is not None:
+            mode = "r+b" if os.path.exists(path) else "w+b"
+            self._file = open(path, mode)
+            self._records = bytearray(self._file.read())
+            # a record cut short by a crash is dropped
+            self.truncate(len(self._records) // HEADER_RECORD.size)
+
+    def __len__(self) -> int:
+        return len(self._records) // HEADER_RECORD.size
+
+    def _record(self, block_id: int) -> Tuple[bytes, int, int, bytes]:
+        if block_id <= 0 or block_id > len(self):
+            raise Exception("Invalid block")
+        return HEADER_RECORD.unpack_from(
+            self._records, (block_id - 1) * HEADER_RECORD.size
+        )
+
+    def get_hash(self, block_id: int) -> SHA256Hash:
+        return self._record(block_id)[0]
+
+    def get_timestamp(self, block_id: int) -> int:
+        return self._record(block_id)[1]
+
+    def get_difficulty(self, block_id: int) -> int:
+        return self._record(block_id)[2]
+
+    def get_total_work(self, block_id: int) -> int:
+        # total work of blocks 1 to block_id, 0 for an empty chain
+        if block_id == 0:
+            return 0
+        return int.from_bytes(self._record(block_id)[3], "little")
+
+    def get_hashes(self, start_id: int, end_id: int) -> Iterator[SHA256Hash]:
+        with self._lock:
+            for block_id in range(start_id, min(end_id, len(self)) + 1):
+                yield self.get_hash(block_id)
+
+    def append(self, block: Block):
+        with self._lock:
+            if block.get_id() != len(self) + 1:
+                raise Exception("Block out of order")
+            work = add_work(self.get_total_work(len(self)), block.get_difficulty())
+            record = HEADER_RECORD.pack(
+                block.get_hash(),
+                block.get_timestamp(),
+                block.get_difficulty(),
+                work.to_bytes(WORK_SIZE, "little"),
+            )
+            self._records += record
+            if self._file is not None:
+                self._file.seek((block.get_id() - 1) * HEADER_RECORD.size)
+                self._file.write(record)
+                self._file.flush()
+
+    def truncate(self, num_blocks: int):
+        with self._lock:
+            if num_blocks >= len(self) and self._file is None:
+                return
+            num_blocks = min(num_blocks, len(self))
+            del self._records[num_blocks * HEADER_RECORD.size :]
+            if self._file is not None:
+                self._file.truncate(num_blocks * HEADER_RECORD.size)
+                self._file.flush()
+
+    def sync(self, num_blocks: int, get_header: Callable[[int], Block]):
+        # Brings the index to num_blocks, loading missing headers with
+        # get_header. Trailing entries whose hash no longer matches are
+        # dropped first, e.g. after a rolled back commit.
+        with self._lock:
+            self.truncate(num_blocks)
+            while len(self) > 0:
+                tip = get_header(len(self))
+                if tip.get_hash() == self.get_hash(len(self)):
+                    break
+                self.truncate(len(self) - 1)
+            for block_id in range(len(self) + 1, num_blocks + 1):
+                self.append(get_header(block_id))
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
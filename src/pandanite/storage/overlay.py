@@ -0,0 +1,172 @@
+import threading
+from typing import Dict, List, Optional
+from pandanite.core.block import Block
+from pandanite.core.common import TransactionAmount
+from pandanite.core.crypto import (
+    SHA256Hash,
+    PublicWalletAddress,
+    add_work,
+    wallet_address_to_string,
+)
+from pandanite.core.transaction import Transaction
+from pandanite.storage.base import Storage, Session, WalletTransaction
+from pandanite.storage.undo import UndoRecord
+
+
+class PendingGroup:
+    """
+    A run of validated blocks and their combined ledger and wallet history
+    changes, written to storage in one transaction.
+    """
+
+    def __init__(self, seq: int):
+        self.seq = seq
+        self.blocks: List[Block] = []
+        self.undo_records: List[UndoRecord] = []
+        self.wallets: Dict[str, TransactionAmount] = {}
+        self.wallet_transactions: List[WalletTransaction] = []
+        self.difficulty = 0
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def commit(self, db: Storage, session: Optional[Session] = None):
+        # Writes the group through the session of an open transaction
+        for block, undo in zip(self.blocks, self.undo_records):
+            db.add_block(block, session)
+            db.add_undo_record(undo, session)
+        db.update_wallets(self.wallets, session)
+        db.add_wallet_transactions(self.wallet_transactions, session)
+        if db.get_difficulty() != self.difficulty:
+            db.set_difficulty(self.difficulty, session)
+
+
+class StorageOverlay:
+    """
+    Blocks validated but not yet committed, layered over a Storage. Reads
+    used to validate the next block see the pending ledger, transaction
+    index and tip state first. Blocks collect in the current PendingGroup;
+    seal() hands it over for writing and release() drops its entries once
+    storage has them, so groups can be written while later blocks are
+    validated.
+    """
+
+    def __init__(self, db: Storage):
+        self.db = db
+        self._lock = threading.Lock()
+        self.current = PendingGroup(0)
+        self.wallets: Dict[str, TransactionAmount] = {}
+        # address -> seq of the group that last changed its balance
+        self.wallet_groups: Dict[str, int] = {}
+        # transaction_to_block key -> block id
+        self.tx_ids: Dict[str, int] = {}
+        self.num_blocks: int = db.get_num_blocks()
+        self.total_work: int = db.get_total_work()
+        self.difficulty: int = db.get_difficulty()
+        self.last_hash: SHA256Hash = db.get_last_hash()
+
+    def __len__(self) -> int:
+        # blocks in the current, not yet sealed, group
+        return len(self.current)
+
+    def get_num_blocks(self) -> int:
+        return self.num_blocks
+
+    def get_total_work(self) -> int:
+        return self.total_work
+
+    def get_difficulty(self) -> int:
+        return self.difficulty
+
+    def set_difficulty(self, difficulty: int, session: Optional[Session] = None):
+        self.difficulty = difficulty
+
+    def get_last_hash(self) -> SHA256Hash:
+        return self.last_hash
+
+    def get_wallets(
+        self, wallets: List[PublicWalletAddress]
+    ) -> Dict[str, TransactionAmount]:
+        # pending balances win; the rest are read from storage in one call
+        found: Dict[str, TransactionAmount] = {}
+        missing = []
+        with self._lock:
+            for wallet in wallets:
+                address = wallet_address_to_string(wallet)
+                if address in self.wallets:
+                    found[address] = self.wallets[address]
+                else:
+                    missing.append(wallet)
+        if missing:
+            found.update(self.db.get_wallets(missing))
+        return found
+
+    def block_for_transaction(self, t: Transaction) -> int:
+        block_id = self.tx_ids.get(t.get_id())
+        if block_id is not None:
+            return block_id
+        return self.db.block_for_transaction(t)
+
+    def find_block_for_transaction(self, t: Transaction) -> int:
+        block_id = self.tx_ids.get(t.get_id())
+        if block_id is not None:
+            return block_id
+        return self.db.find_block_for_transaction(t)
+
+    def add_block(
+        self,
+        block: Block,
+        undo: UndoRecord,
+        wallets: Dict[str, TransactionAmount],
+        wallet_transactions: List[WalletTransaction],
+    ):
+        if block.get_id() != self.num_blocks + 1:
+            raise Exception("Block out of order")
+        with self._lock:
+            group = self.current
+            group.blocks.append(block)
+            group.undo_records.append(undo)
+            group.wallets.update(wallets)
+            group.wallet_transactions += wallet_transactions
+            self.wallets.update(wallets)
+            for address in wallets:
+                self.wallet_groups[address] = group.seq
+            for tx_id in undo.tx_ids:
+                self.tx_ids[tx_id] = block.get_id()
+            self.num_blocks = block.get_id()
+            self.total_work = add_work(self.total_work, block.get_difficulty())
+            self.difficulty = block.get_difficulty()
+            self.last_hash = block.get_hash()
+
+    def seal(self) -> PendingGroup:
+        # Closes the current group for writing and opens the next one
+        with self._lock:
+            group = self.current
+            group.difficulty = self.difficulty
+            self.current = PendingGroup(group.seq + 1)
+            return group
+
+    def release(self, group: PendingGroup):
+        # Called once group is committed; entries a later group changed
+        # again are kept
+        with self._lock:
+            for address in group.wallets:
+                if self.wallet_groups.get(address) == group.seq:
+                    del self.wallets[address]
+                    del self.wallet_groups[address]
+            for undo in group.undo_records:
+                for tx_id in undo.tx_ids:
+                    if self.tx_ids.get(tx_id) == undo.block_id:
+                        del self.tx_ids[tx_id]
+
+    def clear(self):
+        # Drops every pending block, back to the committed state
+        with self._lock:
+            self.current = PendingGroup(0)
+            self.wallets = {}
+            self.wallet_groups = {}
+            self.tx_ids = {}
+            self.num_blocks = self.db.get_num_blocks()
+            self.total_work = self.db.get_total_work()
+            self.difficulty = self.db.get_difficulty()
+            self.last_hash = self.db.get_last_hash()
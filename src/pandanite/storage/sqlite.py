@@ -0,0 +1,446 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+from pandanite.core.transaction import Transaction
+from pandanite.core.crypto import (
+    SHA256Hash,
+    add_work,
+    remove_work,
+    PublicWalletAddress,
+    wallet_address_to_string,
+    sha_256_to_string,
+)
+from pandanite.core.common import TransactionAmount
+from pandanite.core.block import Block
+from pandanite.core.constants import (
+    WALLET_LOOKUP_BATCH_SIZE,
+    WALLET_HISTORY_PAGE_SIZE,
+)
+from pandanite.storage.base import Storage, Session, WalletTransaction
+from pandanite.storage.header_index import HeaderIndex
+from pandanite.storage.undo import UndoRecord
+
+"""
+SQLite tables, mirroring the Mongo collections
+blocks: header columns plus the JSON encoded transactions of block.to_json()
+transaction_to_block: tx_id -> (block_id, position in the stored block)
+ledger: address -> balance
+wallet_history: (address, tx_id, block_id) rows, id gives insertion order
+undo_records: block_id -> JSON encoded UndoRecord.to_json()
+info: a single row with total_work, num_blocks and difficulty
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    id INTEGER PRIMARY KEY,
+    timestamp INTEGER NOT NULL,
+    difficulty INTEGER NOT NULL,
+    nonce TEXT NOT NULL,
+    merkle_root TEXT NOT NULL,
+    last_block_hash TEXT NOT NULL,
+    transactions TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transaction_to_block (
+    tx_id TEXT PRIMARY KEY,
+    block_id INTEGER NOT NULL,
+    position INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ledger (
+    address TEXT PRIMARY KEY,
+    balance INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS wallet_history (
+    id INTEGER PRIMARY KEY,
+    address TEXT NOT NULL,
+    tx_id TEXT NOT NULL,
+    block_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS wallet_history_address
+    ON wallet_history (address, id);
+CREATE TABLE IF NOT EXISTS undo_records (
+    block_id INTEGER PRIMARY KEY,
+    record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS info (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    total_work TEXT NOT NULL,
+    num_blocks INTEGER NOT NULL,
+    difficulty INTEGER NOT NULL
+);
+"""
+
+TABLES = [
+    "blocks",
+    "transaction_to_block",
+    "ledger",
+    "wallet_history",
+    "undo_records",
+    "info",
+]
+
+# sqlite3 keeps a per connection cache of prepared statements keyed by the
+# SQL text, so every query below is written once and reused as is
+INSERT_BLOCK = "INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?, ?, ?, ?)"
+SELECT_BLOCK = (
+    "SELECT id, timestamp, difficulty, nonce, merkle_root, last_block_hash, "
+    "transactions FROM blocks WHERE id = ?"
+)
+SELECT_BLOCK_HEADER = (
+    "SELECT id, timestamp, difficulty, nonce, merkle_root, last_block_hash "
+    "FROM blocks WHERE id = ?"
+)
+DELETE_BLOCK = "DELETE FROM blocks WHERE id = ?"
+INSERT_TX = "INSERT OR REPLACE INTO transaction_to_block VALUES (?, ?, ?)"
+SELECT_TX = "SELECT block_id, position FROM transaction_to_block WHERE tx_id = ?"
+SELECT_BLOCK_TX = (
+    "SELECT json_extract(transactions, '$[' || ? || ']') FROM blocks WHERE id = ?"
+)
+DELETE_TX = "DELETE FROM transaction_to_block WHERE tx_id = ?"
+UPSERT_WALLET = "INSERT OR REPLACE INTO ledger VALUES (?, ?)"
+# formatted with one placeholder per address of the batch
+SELECT_WALLETS = "SELECT address, balance FROM ledger WHERE address IN ({})"
+INSERT_WALLET_TX = (
+    "INSERT INTO wallet_history (address, tx_id, block_id) VALUES (?, ?, ?)"
+)
+DELETE_WALLET_TX = (
+    "DELETE FROM wallet_history WHERE address = ? AND tx_id = ? AND block_id = ?"
+)
+SELECT_WALLET_TXS = (
+    "SELECT id, tx_id, block_id FROM wallet_history "
+    "WHERE address = ? AND id < ? ORDER BY id DESC LIMIT ?"
+)
+INSERT_UNDO = "INSERT OR REPLACE INTO undo_records VALUES (?, ?)"
+SELECT_UNDO = (
+    "SELECT record FROM undo_records WHERE block_id BETWEEN ? AND ? ORDER BY block_id"
+)
+DELETE_BLOCKS_AFTER = "DELETE FROM blocks WHERE id > ?"
+DELETE_UNDO_AFTER = "DELETE FROM undo_records WHERE block_id > ?"
+SELECT_STATE = "SELECT total_work, num_blocks, difficulty FROM info WHERE id = 0"
+UPSERT_STATE = "INSERT OR REPLACE INTO info VALUES (0, ?, ?, ?)"
+
+
+class SQLiteDB(Storage):
+    """
+    Embedded storage backend. The database is a single file opened in WAL
+    mode, so readers do not block the writer. One connection is shared by
+    all threads and serialized with a lock; every block commit runs in one
+    SQLite transaction.
+    """
+
+    def __init__(
+        self,
+        path: str = "pandanite.db",
+        clear=True,
+        header_index_path: Optional[str] = None,
+    ):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is crash safe in WAL mode, only the last commits can be
+        # lost on power failure
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._in_transaction = False
+        self._state: Optional[Dict[str, Any]] = None
+        # headers are persisted next to the database unless it is in memory
+        if header_index_path is None and path != ":memory:":
+            header_index_path = path + ".headers"
+        self.headers = HeaderIndex(header_index_path)
+        if clear:
+            self.clear()
+        else:
+            if self.conn.execute(SELECT_STATE).fetchone() is None:
+                self._write_state(0, 0, 16)
+            self._sync_headers()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+            self.headers.close()
+
+    def clear(self):
+        with self._writing():
+            for table in TABLES:
+                self.conn.execute(f"DELETE FROM {table}")
+            self._write_state(0, 0, 16)
+            self.headers.truncate(0)
+
+    def reload_state(self):
+        with self._lock:
+            self._state = None
+            self._sync_headers()
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        # Joins the open transaction, or wraps a standalone write in its own
+        with self._lock:
+            if self._in_transaction:
+                yield
+                return
+            with self.transaction():
+                yield
+
+    @contextmanager
+    def transaction(self) -> Iterator[Optional[Session]]:
+        """
+        Runs the body in one SQLite transaction, holding the connection
+        lock throughout. The tip state cache is reloaded if it aborts.
+        """
+        with self._lock:
+            if self._in_transaction:
+                raise Exception("Nested transaction")
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._in_transaction = True
+            try:
+                yield None
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                self._in_transaction = False
+                self.reload_state()
+                raise
+            finally:
+                self._in_transaction = False
+
+    def _get_state(self) -> Dict[str, Any]:
+        state = self._state
+        if state is None:
+            with self._lock:
+                total_work, num_blocks, difficulty = self.conn.execute(
+                    SELECT_STATE
+                ).fetchone()
+                state = {
+                    "total_work": total_work,
+                    "num_blocks": num_blocks,
+                    "difficulty": difficulty,
+                }
+                self._state = state
+        return state
+
+    def _write_state(self, total_work: int, num_blocks: int, difficulty: int):
+        with self._writing():
+            self.conn.execute(UPSERT_STATE, (str(total_work), num_blocks, difficulty))
+            self._state = {
+                "total_work": str(total_work),
+                "num_blocks": num_blocks,
+                "difficulty": difficulty,
+            }
+
+    def set_difficulty(self, difficulty: int, session: Optional[Session] = None):
+        self._write_state(self.get_total_work(), self.get_num_blocks(), difficulty)
+
+    def get_num_blocks(self) -> int:
+        return self._get_state()["num_blocks"]
+
+    def get_total_work(self) -> int:
+        return int(self._get_state()["total_work"])
+
+    def get_difficulty(self) -> int:
+        return self._get_state()["difficulty"]
+
+    def add_block(self, block: Block, session: Optional[Session] = None):
+        transactions = block.get_transactions()
+        with self._writing():
+            self.conn.execute(
+                INSERT_BLOCK,
+                (
+                    block.get_id(),
+                    block.get_timestamp(),
+                    block.get_difficulty(),
+                    sha_256_to_string(block.get_nonce()),
+                    sha_256_to_string(block.get_merkle_root()),
+                    sha_256_to_string(block.get_last_block_hash()),
+                    json.dumps([t.to_json() for t in transactions]),
+                ),
+            )
+            self.conn.executemany(
+                INSERT_TX,
+                [
+                    (t.get_id(), block.get_id(), position)
+                    for position, t in enumerate(transactions)
+                ],
+            )
+            new_work = add_work(self.get_total_work(), block.get_difficulty())
+            self._write_state(new_work, block.get_id(), block.get_difficulty())
+            self.headers.append(block)
+
+    def pop_block(self, session: Optional[Session] = None):
+        # The difficulty is left as is, the prior value is not recorded
+        count = self.get_num_blocks()
+        if count == 0:
+            return
+        with self._writing():
+            block = self.get_block(count)
+            self.conn.execute(DELETE_BLOCK, (count,))
+            self.conn.execute(DELETE_UNDO_AFTER, (count - 1,))
+            self.conn.executemany(
+                DELETE_TX, [(t.get_id(),) for t in block.get_transactions()]
+            )
+            new_work = remove_work(self.get_total_work(), block.get_difficulty())
+            self._write_state(new_work, count - 1, self.get_difficulty())
+            self.headers.truncate(count - 1)
+
+    def add_undo_record(self, record: UndoRecord, session: Optional[Session] = None):
+        with self._writing():
+            self.conn.execute(
+                INSERT_UNDO, (record.block_id, json.dumps(record.to_json()))
+            )
+
+    def get_undo_records(
+        self, start_id: int, end_id: int, session: Optional[Session] = None
+    ) -> List[UndoRecord]:
+        with self._lock:
+            rows = self.conn.execute(SELECT_UNDO, (start_id, end_id)).fetchall()
+        return [UndoRecord.from_json(json.loads(row[0])) for row in rows]
+
+    def rewind(self, undo: UndoRecord, session: Optional[Session] = None):
+        num_blocks = undo.block_id - 1
+        if num_blocks >= self.get_num_blocks():
+            return
+        with self._writing():
+            self.conn.execute(DELETE_BLOCKS_AFTER, (num_blocks,))
+            self.conn.executemany(DELETE_TX, [(tx_id,) for tx_id in undo.tx_ids])
+            self.conn.executemany(UPSERT_WALLET, list(undo.balances.items()))
+            self.conn.executemany(DELETE_WALLET_TX, undo.history)
+            self.conn.execute(DELETE_UNDO_AFTER, (num_blocks,))
+            self._write_state(undo.total_work, num_blocks, undo.difficulty)
+            self.headers.truncate(num_blocks)
+
+    def _block_from_row(self, row: Tuple, include_transactions: bool) -> Block:
+        b = Block()
+        b.from_json(
+            {
+                "id": row[0],
+                "timestamp": row[1],
+                "difficulty": row[2],
+                "nonce": row[3],
+                "merkleRoot": row[4],
+                "lastBlockHash": row[5],
+                "transactions": json.loads(row[6]) if include_transactions else None,
+            },
+            include_transactions=include_transactions,
+        )
+        return b
+
+    def get_block(self, block_id: int, session: Optional[Session] = None) -> Block:
+        if block_id <= 0 or block_id > self.get_num_blocks():
+            raise Exception("Invalid block")
+        with self._lock:
+            row = self.conn.execute(SELECT_BLOCK, (block_id,)).fetchone()
+        return self._block_from_row(row, True)
+
+    def get_block_header(
+        self, block_id: int, session: Optional[Session] = None
+    ) -> Block:
+        # Loads the block without its transactions, which are not fetched
+        if block_id <= 0 or block_id > self.get_num_blocks():
+            raise Exception("Invalid block")
+        with self._lock:
+            row = self.conn.execute(SELECT_BLOCK_HEADER, (block_id,)).fetchone()
+        return self._block_from_row(row, False)
+
+    def get_wallets(
+        self,
+        wallets: List[PublicWalletAddress],
+        session: Optional[Session] = None,
+    ) -> Dict[str, TransactionAmount]:
+        addresses = list(
+            dict.fromkeys(wallet_address_to_string(wallet) for wallet in wallets)
+        )
+        wallet_totals: Dict[str, TransactionAmount] = {}
+        with self._lock:
+            for i in range(0, len(addresses), WALLET_LOOKUP_BATCH_SIZE):
+                chunk = addresses[i : i + WALLET_LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                for address, balance in self.conn.execute(
+                    SELECT_WALLETS.format(placeholders), chunk
+                ):
+                    wallet_totals[address] = balance
+        return wallet_totals
+
+    def update_wallet(self, wallet: str, amount: TransactionAmount):
+        with self._writing():
+            self.conn.execute(UPSERT_WALLET, (wallet, amount))
+
+    def update_wallets(
+        self,
+        wallets: Dict[str, TransactionAmount],
+        session: Optional[Session] = None,
+    ):
+        with self._writing():
+            self.conn.executemany(UPSERT_WALLET, list(wallets.items()))
+
+    def add_wallet_transactions(
+        self,
+        entries: List[WalletTransaction],
+        session: Optional[Session] = None,
+    ):
+        with self._writing():
+            self.conn.executemany(
+                INSERT_WALLET_TX,
+                [(wallet_address_to_string(w), tx_id, b) for w, tx_id, b in entries],
+            )
+
+    def remove_wallet_transactions(
+        self,
+        entries: List[WalletTransaction],
+        session: Optional[Session] = None,
+    ):
+        with self._writing():
+            self.conn.executemany(
+                DELETE_WALLET_TX,
+                [(wallet_address_to_string(w), tx_id, b) for w, tx_id, b in entries],
+            )
+
+    def get_wallet_history(
+        self,
+        wallet: PublicWalletAddress,
+        cursor: Optional[int] = None,
+        limit: int = WALLET_HISTORY_PAGE_SIZE,
+    ) -> Tuple[List[Tuple[str, int]], Optional[int]]:
+        # The cursor is the row id of the last entry returned; one extra
+        # row is read to tell whether another page follows
+        if limit <= 0:
+            return [], None
+        with self._lock:
+            rows = self.conn.execute(
+                SELECT_WALLET_TXS,
+                (
+                    wallet_address_to_string(wallet),
+                    cursor if cursor is not None else 2**63 - 1,
+                    limit + 1,
+                ),
+            ).fetchall()
+        page = [(tx_id, block_id) for _, tx_id, block_id in rows[:limit]]
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return page, next_cursor
+
+    def block_for_transaction(self, t: Transaction) -> int:
+        with self._lock:
+            row = self.conn.execute(SELECT_TX, (t.get_id(),)).fetchone()
+        if row is not None:
+            return row[0]
+        return -1
+
+    def get_transaction_location(self, txid: SHA256Hash) -> Optional[Tuple[int, int]]:
+        with self._lock:
+            row = self.conn.execute(SELECT_TX, (sha_256_to_string(txid),)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1]
+
+    def get_transaction(self, block_id: int, position: int) -> Transaction:
+        if position < 0:
+            raise Exception("Invalid transaction position")
+        # json_extract hands back only the requested entry of the block
+        with self._lock:
+            row = self.conn.execute(SELECT_BLOCK_TX, (position, block_id)).fetchone()
+        if row is None or row[0] is None:
+            raise Exception("Invalid transaction position")
+        t = Transaction()
+        t.from_json(json.loads(row[0]))
+        t.seal()
+        return t
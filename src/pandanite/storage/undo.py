@@ -0,0 +1,112 @@
+from typing import Any, Dict, List, Tuple
+from pandanite.core.common import TransactionAmount
+from pandanite.core.crypto import (
+    PublicWalletAddress,
+    string_to_wallet_address,
+    wallet_address_to_string,
+)
+
+# (wallet, transaction id, id of the block holding it), as taken by the
+# Storage wallet history methods
+WalletTransaction = Tuple[PublicWalletAddress, str, int]
+
+
+class UndoRecord:
+    """
+    What one block commit changed, written alongside the block so it can be
+    rewound without re-reading or re-executing its transactions: the prior
+    balance of every wallet it touched, the transaction ids it indexed, the
+    wallet history entries it added and the tip total work and difficulty
+    from before the block.
+    """
+
+    def __init__(
+        self,
+        block_id: int,
+        total_work: int,
+        difficulty: int,
+        balances: Dict[str, TransactionAmount],
+        tx_ids: List[str],
+        history: List[Tuple[str, str, int]],
+    ):
+        self.block_id = block_id
+        self.total_work = total_work
+        self.difficulty = difficulty
+        # address -> balance before the block, 0 for wallets it created
+        self.balances = balances
+        # transaction_to_block keys
+        self.tx_ids = tx_ids
+        # (address, tx id, block id) wallet history entries
+        self.history = history
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "block_id": self.block_id,
+            "total_work": str(self.total_work),
+            "difficulty": self.difficulty,
+            "balances": [
+                [address, amount] for address, amount in self.balances.items()
+            ],
+            "tx_ids": self.tx_ids,
+            "history": [list(entry) for entry in self.history],
+        }
+
+    @staticmethod
+    def from_json(data: Dict[str, Any]) -> "UndoRecord":
+        return UndoRecord(
+            data["block_id"],
+            int(data["total_work"]),
+            data["difficulty"],
+            {address: amount for address, amount in data["balances"]},
+            data["tx_ids"],
+            [
+                (address, tx_id, block_id)
+                for address, tx_id, block_id in data["history"]
+            ],
+        )
+
+    @staticmethod
+    def for_block(
+        block_id: int,
+        total_work: int,
+        difficulty: int,
+        balances: Dict[str, TransactionAmount],
+        tx_ids: List[str],
+        history: List[WalletTransaction],
+    ) -> "UndoRecord":
+        return UndoRecord(
+            block_id,
+            total_work,
+            difficulty,
+            balances,
+            tx_ids,
+            [(wallet_address_to_string(w), tx_id, b) for w, tx_id, b in history],
+        )
+
+    def wallet_transactions(self) -> List[WalletTransaction]:
+        # history in the form taken by Storage.remove_wallet_transactions
+        return [
+            (string_to_wallet_address(address), tx_id, block_id)
+            for address, tx_id, block_id in self.history
+        ]
+
+
+def merge_undo_records(records: List[UndoRecord]) -> UndoRecord:
+    """
+    Combines the records of consecutive blocks into one that rewinds them
+    all at once: the oldest prior balance of each wallet wins and the tip
+    state is the one from before the first block.
+    """
+    records = sorted(records, key=lambda r: r.block_id)
+    balances: Dict[str, TransactionAmount] = {}
+    tx_ids: List[str] = []
+    history: List[Tuple[str, str, int]] = []
+    for record in records:
+        for address, amount in record.balances.items():
+            balances.setdefault(address, amount)
+        tx_ids += record.tx_ids
+        history += record.history
+    first = records[0]
+    return UndoRecord(
+        first.block_id, first.total_work, first.difficulty, balances, tx_ids, history
+    )
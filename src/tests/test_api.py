@@ -0,0 +1,49 @@
+import importlib
+import sys
+import pytest
+from pandanite.core.wire import transaction_from_buffer, transaction_to_buffer
+
+
+@pytest.fixture
+def node(tmp_path, monkeypatch):
+    # a fresh app module on an SQLite chain with a block archive
+    monkeypatch.setenv("PANDANITE_STORAGE", "sqlite")
+    monkeypatch.setenv("PANDANITE_SQLITE_PATH", str(tmp_path / "chain.db"))
+    monkeypatch.setenv("PANDANITE_BLOCK_STORE", str(tmp_path / "blocks"))
+    sys.modules.pop("app", None)
+    node = importlib.import_module("app")
+    yield node
+    node.block_store.close()
+    node.db.close()
+    sys.modules.pop("app", None)
+
+
+def test_transaction_lookup(node):
+    client = node.app.test_client()
+    genesis = node.db.get_block(1).get_transactions()
+    for position, t in enumerate(genesis):
+        result = client.get("/transaction?txid=" + t.get_id()).get_json()
+        assert result["blockId"] == 1
+        assert result["position"] == position
+        assert result["transaction"]["txid"] == t.get_id()
+
+    assert client.get("/transaction").data == b"No txid specified"
+    assert client.get("/transaction?txid=zz").data == b"Invalid txid"
+    assert client.get("/transaction?txid=" + "0" * 64).data == (
+        b"Transaction not found"
+    )
+    assert client.get("/merkle_proof?txid=zz").data == b"Invalid txid"
+
+
+def test_transaction_lookup_checks_archive(node, monkeypatch):
+    # an archive entry without the genesis sender decodes to another id
+    def wire_only(block_id, position):
+        t = node.db.get_transaction(block_id, position)
+        return transaction_from_buffer(transaction_to_buffer(t))
+
+    monkeypatch.setattr(node.block_store, "get_transaction", wire_only)
+    client = node.app.test_client()
+    t = node.db.get_block(1).get_transactions()[0]
+    assert wire_only(1, 0).get_id() != t.get_id()
+    result = client.get("/transaction?txid=" + t.get_id()).get_json()
+    assert result["transaction"]["txid"] == t.get_id()
@@ -1,4 +1,10 @@
-from pandanite.core.block import Block
+from concurrent.futures import ThreadPoolExecutor
+import io
+import avro.io
+import avro.schema
+from avro.io import DatumWriter
+from pandanite.core.block import Block, verify_nonces, blocks_to_avro, blocks_from_avro
+from pandanite.core.crypto import mine_hash, sha_256
 from pandanite.core.user import User
 
 
@@ -28,4 +34,94 @@ def test_block_avro_serialization():
     b.from_avro(a.to_avro(include_transactions=True))
     print(a.to_json())
     print(b.to_json())
-    assert a == b
\ No newline at end of file
+    assert a == b
+
+
+def test_verify_nonces():
+    headers = []
+    for i in range(0, 10):
+        b = Block()
+        b.set_id(i + 1)
+        b.set_difficulty(8)
+        b.set_timestamp(i)
+        b.set_merkle_root(sha_256(str(i).encode("utf-8")))
+        b.set_nonce(mine_hash(b.get_hash(), b.get_difficulty()))
+        headers.append(b)
+    assert verify_nonces(headers) == [True] * 10
+
+    headers[3].set_difficulty(200)
+    expected = [i != 3 for i in range(0, 10)]
+    assert [b.verify_nonce() for b in headers] == expected
+    assert verify_nonces(headers) == expected
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        assert verify_nonces(headers, pool, chunk_size=3) == expected
+
+
+def test_block_avro_independent_of_cwd(tmp_path, monkeypatch):
+    a = Block()
+    miner = User()
+    a.add_transaction(miner.mine())
+    a.add_transaction(miner.send(User(), 1))
+
+    # encoding matches a writer built from a freshly parsed schema
+    schema = avro.schema.parse(open("schema.json", "rb").read())
+    bytes_writer = io.BytesIO()
+    DatumWriter(schema).write(
+        a.to_avro_dict(include_transactions=True), avro.io.BinaryEncoder(bytes_writer)
+    )
+    expected = bytes_writer.getvalue()
+
+    monkeypatch.chdir(tmp_path)
+    assert a.to_avro(include_transactions=True) == expected
+    b = Block()
+    b.from_avro(expected)
+    assert a == b
+
+
+def test_blocks_avro_many():
+    miner = User()
+    blocks = []
+    for i in range(0, 4):
+        b = Block()
+        b.set_id(i + 1)
+        b.add_transaction(miner.mine())
+        for _ in range(0, i):
+            b.add_transaction(miner.send(User(), 1))
+        blocks.append(b)
+
+    assert blocks_from_avro(blocks_to_avro(blocks, include_transactions=True)) == blocks
+    headers = blocks_from_avro(blocks_to_avro(blocks))
+    assert [h.get_id() for h in headers] == [1, 2, 3, 4]
+    assert all(len(h.get_transactions()) == 0 for h in headers)
+    assert blocks_from_avro(b"") == []
+
+
+def test_block_lazy_transactions():
+    a = Block()
+    miner = User()
+    a.add_transaction(miner.mine())
+    a.add_transaction(miner.send(User(), 1))
+    data = a.to_json()
+    # a corrupt transaction only fails once transactions are decoded
+    data["transactions"][1]["signingKey"] = "00"
+
+    b = Block()
+    b.from_json(data)
+    assert b.get_hash() == a.get_hash()
+    assert b.get_transaction_count() == 2
+    try:
+        b.get_transactions()
+        assert False
+    except Exception as e:
+        assert "public key" in str(e)
+
+    header = Block()
+    header.from_json(data, include_transactions=False)
+    assert header.get_hash() == a.get_hash()
+    assert header.get_transaction_count() == 0
+
+    c = Block()
+    c.from_avro(a.to_avro(include_transactions=True))
+    assert c.get_transaction_count() == 2
+    assert c.get_transactions() == a.get_transactions()
+    assert c == a
@@ -0,0 +1,131 @@
+import json
+import os
+from pandanite.core.block import Block
+from pandanite.core.blockchain import BlockChain
+from pandanite.core.executor import ExecutionStatus
+from pandanite.core.transaction import get_merkle_hash
+from pandanite.core.user import User
+from pandanite.core.wire import block_to_buffer
+from pandanite.storage.block_store import BlockStore
+from pandanite.storage.sqlite import SQLiteDB
+from tests.test_db import mine_next_block
+
+
+def make_block(block_id: int, num_transactions: int) -> Block:
+    miner = User()
+    receiver = User()
+    block = Block()
+    block.set_id(block_id)
+    block.set_timestamp(block_id)
+    block.add_transaction(miner.mine())
+    for i in range(0, num_transactions):
+        block.add_transaction(miner.send(receiver, i + 1))
+    return block
+
+
+def test_append_and_read(tmp_path):
+    store = BlockStore(str(tmp_path))
+    blocks = [make_block(i, i % 3) for i in range(1, 6)]
+    for block in blocks:
+        store.append(block)
+    assert store.get_num_blocks() == 5
+
+    for block in blocks:
+        assert bytes(store.get_raw(block.get_id())) == block_to_buffer(block)
+        assert store.get_block(block.get_id()).get_hash() == block.get_hash()
+        header = store.get_block_header(block.get_id())
+        assert header.get_hash() == block.get_hash()
+        assert header.get_transaction_count() == 0
+    for position, t in enumerate(blocks[4].get_transactions()):
+        assert store.get_transaction(5, position).get_hash() == t.get_hash()
+    assert [bytes(r) for r in store.iter_raw(2, 10)] == [
+        block_to_buffer(b) for b in blocks[1:]
+    ]
+
+    try:
+        store.append(make_block(7, 0))
+        assert False
+    except Exception as e:
+        assert str(e) == "Block out of order"
+    store.close()
+
+    reopened = BlockStore(str(tmp_path))
+    assert reopened.get_num_blocks() == 5
+    assert reopened.get_block(3).get_hash() == blocks[2].get_hash()
+
+
+def test_segments_and_truncate(tmp_path):
+    # room for about two small blocks per segment
+    store = BlockStore(str(tmp_path), segment_size=900)
+    blocks = [make_block(i, 1) for i in range(1, 8)]
+    for block in blocks:
+        store.append(block)
+    assert len([f for f in os.listdir(tmp_path) if f.startswith("blk")]) == 4
+
+    # a block larger than a segment gets one of its own
+    big = make_block(8, 10)
+    store.append(big)
+    assert store.get_block(8).get_hash() == big.get_hash()
+
+    store.truncate(5)
+    assert store.get_num_blocks() == 5
+    replacement = make_block(6, 2)
+    store.append(replacement)
+    store.close()
+
+    reopened = BlockStore(str(tmp_path), segment_size=900)
+    assert reopened.get_num_blocks() == 6
+    assert reopened.get_block(6).get_hash() == replacement.get_hash()
+    assert reopened.get_block(5).get_hash() == blocks[4].get_hash()
+
+
+def test_blockchain_keeps_store_in_step(tmp_path):
+    db = SQLiteDB(str(tmp_path / "chain.db"))
+    blockchain = BlockChain(db, block_store=BlockStore(str(tmp_path / "blocks")))
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    for i in range(0, 3):
+        block = mine_next_block(db, miner)
+        assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+    store = blockchain.block_store
+    assert store.get_num_blocks() == 4
+    assert store.get_block(4).get_hash() == block.get_hash()
+
+    blockchain.pop_block()
+    assert store.get_num_blocks() == 3
+
+    # a store opened on an existing chain is filled from the database
+    store.close()
+    rebuilt = BlockChain(db, block_store=BlockStore(str(tmp_path / "rebuilt")))
+    assert rebuilt.block_store.get_num_blocks() == 3
+    assert rebuilt.block_store.get_block(3).get_hash() == db.get_block(3).get_hash()
+
+
+def test_genesis_keeps_wallet_overrides(tmp_path):
+    with open("genesis.json", "r") as f:
+        genesis = Block()
+        genesis.from_json(json.loads(f.read()))
+    store = BlockStore(str(tmp_path))
+    store.append(genesis)
+    following = make_block(2, 2)
+    store.append(following)
+
+    # the wire format bytes are unchanged, the overrides are stored after them
+    assert bytes(store.get_raw(1)) == block_to_buffer(genesis)
+    stored = store.get_block(1)
+    assert [t.get_hash() for t in stored.get_transactions()] == [
+        t.get_hash() for t in genesis.get_transactions()
+    ]
+    assert get_merkle_hash(stored.get_transactions()) == genesis.get_merkle_root()
+    for position, t in enumerate(genesis.get_transactions()):
+        assert store.get_transaction(1, position).get_id() == t.get_id()
+    assert store.get_block(2).get_hash() == following.get_hash()
+    store.close()
+
+    reopened = BlockStore(str(tmp_path))
+    assert reopened.get_num_blocks() == 2
+    assert (
+        reopened.get_transaction(1, 0).get_id()
+        == genesis.get_transactions()[0].get_id()
+    )
+    assert reopened.get_block(2).get_hash() == following.get_hash()
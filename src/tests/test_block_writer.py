@@ -0,0 +1,56 @@
+import threading
+import pytest
+from pandanite.core.block_writer import BlockWriter
+from pandanite.storage.overlay import PendingGroup
+
+
+def test_groups_are_written_in_order():
+    written = []
+    writer = BlockWriter(lambda group: written.append(group.seq), 2)
+    for seq in range(0, 10):
+        writer.submit(PendingGroup(seq))
+    writer.flush()
+    assert written == list(range(0, 10))
+    writer.close()
+
+
+def test_queue_depth_is_bounded():
+    release = threading.Event()
+    written = []
+
+    def write(group: PendingGroup):
+        release.wait()
+        written.append(group.seq)
+
+    writer = BlockWriter(write, 2)
+    # one group being written plus two queued fill the writer
+    for seq in range(0, 3):
+        writer.submit(PendingGroup(seq))
+    blocked = threading.Thread(target=writer.submit, args=(PendingGroup(3),))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+    release.set()
+    blocked.join()
+    writer.flush()
+    assert written == [0, 1, 2, 3]
+    writer.close()
+
+
+def test_failed_write_discards_later_groups():
+    written = []
+
+    def write(group: PendingGroup):
+        if group.seq == 1:
+            raise RuntimeError("disk full")
+        written.append(group.seq)
+
+    writer = BlockWriter(write, 4)
+    for seq in range(0, 4):
+        writer.submit(PendingGroup(seq))
+    with pytest.raises(RuntimeError):
+        writer.flush()
+    with pytest.raises(RuntimeError):
+        writer.submit(PendingGroup(4))
+    writer.close()
+    assert written == [0]
@@ -0,0 +1,68 @@
+import random
+from pandanite.core.block import Block
+from pandanite.core.consensus import ConsensusState
+from pandanite.storage.header_index import HeaderIndex
+
+
+def make_header(block_id: int) -> Block:
+    block = Block()
+    block.set_id(block_id)
+    block.set_timestamp(random.randint(0, 10000))
+    block.set_difficulty(random.randint(16, 40))
+    return block
+
+
+def reference_median(headers: HeaderIndex, tip: int) -> float:
+    # the loop BlockChain.add_block used before ConsensusState
+    times = sorted(headers.get_timestamp(tip - i) for i in range(0, 10))
+    if len(times) % 2 == 0:
+        return (times[len(times) // 2] + times[len(times) // 2 - 1]) / 2
+    return times[len(times) // 2]
+
+
+def test_window_follows_add_and_pop():
+    headers = HeaderIndex()
+    consensus = ConsensusState(size=21)
+    for block_id in range(1, 51):
+        block = make_header(block_id)
+        headers.append(block)
+        consensus.push(block)
+        if block_id >= 10:
+            assert consensus.get_median_time() == reference_median(headers, block_id)
+
+    elapsed, difficulty = consensus.get_retarget_inputs(20)
+    assert elapsed == headers.get_timestamp(50) - headers.get_timestamp(30)
+    assert difficulty == headers.get_difficulty(50)
+
+    # popping refills the old end of the window from the header index
+    for tip in range(49, 25, -1):
+        headers.truncate(tip)
+        consensus.pop(headers)
+        assert consensus.num_blocks == tip
+        assert len(consensus.timestamps) == 21
+        assert consensus.get_median_time() == reference_median(headers, tip)
+        elapsed, _ = consensus.get_retarget_inputs(20)
+        assert elapsed == headers.get_timestamp(tip) - headers.get_timestamp(tip - 20)
+
+    reloaded = ConsensusState(size=21)
+    reloaded.load(headers, len(headers))
+    assert list(reloaded.timestamps) == list(consensus.timestamps)
+    assert list(reloaded.difficulties) == list(consensus.difficulties)
+
+
+def test_window_bounds():
+    consensus = ConsensusState(size=5)
+    assert consensus.get_median_time() == 0
+    for block_id in range(1, 8):
+        consensus.push(make_header(block_id))
+    assert consensus.get_timestamp(3) == consensus.timestamps[0]
+    try:
+        consensus.get_timestamp(2)
+        assert False
+    except Exception as e:
+        assert str(e) == "Block outside of consensus window"
+    try:
+        consensus.push(make_header(9))
+        assert False
+    except Exception as e:
+        assert str(e) == "Block out of order"
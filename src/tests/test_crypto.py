@@ -12,6 +12,12 @@ from pandanite.core.crypto import (
     string_to_sha_256,
     mine_hash,
     concat_hashes,
+    ripemd,
+    wallet_address_from_public_key,
+    public_key_from_bytes,
+    get_key_cache_stats,
+    clear_key_caches,
+    check_leading_zero_bits,
 )
 
 
@@ -80,3 +86,62 @@ def test_mine_hash():
     answer = mine_hash(hash, 6)
     new_hash = concat_hashes(hash, answer)
     assert new_hash[0] < 63
+
+
+def test_wallet_address_from_public_key():
+    pub, _ = generate_key_pair()
+    hash1 = sha_256(pub.to_bytes())
+    hash2 = ripemd(hash1)
+    hash4 = sha_256(sha_256(hash2))
+    expected = bytes([0]) + hash2 + hash4[0:4]
+    assert wallet_address_from_public_key(pub) == expected
+    assert len(wallet_address_from_public_key(pub)) == 25
+
+
+def test_key_cache_stats():
+    clear_key_caches()
+    pub, _ = generate_key_pair()
+    key_string = public_key_to_string(pub)
+
+    a = string_to_public_key(key_string)
+    b = public_key_from_bytes(pub.to_bytes())
+    assert a is b
+    assert a == pub
+
+    first = wallet_address_from_public_key(a)
+    assert wallet_address_from_public_key(b) is first
+
+    stats = get_key_cache_stats()
+    assert stats["public_keys"] == {
+        "hits": 1,
+        "misses": 1,
+        "size": 1,
+        "max_size": stats["public_keys"]["max_size"],
+    }
+    assert stats["wallet_addresses"]["hits"] == 1
+    assert stats["wallet_addresses"]["misses"] == 1
+
+    clear_key_caches()
+    assert get_key_cache_stats()["public_keys"]["size"] == 0
+
+
+def reference_leading_zero_bits(hash, N):
+    for i in range(N):
+        byte_index = i // 8
+        bit_index = i % 8
+        if hash[byte_index] & (1 << (7 - bit_index)):
+            return False
+        if byte_index == len(hash) - 1 and i < N - 1:
+            return False
+    return True
+
+
+def test_check_leading_zero_bits():
+    hashes = [bytes(32), b"\xff" * 32]
+    for zeros in range(0, 256):
+        # exactly `zeros` leading zero bits followed by a one
+        hashes.append((1 << (255 - zeros)).to_bytes(32))
+        hashes.append(((1 << (256 - zeros)) - 1).to_bytes(32))
+    for N in range(0, 258):
+        for h in hashes:
+            assert check_leading_zero_bits(h, N) == reference_leading_zero_bits(h, N)
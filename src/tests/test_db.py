@@ -0,0 +1,354 @@
+from typing import Union
+from pandanite.storage.base import Storage
+from pandanite.storage.db import PandaniteDB
+from pandanite.storage.overlay import StorageOverlay
+from pandanite.core.blockchain import BlockChain
+from pandanite.core.block import Block
+from pandanite.core.user import User
+from pandanite.core.executor import ExecutionStatus
+from pandanite.core.crypto import (
+    mine_hash,
+    wallet_address_to_string,
+    string_to_sha_256,
+)
+from pandanite.core.helpers import PDN
+from pandanite.core.transaction import get_merkle_hash
+
+COLLECTIONS = [
+    "blocks",
+    "transaction_to_block",
+    "ledger",
+    "wallet_history",
+    "undo_records",
+    "info",
+]
+
+
+WRITE_METHODS = {
+    "insert_one",
+    "insert_many",
+    "replace_one",
+    "update_one",
+    "update_many",
+    "delete_one",
+    "delete_many",
+    "bulk_write",
+}
+
+
+class CountingCollection:
+    # wraps a collection and counts the calls made on it
+    def __init__(self, collection):
+        self.collection = collection
+        self.calls = 0
+        self.writes = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.collection, name)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            self.calls += 1
+            if name in WRITE_METHODS:
+                self.writes += 1
+            return attr(*args, **kwargs)
+
+        return wrapper
+
+
+def count_calls(db: PandaniteDB):
+    counters = {}
+    for name in COLLECTIONS:
+        counters[name] = CountingCollection(getattr(db, name))
+        setattr(db, name, counters[name])
+    return counters
+
+
+def mine_next_block(
+    db: Union[Storage, StorageOverlay], miner: User, transactions=[]
+) -> Block:
+    block = Block()
+    block.set_id(db.get_num_blocks() + 1)
+    block.add_transaction(miner.mine())
+    for t in transactions:
+        block.add_transaction(t)
+    block.set_merkle_root(get_merkle_hash(block.get_transactions()))
+    block.set_last_block_hash(db.get_last_hash())
+    block.set_difficulty(db.get_difficulty())
+    block.set_timestamp(0)
+    block.set_nonce(mine_hash(block.get_hash(), block.get_difficulty()))
+    return block
+
+
+def test_chain_state_served_from_memory():
+    db = PandaniteDB()
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    block = mine_next_block(db, miner)
+
+    counters = count_calls(db)
+    assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+    assert counters["info"].calls == 1
+    info_writes = counters["info"].calls
+
+    assert db.get_num_blocks() == 2
+    assert db.get_difficulty() == 16
+    assert db.get_total_work() == 2 * 2**16
+    assert counters["info"].calls == info_writes
+
+    # the tip hash comes from the header index, not the blocks collection
+    blocks_calls = counters["blocks"].calls
+    assert db.get_last_hash() == block.get_hash()
+    assert db.headers.get_total_work(2) == db.get_total_work()
+    assert counters["blocks"].calls == blocks_calls
+
+    # a fresh connection sees the same persisted state
+    other = PandaniteDB(clear=False)
+    assert other.get_num_blocks() == 2
+    assert other.get_total_work() == 2 * 2**16
+    assert other.get_last_hash() == block.get_hash()
+
+
+def test_chain_state_pop_and_difficulty():
+    db = PandaniteDB()
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    assert blockchain.add_block(mine_next_block(db, miner)) == ExecutionStatus.SUCCESS
+
+    db.set_difficulty(17)
+    assert db.get_difficulty() == 17
+    db.set_difficulty(16)
+
+    blockchain.pop_block()
+    assert db.get_num_blocks() == 1
+    assert db.get_total_work() == 2**16
+    db.reload_state()
+    assert db.get_num_blocks() == 1
+    assert blockchain.add_block(mine_next_block(db, miner)) == ExecutionStatus.SUCCESS
+
+
+def test_block_writes_are_batched():
+    db = PandaniteDB()
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    receivers = [User() for _ in range(0, 3)]
+    assert blockchain.add_block(mine_next_block(db, miner)) == ExecutionStatus.SUCCESS
+
+    sends = [miner.send(receivers[i % 3], PDN(1.0) + i, 1) for i in range(0, 12)]
+    block = mine_next_block(db, miner, sends)
+    counters = count_calls(db)
+    assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+    # the number of writes does not grow with the number of transactions
+    assert counters["blocks"].writes == 1
+    assert counters["transaction_to_block"].writes == 1
+    assert counters["ledger"].writes == 1
+    assert counters["wallet_history"].writes == 1
+    assert counters["undo_records"].writes == 1
+
+    wallets = db.get_wallets(
+        [miner.get_address()] + [r.get_address() for r in receivers]
+    )
+    assert (
+        wallets[wallet_address_to_string(receivers[0].get_address())] == PDN(4.0) + 18
+    )
+    stored = db.get_block(3).get_transactions()
+    for t in sends:
+        block_id, position = db.get_transaction_location(string_to_sha_256(t.get_id()))
+        assert block_id == 3
+        assert stored[position].get_hash() == t.get_hash()
+        assert db.get_transaction(block_id, position).get_hash() == t.get_hash()
+
+    history, cursor = db.get_wallet_history(receivers[0].get_address())
+    expected = [
+        (t.get_id(), 3)
+        for t in block.get_transactions()
+        if t.get_recepient() == receivers[0].get_address()
+    ]
+    assert history == expected[::-1]
+    assert cursor is None
+
+
+def test_reorg_rewinds_blocks_in_one_batch():
+    db = PandaniteDB()
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    other = User()
+    assert blockchain.add_block(mine_next_block(db, miner)) == ExecutionStatus.SUCCESS
+    addresses = [miner.get_address(), other.get_address()]
+    wallets = db.get_wallets(addresses)
+    tip = (db.get_last_hash(), db.get_total_work(), db.get_difficulty())
+
+    blocks = []
+    for i in range(0, 3):
+        sends = [miner.send(other, i * 10 + j + 1) for j in range(0, 4)]
+        blocks.append(mine_next_block(db, miner, sends))
+        assert blockchain.add_block(blocks[-1]) == ExecutionStatus.SUCCESS
+    assert len(db.get_undo_records(3, 5)) == 3
+
+    counters = count_calls(db)
+    blockchain.pop_blocks(3)
+    # no block is read back and each collection is written in one batch
+    assert counters["blocks"].calls == 1
+    for name in COLLECTIONS:
+        assert counters[name].writes <= 1
+
+    assert db.get_num_blocks() == 2
+    assert (db.get_last_hash(), db.get_total_work(), db.get_difficulty()) == tip
+    assert db.get_wallets(addresses) == {
+        wallet_address_to_string(miner.get_address()): wallets[
+            wallet_address_to_string(miner.get_address())
+        ],
+        wallet_address_to_string(other.get_address()): 0,
+    }
+    assert db.get_wallet_history(other.get_address()) == ([], None)
+    assert [r.block_id for r in db.get_undo_records(1, 5)] == [1, 2]
+    for block in blocks:
+        for t in block.get_transactions()[1:]:
+            assert db.find_block_for_transaction(t) == 0
+
+    for block in blocks:
+        assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+    assert db.get_num_blocks() == 5
+
+
+def test_sync_mode_commits_blocks_as_a_group():
+    db = PandaniteDB()
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    other = User()
+
+    counters = count_calls(db)
+    with blockchain.sync_mode() as overlay:
+        for i in range(0, 4):
+            sends = [miner.send(other, i + 1)] if i > 0 else []
+            block = mine_next_block(overlay, miner, sends)
+            assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+        assert db.get_num_blocks() == 1
+        assert counters["ledger"].writes == 0
+    assert db.get_num_blocks() == 5
+    assert db.get_last_hash() == block.get_hash()
+    # balances and histories are written once for the whole group
+    assert counters["ledger"].writes == 1
+    assert counters["wallet_history"].writes == 1
+    assert counters["blocks"].writes == 4
+    wallets = db.get_wallets([miner.get_address(), other.get_address()])
+    assert wallets[wallet_address_to_string(other.get_address())] == 2 + 3 + 4
+    assert len(db.get_wallet_history(other.get_address())[0]) == 3
+
+
+def test_get_wallets_batches_distinct_addresses(monkeypatch):
+    db = PandaniteDB()
+    db.clear()
+    users = [User() for _ in range(0, 5)]
+    db.update_wallets(
+        {wallet_address_to_string(u.get_address()): i + 1 for i, u in enumerate(users)}
+    )
+    unknown = User()
+    monkeypatch.setattr("pandanite.storage.db.WALLET_LOOKUP_BATCH_SIZE", 2)
+
+    counters = count_calls(db)
+    addresses = [u.get_address() for u in users] * 2 + [unknown.get_address()]
+    wallets = db.get_wallets(addresses)
+    # 6 distinct addresses in chunks of 2
+    assert counters["ledger"].calls == 3
+    assert wallets == {
+        wallet_address_to_string(u.get_address()): i + 1 for i, u in enumerate(users)
+    }
+
+
+def test_wallet_history_buckets_and_pages(monkeypatch):
+    monkeypatch.setattr("pandanite.storage.db.WALLET_HISTORY_BUCKET_SIZE", 4)
+    db = PandaniteDB()
+    wallet = User().get_address()
+    entries = [(wallet, "%064X" % i, 1 + i // 5) for i in range(0, 23)]
+    for block_id in range(1, 6):
+        counters = count_calls(db)
+        db.add_wallet_transactions([e for e in entries if e[2] == block_id])
+        # one read of the open bucket, one bulk write
+        assert counters["wallet_history"].calls == 2
+    address = wallet_address_to_string(wallet)
+    buckets = list(db.wallet_history.find({"address": address}, sort=[("bucket", 1)]))
+    assert [b["count"] for b in buckets] == [4, 4, 4, 4, 4, 3]
+
+    newest_first = [(tx_id, block_id) for _, tx_id, block_id in entries[::-1]]
+    pages = []
+    cursor = None
+    while True:
+        page, cursor = db.get_wallet_history(wallet, cursor, limit=7)
+        pages.append(page)
+        if cursor is None:
+            break
+    assert [len(p) for p in pages] == [7, 7, 7, 2]
+    assert sum(pages, []) == newest_first
+
+    # popping the newest block removes its entries across two buckets
+    db.remove_wallet_transactions([e for e in entries if e[2] == 5])
+    buckets = list(db.wallet_history.find({"address": address}, sort=[("bucket", 1)]))
+    assert [b["count"] for b in buckets] == [4, 4, 4, 4, 4, 0]
+    page, _ = db.get_wallet_history(wallet, limit=100)
+    assert page == newest_first[3:]
+    db.remove_wallet_transactions([e for e in entries if e[2] == 4])
+    buckets = list(db.wallet_history.find({"address": address}, sort=[("bucket", 1)]))
+    assert [b["count"] for b in buckets] == [4, 4, 4, 3]
+    page, _ = db.get_wallet_history(wallet, limit=100)
+    assert page == newest_first[8:]
+
+
+def test_transaction_location_without_position():
+    db = PandaniteDB()
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    other = User()
+    assert blockchain.add_block(mine_next_block(db, miner)) == ExecutionStatus.SUCCESS
+    sends = [miner.send(other, i + 1) for i in range(0, 3)]
+    block = mine_next_block(db, miner, sends)
+    assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+
+    # rows written before positions were indexed
+    db.transaction_to_block.update_many({}, {"$unset": {"position": ""}})
+    for t in sends:
+        txid = string_to_sha_256(t.get_id())
+        block_id, position = db.get_transaction_location(txid)
+        assert block_id == 3
+        assert db.get_transaction(block_id, position).get_hash() == t.get_hash()
+        # the position is backfilled on first lookup
+        row = db.transaction_to_block.find_one({"tx_id": t.get_id()})
+        assert row["position"] == position
+
+    # a row whose transaction is not in its block is not served
+    db.transaction_to_block.insert_one({"tx_id": "%064X" % 0, "block_id": 3})
+    assert db.get_transaction_location(bytes(32)) is None
+
+
+def test_header_index_persisted(tmp_path, monkeypatch):
+    assert PandaniteDB().headers.path == "pandanite-test.headers"
+    path = str(tmp_path / "headers")
+    db = PandaniteDB(header_index_path=path)
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    for i in range(0, 3):
+        assert (
+            blockchain.add_block(mine_next_block(db, miner)) == ExecutionStatus.SUCCESS
+        )
+
+    loaded = []
+    get_block_header = PandaniteDB.get_block_header
+
+    def counting_get_block_header(self, block_id, session=None):
+        loaded.append(block_id)
+        return get_block_header(self, block_id, session)
+
+    monkeypatch.setattr(PandaniteDB, "get_block_header", counting_get_block_header)
+    reopened = PandaniteDB(clear=False, header_index_path=path)
+    # only the tip is read back, to check the index is still in step
+    assert loaded == [4]
+    assert reopened.get_last_hash() == db.get_last_hash()
+    assert reopened.headers.get_total_work(4) == db.get_total_work()
@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from pandanite.core.block import Block
 from pandanite.core.user import User
 from pandanite.storage.db import PandaniteDB
@@ -185,3 +186,25 @@ def test_check_bad_signature():
     status, out = execute_block(db, wallets, b, PDN(50.0))
 
     assert status == ExecutionStatus.INVALID_SIGNATURE
+
+
+def test_check_bad_signature_with_executor():
+    b = Block()
+    miner = User()
+    receiver = User()
+    b.set_id(2)
+    t = miner.mine()
+    b.add_transaction(t)
+    for i in range(0, 10):
+        b.add_transaction(miner.send(receiver, PDN(1.0 + i)))
+    t2 = miner.send(receiver, PDN(2.0))
+    t2.sign(receiver.get_private_key())
+    b.add_transaction(t2)
+
+    db = PandaniteDB()
+    wallets = {}
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        # chunks of 4 so the signatures are checked on the pool
+        status, out = execute_block(db, wallets, b, PDN(50.0), pool, chunk_size=4)
+
+    assert status == ExecutionStatus.INVALID_SIGNATURE
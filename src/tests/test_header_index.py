@@ -0,0 +1,46 @@
+from pandanite.core.crypto import add_work
+from pandanite.storage.header_index import HeaderIndex, HEADER_RECORD
+from tests.test_block_store import make_block
+
+
+def test_append_and_lookup(tmp_path):
+    path = str(tmp_path / "headers.dat")
+    index = HeaderIndex(path)
+    blocks = [make_block(i, 0) for i in range(1, 6)]
+    work = 0
+    for i, block in enumerate(blocks):
+        block.set_difficulty(16 + i)
+        index.append(block)
+        work = add_work(work, block.get_difficulty())
+        assert index.get_total_work(block.get_id()) == work
+    assert len(index) == 5
+    assert index.get_hash(3) == blocks[2].get_hash()
+    assert index.get_timestamp(4) == blocks[3].get_timestamp()
+    assert index.get_difficulty(5) == 20
+    assert index.get_total_work(0) == 0
+    assert list(index.get_hashes(4, 9)) == [b.get_hash() for b in blocks[3:]]
+    index.close()
+
+    # a partially written record is dropped on open
+    with open(path, "ab") as f:
+        f.write(bytes(HEADER_RECORD.size // 2))
+    reopened = HeaderIndex(path)
+    assert len(reopened) == 5
+    assert reopened.get_total_work(5) == work
+    reopened.truncate(2)
+    reopened.close()
+    assert len(HeaderIndex(path)) == 2
+
+
+def test_sync_replaces_stale_entries():
+    blocks = [make_block(i, 0) for i in range(1, 5)]
+    index = HeaderIndex()
+    for block in blocks[:3]:
+        index.append(block)
+    # the stored chain forked at block 3 and grew to 4
+    fork = make_block(3, 1)
+    chain = {1: blocks[0], 2: blocks[1], 3: fork, 4: blocks[3]}
+    index.sync(4, lambda block_id: chain[block_id])
+    assert len(index) == 4
+    assert index.get_hash(3) == fork.get_hash()
+    assert index.get_hash(4) == blocks[3].get_hash()
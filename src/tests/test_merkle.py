@@ -0,0 +1,104 @@
+import json
+import random
+from collections import deque
+from pandanite.core.block import Block
+from pandanite.core.crypto import concat_hashes, sha_256, sha_256_to_string
+from pandanite.core.merkle import (
+    build_merkle_tree,
+    merkle_root,
+    get_merkle_proof,
+    verify_merkle_proof,
+)
+from pandanite.core.transaction import (
+    Transaction,
+    get_merkle_hash,
+    get_transaction_proof,
+)
+from pandanite.core.user import User
+from pandanite.core.helpers import PDN
+
+
+def reference_merkle_hash(items):
+    # the deque based implementation ported from the C++ node
+    items = sorted(items, key=lambda a: sha_256_to_string(a.get_hash()), reverse=True)
+    q = deque(item.get_hash() for item in items)
+    if len(q) % 2 == 1:
+        q.append(q[-1])
+    while len(q) > 1:
+        a = q.popleft()
+        b = q.popleft()
+        q.append(concat_hashes(a, b))
+    return q[0]
+
+
+def test_merkle_matches_reference():
+    miner = User()
+    receiver = User()
+    transactions = [miner.mine()]
+    for i in range(0, 3):
+        transactions.append(miner.send(receiver, PDN(1.0 + i)))
+    for i in range(0, 40):
+        transactions.append(Transaction(receiver.get_address(), i + 1))
+    for count in range(1, len(transactions) + 1):
+        items = random.sample(transactions, count)
+        assert get_merkle_hash(list(items)) == reference_merkle_hash(items)
+
+
+def test_merkle_sorts_items():
+    items = [Transaction(User().get_address(), i + 1) for i in range(0, 7)]
+    get_merkle_hash(items)
+    hashes = [sha_256_to_string(t.get_hash()) for t in items]
+    assert hashes == sorted(hashes, reverse=True)
+
+
+def test_merkle_matches_genesis():
+    with open("genesis.json", "r") as f:
+        block = Block()
+        block.from_json(json.loads(f.read()))
+    assert get_merkle_hash(block.get_transactions()) == block.get_merkle_root()
+
+
+def test_merkle_tree_layout():
+    leaves = [bytes(sha_256(str(i).encode("utf-8"))) for i in range(0, 5)]
+    nodes = build_merkle_tree(leaves)
+    # five leaves padded to six, then five parents
+    assert len(nodes) == 11
+    assert nodes[5] == leaves[4]
+    num_leaves = 6
+    for k in range(0, len(nodes) - 1):
+        parent = nodes[num_leaves + k // 2]
+        left, right = nodes[k & ~1], nodes[k | 1]
+        assert parent == concat_hashes(left, right)
+    assert merkle_root(leaves) == nodes[-1]
+    assert merkle_root([]) == bytes(32)
+
+
+def test_merkle_proofs():
+    for count in range(1, 20):
+        leaves = [bytes(sha_256(str(i).encode("utf-8"))) for i in range(0, count)]
+        root = merkle_root(leaves)
+        for index in range(0, count):
+            proof = get_merkle_proof(leaves, index)
+            assert verify_merkle_proof(leaves[index], index, count, proof, root)
+            # wrong leaf, position or tree size must not verify
+            other = leaves[(index + 1) % count]
+            if other != leaves[index]:
+                assert not verify_merkle_proof(other, index, count, proof, root)
+            assert not verify_merkle_proof(leaves[index], count, count, proof, root)
+            assert not verify_merkle_proof(leaves[index], index, count + 2, proof, root)
+
+
+def test_transaction_proof():
+    with open("genesis.json", "r") as f:
+        block = Block()
+        block.from_json(json.loads(f.read()))
+    transactions = block.get_transactions()
+    target = transactions[42]
+    leaf, index, proof = get_transaction_proof(transactions, target.get_id())
+    assert leaf == bytes(target.get_hash())
+    assert verify_merkle_proof(
+        leaf, index, len(transactions), proof, bytes(block.get_merkle_root())
+    )
+    # a proof is a handful of hashes, not the whole block
+    assert len(proof) <= 9
+    assert get_transaction_proof(transactions, "00" * 32) is None
@@ -0,0 +1,64 @@
+import threading
+from pandanite.core.block import Block
+from pandanite.core.user import User
+from pandanite.core.miner import MiningEngine
+from pandanite.core.crypto import NULL_SHA256_HASH, sha_256
+from pandanite.core.transaction import get_merkle_hash
+
+
+def make_template(difficulty: int) -> Block:
+    miner = User()
+    block = Block()
+    block.set_id(2)
+    block.add_transaction(miner.mine())
+    block.set_merkle_root(get_merkle_hash(block.get_transactions()))
+    block.set_last_block_hash(sha_256("parent".encode("utf-8")))
+    block.set_difficulty(difficulty)
+    return block
+
+
+def test_engine_mines_template():
+    block = make_template(12)
+    engine = MiningEngine(num_workers=2)
+    solution = engine.mine(block)
+    assert solution is not None
+    assert block.get_nonce() == solution
+    assert block.verify_nonce()
+    assert engine.get_hash_count() > 0
+    assert engine.get_hashrate() > 0
+    assert not engine.is_running()
+
+
+def test_engine_stops_when_tip_changes():
+    # unreachable difficulty, only the tip change can end the job
+    block = make_template(200)
+    engine = MiningEngine(num_workers=2, poll_interval=0.01)
+    assert engine.mine(block, lambda: NULL_SHA256_HASH) is None
+    assert block.get_nonce() == NULL_SHA256_HASH
+
+    # restarting on a fresh template works after a cancelled job
+    block = make_template(8)
+    assert engine.mine(block, block.get_last_block_hash) is not None
+    assert block.verify_nonce()
+
+
+def test_engine_cancel():
+    block = make_template(200)
+    engine = MiningEngine(num_workers=1, poll_interval=0.01)
+    timer = threading.Timer(0.2, engine.cancel)
+    timer.start()
+    assert engine.mine(block) is None
+    timer.join()
+
+
+def test_engine_cancel_before_job():
+    # a cancel between jobs is not lost, it ends the next job
+    engine = MiningEngine(num_workers=1, poll_interval=0.01)
+    engine.cancel()
+    block = make_template(8)
+    assert engine.mine(block) is None
+    assert block.get_nonce() == NULL_SHA256_HASH
+
+    # the cancel is used up by that job
+    assert engine.mine(block) is not None
+    assert block.verify_nonce()
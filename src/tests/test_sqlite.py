@@ -0,0 +1,334 @@
+import os
+import pytest
+from pandanite.core.blockchain import BlockChain
+from pandanite.core.user import User
+from pandanite.core.executor import ExecutionStatus
+from pandanite.core.crypto import (
+    wallet_address_to_string,
+    string_to_sha_256,
+    NULL_SHA256_HASH,
+)
+from pandanite.core.helpers import PDN
+from pandanite.storage import open_storage
+from pandanite.storage.sqlite import SQLiteDB
+from tests.test_db import mine_next_block
+
+
+def wallet_tx_ids(db: SQLiteDB, user: User):
+    return [t.get_hash() for t in db.get_transactions_for_wallet(user.get_address())]
+
+
+def test_sqlite_add_and_pop_blocks(tmp_path):
+    db = open_storage("sqlite", path=str(tmp_path / "chain.db"))
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    other = User()
+    assert blockchain.add_block(mine_next_block(db, miner)) == ExecutionStatus.SUCCESS
+    tip_hash = db.get_last_hash()
+    tip_work = db.get_total_work()
+
+    send = miner.send(other, PDN(20.0), 0)
+    block = mine_next_block(db, miner, [send])
+    assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+    assert db.get_num_blocks() == 3
+    assert db.get_last_hash() == block.get_hash()
+    assert db.get_block(3).get_hash() == block.get_hash()
+    stored = db.get_block(3).get_transactions()
+    assert send.get_hash() in [t.get_hash() for t in stored]
+    assert db.get_block_header(3).get_transaction_count() == 0
+    assert db.find_block_for_transaction_id(string_to_sha_256(send.get_id())) == 3
+    assert wallet_tx_ids(db, other) == [send.get_hash()]
+
+    wallets = db.get_wallets([miner.get_address(), other.get_address()])
+    assert wallets[wallet_address_to_string(miner.get_address())] == PDN(80.0)
+    assert wallets[wallet_address_to_string(other.get_address())] == PDN(20.0)
+
+    blockchain.pop_block()
+    assert db.get_num_blocks() == 2
+    assert db.get_last_hash() == tip_hash
+    assert db.get_total_work() == tip_work
+    assert db.find_block_for_transaction_id(string_to_sha_256(send.get_id())) == 0
+    assert wallet_tx_ids(db, other) == []
+    wallets = db.get_wallets([miner.get_address(), other.get_address()])
+    assert wallets[wallet_address_to_string(miner.get_address())] == PDN(50.0)
+    assert wallets[wallet_address_to_string(other.get_address())] == 0
+
+    # the rejected duplicate is no longer in the index, so it applies again
+    assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+
+
+def test_sqlite_reopen_keeps_chain(tmp_path):
+    path = str(tmp_path / "chain.db")
+    db = SQLiteDB(path)
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    assert blockchain.add_block(mine_next_block(db, miner)) == ExecutionStatus.SUCCESS
+    last_hash = db.get_last_hash()
+    total_work = db.get_total_work()
+    db.close()
+
+    reopened = SQLiteDB(path, clear=False)
+    assert reopened.get_num_blocks() == 2
+    assert reopened.get_last_hash() == last_hash
+    assert reopened.get_total_work() == total_work
+    assert reopened.headers.get_total_work(2) == total_work
+    assert os.path.exists(path + ".headers")
+    wallets = reopened.get_wallets([miner.get_address()])
+    assert wallets[wallet_address_to_string(miner.get_address())] == PDN(50.0)
+
+    fresh = SQLiteDB(str(tmp_path / "empty.db"), clear=False)
+    assert fresh.get_num_blocks() == 0
+    assert fresh.get_last_hash() == NULL_SHA256_HASH
+
+
+def test_sqlite_transaction_rolls_back(tmp_path):
+    db = SQLiteDB(str(tmp_path / "chain.db"))
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    block = mine_next_block(db, miner)
+
+    with pytest.raises(RuntimeError):
+        with db.transaction() as session:
+            db.add_block(block, session)
+            db.update_wallets({wallet_address_to_string(miner.get_address()): 1})
+            assert db.get_num_blocks() == 2
+            raise RuntimeError("abort")
+
+    assert db.get_num_blocks() == 1
+    assert (
+        db.find_block_for_transaction_id(
+            string_to_sha_256(block.get_transactions()[0].get_id())
+        )
+        == 0
+    )
+    assert db.get_wallets([miner.get_address()]) == {}
+    assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+
+
+def test_sqlite_wallet_history_pages(tmp_path):
+    db = SQLiteDB(str(tmp_path / "chain.db"))
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    other = User()
+    assert blockchain.add_block(mine_next_block(db, miner)) == ExecutionStatus.SUCCESS
+    sends = []
+    for i in range(0, 3):
+        batch = [miner.send(other, i * 10 + j + 1) for j in range(0, 4)]
+        assert (
+            blockchain.add_block(mine_next_block(db, miner, batch))
+            == ExecutionStatus.SUCCESS
+        )
+        sends += batch
+
+    # newest first: block 5 before block 3, block order within a block
+    history = [
+        t.get_hash() for t in db.get_transactions_for_wallet(other.get_address())
+    ]
+    assert sorted(history) == sorted(t.get_hash() for t in sends)
+    assert set(history[:4]) == {t.get_hash() for t in sends[8:]}
+
+    pages = []
+    cursor = None
+    while True:
+        page, cursor = db.get_wallet_transactions(other.get_address(), cursor, 5)
+        pages.append([t.get_hash() for t in page])
+        if cursor is None:
+            break
+    assert [len(p) for p in pages] == [5, 5, 2]
+    assert sum(pages, []) == history
+
+
+def test_sqlite_transaction_lookup_by_id(tmp_path):
+    db = SQLiteDB(str(tmp_path / "chain.db"))
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    other = User()
+    assert blockchain.add_block(mine_next_block(db, miner)) == ExecutionStatus.SUCCESS
+    sends = [miner.send(other, i + 1) for i in range(0, 5)]
+    assert (
+        blockchain.add_block(mine_next_block(db, miner, sends))
+        == ExecutionStatus.SUCCESS
+    )
+
+    stored = db.get_block(3).get_transactions()
+    for t in sends:
+        txid = string_to_sha_256(t.get_id())
+        block_id, position = db.get_transaction_location(txid)
+        assert block_id == 3
+        assert stored[position].get_hash() == t.get_hash()
+        assert db.get_transaction_by_id(txid).get_hash() == t.get_hash()
+        assert db.find_block_for_transaction(t) == 3
+    assert db.get_transaction_location(bytes(32)) is None
+    assert db.get_transaction_by_id(bytes(32)) is None
+    with pytest.raises(Exception):
+        db.get_transaction(3, len(stored))
+
+
+def test_sqlite_reorg_with_undo_records(tmp_path):
+    db = SQLiteDB(str(tmp_path / "chain.db"))
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    other = User()
+    assert blockchain.add_block(mine_next_block(db, miner)) == ExecutionStatus.SUCCESS
+    addresses = [miner.get_address(), other.get_address()]
+    wallets = db.get_wallets(addresses)
+    tip = (db.get_last_hash(), db.get_total_work(), db.get_difficulty())
+
+    blocks = []
+    for i in range(0, 4):
+        sends = [miner.send(other, i * 10 + j + 1) for j in range(0, 3)]
+        blocks.append(mine_next_block(db, miner, sends))
+        assert blockchain.add_block(blocks[-1]) == ExecutionStatus.SUCCESS
+
+    # blocks without an undo record are rolled back one at a time
+    db.conn.execute("DELETE FROM undo_records WHERE block_id = 6")
+    blockchain.pop_block()
+    assert db.get_num_blocks() == 5
+
+    blockchain.pop_blocks(3)
+    assert db.get_num_blocks() == 2
+    assert (db.get_last_hash(), db.get_total_work(), db.get_difficulty()) == tip
+    wallets[wallet_address_to_string(other.get_address())] = 0
+    assert db.get_wallets(addresses) == wallets
+    assert wallet_tx_ids(db, other) == []
+    assert [r.block_id for r in db.get_undo_records(1, 6)] == [1, 2]
+    assert blockchain.consensus.num_blocks == 2
+
+    for block in blocks:
+        assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+    newest = wallet_tx_ids(db, other)[0]
+    assert newest in [t.get_hash() for t in blocks[-1].get_transactions()]
+
+
+def test_sqlite_group_commit_sync_mode(tmp_path):
+    db = SQLiteDB(str(tmp_path / "chain.db"))
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    other = User()
+    sends = []
+
+    with blockchain.sync_mode(commit_blocks=3, commit_interval_ms=10**9) as overlay:
+        for i in range(0, 4):
+            batch = [miner.send(other, i + 1)] if i > 0 else []
+            sends += batch
+            # blocks are built on the overlay tip, not the committed one
+            block = mine_next_block(overlay, miner, batch)
+            assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+            assert db.get_num_blocks() == (1 if i < 2 else 4)
+        assert len(overlay) == 1
+        # a block spending a pending transaction again is rejected
+        repeated = mine_next_block(overlay, miner, sends[-1:])
+        assert blockchain.add_block(repeated) == ExecutionStatus.EXPIRED_TRANSACTION
+        assert overlay.get_num_blocks() == 5
+    assert db.get_num_blocks() == 5
+    assert sorted(wallet_tx_ids(db, other)) == sorted(t.get_hash() for t in sends)
+    wallets = db.get_wallets([other.get_address()])
+    assert wallets[wallet_address_to_string(other.get_address())] == 2 + 3 + 4
+    assert [r.block_id for r in db.get_undo_records(1, 5)] == [1, 2, 3, 4, 5]
+
+    # blocks still pending when the body raises are dropped
+    with pytest.raises(RuntimeError):
+        with blockchain.sync_mode() as overlay:
+            block = mine_next_block(overlay, miner)
+            assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+            raise RuntimeError("abort")
+    assert db.get_num_blocks() == 5
+    assert blockchain.consensus.num_blocks == 5
+    assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+
+    # the valid blocks before a rejected one are committed
+    block = mine_next_block(db, miner)
+    status = blockchain.add_blocks([block, block], group_commit=True)
+    assert status == ExecutionStatus.INVALID_BLOCK_ID
+    assert db.get_num_blocks() == 7
+    assert blockchain.overlay is None
+
+
+def test_sqlite_write_behind_sync(tmp_path, monkeypatch):
+    db = SQLiteDB(str(tmp_path / "chain.db"))
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    other = User()
+
+    with blockchain.sync_mode(commit_blocks=1, write_behind=True) as overlay:
+        for i in range(0, 5):
+            sends = [miner.send(other, i)] if i > 0 else []
+            block = mine_next_block(overlay, miner, sends)
+            assert blockchain.add_block(block) == ExecutionStatus.SUCCESS
+    assert db.get_num_blocks() == 6
+    assert db.get_last_hash() == block.get_hash()
+    wallets = db.get_wallets([other.get_address()])
+    assert wallets[wallet_address_to_string(other.get_address())] == 1 + 2 + 3 + 4
+    assert len(wallet_tx_ids(db, other)) == 4
+
+    # a failed write stops the sync at the last stored group
+    add_undo_record = db.add_undo_record
+
+    def failing_add_undo_record(record, session=None):
+        if record.block_id == 9:
+            raise RuntimeError("disk full")
+        add_undo_record(record, session)
+
+    monkeypatch.setattr(db, "add_undo_record", failing_add_undo_record)
+    blocks = []
+    with pytest.raises(RuntimeError):
+        with blockchain.sync_mode(commit_blocks=1, write_behind=True) as overlay:
+            for i in range(0, 6):
+                blocks.append(mine_next_block(overlay, miner))
+                assert blockchain.add_block(blocks[-1]) == ExecutionStatus.SUCCESS
+    assert db.get_num_blocks() == 8
+    assert blockchain.consensus.num_blocks == 8
+    assert blockchain.overlay is None and blockchain.writer is None
+    monkeypatch.undo()
+    assert blockchain.add_block(blocks[2]) == ExecutionStatus.SUCCESS
+
+
+def test_sqlite_genesis_recipient_history(tmp_path):
+    db = SQLiteDB(str(tmp_path / "chain.db"))
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+
+    # genesis transactions carry a "from" override that is part of their hash
+    for t in db.get_block(1).get_transactions():
+        if t.is_fee():
+            continue
+        history = db.get_transactions_for_wallet(t.get_recepient())
+        assert t.get_hash() in [h.get_hash() for h in history]
+        txid = string_to_sha_256(t.get_id())
+        assert db.get_transaction_by_id(txid).get_hash() == t.get_hash()
+        assert db.find_block_for_transaction(t) == 1
+
+
+def test_sqlite_wallet_history_resolves_through_index(tmp_path, monkeypatch):
+    db = SQLiteDB(str(tmp_path / "chain.db"))
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    other = User()
+    assert blockchain.add_block(mine_next_block(db, miner)) == ExecutionStatus.SUCCESS
+    sends = [miner.send(other, i + 1) for i in range(0, 4)]
+    assert (
+        blockchain.add_block(mine_next_block(db, miner, sends))
+        == ExecutionStatus.SUCCESS
+    )
+
+    # pages decode single transactions, never whole blocks
+    def no_blocks(block_id, session=None):
+        raise Exception("block decoded")
+
+    monkeypatch.setattr(db, "get_block", no_blocks)
+    page, cursor = db.get_wallet_transactions(other.get_address(), limit=3)
+    assert len(page) == 3 and cursor is not None
+
+    # an entry missing from the transaction index is reported
+    db.add_wallet_transaction(other.get_address(), "%064X" % 0, 3)
+    with pytest.raises(Exception, match="Wallet history transaction not found"):
+        db.get_wallet_transactions(other.get_address())
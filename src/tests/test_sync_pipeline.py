@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+from pandanite.core.blockchain import BlockChain, check_block
+from pandanite.core.executor import ExecutionStatus
+from pandanite.core.user import User
+from pandanite.core.wire import (
+    BLOCKHEADER_BUFFER_SIZE,
+    TRANSACTIONINFO_BUFFER_SIZE,
+    block_to_buffer,
+)
+from pandanite.core.crypto import wallet_address_to_string
+from pandanite.core.sync_pipeline import SyncPipeline
+from pandanite.storage.sqlite import SQLiteDB
+from tests.test_db import mine_next_block
+
+
+def build_chain(db: SQLiteDB, num_blocks: int):
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    miner = User()
+    other = User()
+    blocks = []
+    for i in range(0, num_blocks):
+        sends = [miner.send(other, i * 10 + j) for j in range(1, 3)] if i > 0 else []
+        blocks.append(mine_next_block(db, miner, sends))
+        assert blockchain.add_block(blocks[-1]) == ExecutionStatus.SUCCESS
+    return blocks, other
+
+
+def test_pipeline_replays_chain(tmp_path):
+    source = SQLiteDB(str(tmp_path / "source.db"))
+    blocks, other = build_chain(source, 6)
+
+    db = SQLiteDB(str(tmp_path / "chain.db"))
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    with ThreadPoolExecutor(2) as pool:
+        pipeline = SyncPipeline(blockchain, pool, pool, depth=3)
+        status = pipeline.run(block_to_buffer(b) for b in blocks)
+    assert status == ExecutionStatus.SUCCESS
+    assert db.get_num_blocks() == 7
+    assert db.get_last_hash() == source.get_last_hash()
+    assert db.get_total_work() == source.get_total_work()
+    address = wallet_address_to_string(other.get_address())
+    assert db.get_wallets([other.get_address()])[address] == (
+        source.get_wallets([other.get_address()])[address]
+    )
+    for block_id in range(2, 8):
+        assert [t.get_hash() for t in db.get_block(block_id).get_transactions()] == [
+            t.get_hash() for t in source.get_block(block_id).get_transactions()
+        ]
+
+    stats = pipeline.get_stats()
+    for stage in ["decode", "verify", "apply", "total"]:
+        assert stats[stage]["blocks"] == 6
+        assert stats[stage]["transactions"] == 6 + 5 * 2
+
+
+def test_pipeline_stops_at_invalid_block(tmp_path):
+    source = SQLiteDB(str(tmp_path / "source.db"))
+    blocks, _ = build_chain(source, 5)
+    raw = [bytearray(block_to_buffer(b)) for b in blocks]
+    # change the amount of a transaction in the fourth block (the low
+    # byte of the big endian field at offset 129)
+    raw[3][BLOCKHEADER_BUFFER_SIZE + TRANSACTIONINFO_BUFFER_SIZE + 136] ^= 0x01
+
+    db = SQLiteDB(str(tmp_path / "chain.db"))
+    blockchain = BlockChain(db)
+    assert blockchain.load_genesis() == ExecutionStatus.SUCCESS
+    status = SyncPipeline(blockchain, depth=2, write_behind=False).run(raw)
+    assert status == ExecutionStatus.INVALID_MERKLE_ROOT
+    assert db.get_num_blocks() == 4
+    assert db.get_last_hash() == blocks[2].get_hash()
+    assert check_block(blocks[3]) == ExecutionStatus.SUCCESS
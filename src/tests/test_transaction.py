@@ -1,7 +1,10 @@
 import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from pandanite.core.helpers import PDN
 from pandanite.core.user import User
-from pandanite.core.transaction import Transaction
+from pandanite.core.transaction import Transaction, verify_signatures, get_merkle_hash
+from pandanite.core.block import Block
 from pandanite.core.crypto import hex_encode
 
 
@@ -72,4 +75,107 @@ def test_check_transaction_avro_serialization():
     ts = t.get_timestamp()
     assert t.hash_contents() == deserialized.hash_contents()
     assert t == deserialized
-    assert ts == deserialized.get_timestamp()
\ No newline at end of file
+    assert ts == deserialized.get_timestamp()
+
+
+def test_verify_signatures_batch():
+    miner = User()
+    receiver = User()
+    items = [miner.mine()]
+    for i in range(0, 20):
+        items.append(miner.send(receiver, PDN(1.0 + i)))
+
+    assert verify_signatures(items)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        assert verify_signatures(items, pool, chunk_size=3)
+
+        # sign one transaction with the wrong key
+        items[13].sign(receiver.get_private_key())
+        assert not verify_signatures(items, pool, chunk_size=3)
+    assert not verify_signatures(items)
+
+
+class Sha256Counter:
+    def __init__(self):
+        self.calls = 0
+        self._sha256 = hashlib.sha256
+
+    def __call__(self, *args):
+        self.calls += 1
+        return self._sha256(*args)
+
+
+def test_sealed_transaction_caches_hashes(monkeypatch):
+    miner = User()
+    receiver = User()
+    t = miner.send(receiver, PDN(30.0))
+    counter = Sha256Counter()
+    monkeypatch.setattr(hashlib, "sha256", counter)
+
+    for _ in range(0, 5):
+        t.get_hash()
+        t.get_id()
+    unsealed_calls = counter.calls
+
+    t.seal()
+    counter.calls = 0
+    expected_hash = t.get_hash()
+    expected_id = t.get_id()
+    first_calls = counter.calls
+    for _ in range(0, 5):
+        assert t.get_hash() == expected_hash
+        assert t.get_id() == expected_id
+    assert counter.calls == first_calls
+    assert first_calls * 5 < unsealed_calls
+
+    # setters invalidate the cached hashes
+    t.set_amount(PDN(10.0))
+    assert t.get_id() != expected_id
+    fresh = Transaction()
+    fresh.from_json(t.to_json())
+    assert t.get_id() == fresh.get_id()
+    assert t.hash_contents() == fresh.hash_contents()
+
+
+def test_block_transactions_hashed_once(monkeypatch):
+    miner = User()
+    receiver = User()
+    block = Block()
+    block.add_transaction(miner.mine())
+    for i in range(0, 10):
+        block.add_transaction(miner.send(receiver, PDN(1.0 + i)))
+    num_transactions = len(block.get_transactions())
+
+    counter = Sha256Counter()
+    monkeypatch.setattr(hashlib, "sha256", counter)
+    get_merkle_hash(block.get_transactions())
+    for t in block.get_transactions():
+        t.get_id()
+        t.get_hash()
+    first_pass = counter.calls
+
+    counter.calls = 0
+    get_merkle_hash(block.get_transactions())
+    for t in block.get_transactions():
+        t.get_id()
+        t.get_hash()
+    # only the merkle tree's interior nodes are hashed again
+    assert counter.calls == num_transactions
+    assert first_pass > counter.calls
+
+
+def test_transaction_copy():
+    miner = User()
+    receiver = User()
+    t = miner.send(receiver, PDN(30.0))
+    assert not hasattr(t, "__dict__")
+    assert isinstance(t.get_recepient(), bytes)
+    assert isinstance(t.get_signature(), bytes)
+
+    c = t.copy()
+    assert c == t
+    assert c.get_hash() == t.get_hash()
+    c.set_amount(PDN(1.0))
+    assert t.get_amount() == PDN(30.0)
+    assert c.get_hash() != t.get_hash()
+    assert t.signature_valid()
@@ -0,0 +1,111 @@
+import io
+import struct
+from pandanite.core.block import Block
+from pandanite.core.user import User
+from pandanite.core.helpers import PDN
+from pandanite.core.transaction import get_merkle_hash
+from pandanite.core.wire import (
+    BLOCKHEADER_BUFFER_SIZE,
+    TRANSACTIONINFO_BUFFER_SIZE,
+    block_to_buffer,
+    block_from_buffer,
+    blocks_to_buffer,
+    blocks_from_buffer,
+    transaction_to_buffer,
+    transaction_from_buffer,
+    read_blocks,
+)
+
+
+def make_block(id: int, num_sends: int) -> Block:
+    miner = User()
+    receiver = User()
+    b = Block()
+    b.set_id(id)
+    b.add_transaction(miner.mine())
+    for i in range(0, num_sends):
+        b.add_transaction(miner.send(receiver, PDN(1.0 + i), i))
+    b.set_merkle_root(get_merkle_hash(b.get_transactions()))
+    return b
+
+
+def test_struct_sizes():
+    assert BLOCKHEADER_BUFFER_SIZE == 116
+    assert TRANSACTIONINFO_BUFFER_SIZE == 149
+
+
+def test_transaction_buffer():
+    miner = User()
+    t = miner.send(User(), PDN(3.0), 7)
+    buffer = transaction_to_buffer(t)
+    assert len(buffer) == TRANSACTIONINFO_BUFFER_SIZE
+    # timestamp follows the 64 byte signature and 32 byte key, big endian
+    assert struct.unpack_from(">Q", buffer, 96)[0] == t.get_timestamp()
+    decoded = transaction_from_buffer(buffer)
+    assert decoded == t
+    assert decoded.get_hash() == t.get_hash()
+    assert decoded.signature_valid()
+
+    fee = miner.mine()
+    buffer = transaction_to_buffer(fee)
+    assert struct.unpack_from(">I", buffer, 145)[0] == 1
+    assert transaction_from_buffer(buffer).is_fee()
+
+
+def test_block_buffer():
+    b = make_block(5, 3)
+    buffer = block_to_buffer(b)
+    assert len(buffer) == BLOCKHEADER_BUFFER_SIZE + 4 * TRANSACTIONINFO_BUFFER_SIZE
+    assert struct.unpack_from(">I", buffer, 0)[0] == 5
+    decoded, offset = block_from_buffer(buffer)
+    assert offset == len(buffer)
+    assert decoded == b
+    assert decoded.get_hash() == b.get_hash()
+    assert get_merkle_hash(decoded.get_transactions()) == b.get_merkle_root()
+
+
+def test_many_blocks_buffer():
+    blocks = [make_block(i + 1, i) for i in range(0, 4)]
+    buffer = blocks_to_buffer(blocks)
+    assert blocks_from_buffer(buffer) == blocks
+    assert blocks_from_buffer(memoryview(buffer)) == blocks
+    try:
+        blocks_from_buffer(buffer[:-1])
+        assert False
+    except Exception:
+        pass
+
+
+class ChunkedStream:
+    # file-like object that returns short reads, like a chunked HTTP body
+    def __init__(self, data: bytes, chunk_size: int):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.position = 0
+
+    def read(self, size: int) -> bytes:
+        size = min(size, self.chunk_size)
+        chunk = self.data[self.position : self.position + size]
+        self.position += len(chunk)
+        return chunk
+
+
+def test_read_blocks_streaming():
+    blocks = [make_block(i + 1, i) for i in range(0, 4)]
+    sizes = [len(block_to_buffer(b)) for b in blocks]
+    stream = ChunkedStream(blocks_to_buffer(blocks), 50)
+
+    decoded = read_blocks(stream)
+    first = next(decoded)
+    assert first == blocks[0]
+    # only the first block has been consumed from the stream
+    assert stream.position == sizes[0]
+    assert list(decoded) == blocks[1:]
+    assert list(read_blocks(io.BytesIO(b""))) == []
+
+    truncated = io.BytesIO(blocks_to_buffer(blocks)[:-10])
+    try:
+        list(read_blocks(truncated))
+        assert False
+    except Exception as e:
+        assert "Truncated" in str(e)